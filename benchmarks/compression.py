@@ -0,0 +1,94 @@
+"""Measure gzipped render responses over a slow link.
+
+A local `/render` stub serves N series x M points raw responses (gzipped when the
+client accepts it) and emulates a WAN link: the response is delayed by the round
+trip time and written at the given bandwidth. Graphite alerts load the series with
+and without compression, the bytes sent and the load latency are reported.
+
+Usage::
+
+    python -m benchmarks.compression --series 2000 --points 60 --bandwidth 20 --rtt 50
+
+"""
+
+import argparse
+import asyncio
+import gzip
+import time
+
+from tornado import httpserver, ioloop, web
+from tornado.testing import bind_unused_port
+
+from benchmarks.server import build_body
+from graphite_beacon.alerts import BaseAlert
+from graphite_beacon.core import Reactor
+
+CHUNK_SIZE = 16384
+
+
+class RenderHandler(web.RequestHandler):
+
+    def initialize(self, options, bodies, stats):
+        self.options = options
+        self.bodies = bodies
+        self.stats = stats
+
+    async def get(self):
+        await asyncio.sleep(self.options.rtt / 1000.0)
+        body = self.bodies['identity']
+        if 'gzip' in self.request.headers.get('Accept-Encoding', ''):
+            body = self.bodies['gzip']
+            self.set_header('Content-Encoding', 'gzip')
+
+        # Bandwidth in Mbit/s
+        delay = CHUNK_SIZE * 8 / (self.options.bandwidth * 10 ** 6)
+        for pos in range(0, len(body), CHUNK_SIZE):
+            self.write(body[pos:pos + CHUNK_SIZE])
+            await self.flush()
+            await asyncio.sleep(delay)
+        self.stats['bytes'] += len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--series', type=int, default=2000, help='number of series')
+    parser.add_argument('--points', type=int, default=60, help='points per series')
+    parser.add_argument('--bandwidth', type=float, default=20, help='link bandwidth, Mbit/s')
+    parser.add_argument('--rtt', type=float, default=50, help='round trip time, ms')
+    parser.add_argument('--rounds', type=int, default=5, help='loads to measure')
+    args = parser.parse_args()
+
+    raw = build_body(args.series, args.points).encode('utf-8')
+    bodies = {'identity': raw, 'gzip': gzip.compress(raw, 6)}
+    stats = {'bytes': 0}
+
+    sock, port = bind_unused_port()
+    server = httpserver.HTTPServer(web.Application([
+        (r'/render/', RenderHandler, {'options': args, 'bodies': bodies, 'stats': stats})]))
+    server.add_sockets([sock])
+
+    loop = ioloop.IOLoop.current()
+    print('raw response %d bytes, gzipped %d bytes (%.1fx)' % (
+        len(raw), len(bodies['gzip']), len(raw) / float(len(bodies['gzip']))))
+
+    for compression in (False, True):
+        reactor = Reactor(graphite_url='http://127.0.0.1:%d' % port, compression=compression,
+                          critical_handlers=[], warning_handlers=[], normal_handlers=[])
+        alert = BaseAlert.get(reactor, name='Bench', query='bench.*', rules=['critical: > 100'])
+        alert.check = lambda data: None
+
+        stats['bytes'] = 0
+        timings = []
+        for _ in range(args.rounds):
+            started = time.perf_counter()
+            loop.run_sync(alert.load)
+            timings.append(time.perf_counter() - started)
+        print('%-8s %8d bytes/load, latency best %.3fs, average %.3fs' % (
+            'gzip' if compression else 'identity', stats['bytes'] / args.rounds,
+            min(timings), sum(timings) / len(timings)))
+
+    server.stop()
+
+
+if __name__ == '__main__':
+    main()
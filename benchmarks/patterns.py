@@ -0,0 +1,83 @@
+"""Measure the routing of pushed metric names to alert queries.
+
+Alert queries look like `servers.web12.cpu.{user,system}` or `servers.*.disk-sd[a-d].used`
+and the metric names are drawn from the same hosts and metrics, so most of them
+match a few queries. The trie index (uncached and with its name cache) is compared
+with the linear scan of compiled regular expressions (on a sample of the names).
+
+Usage::
+
+    python -m benchmarks.patterns --patterns 10000 --names 1000000
+
+"""
+
+import argparse
+import random
+import time
+
+from graphite_beacon.patterns import PatternIndex, compile_pattern
+
+METRICS = ['cpu.user', 'cpu.system', 'cpu.idle', 'memory.free', 'memory.used',
+           'disk-sda.used', 'disk-sdb.used', 'load.short', 'load.long', 'net.rx', 'net.tx']
+QUERIES = ['cpu.{user,system}', 'cpu.*', 'memory.free', 'disk-sd[a-d].used', 'load.*',
+           'net.{rx,tx}', '*.used']
+
+
+def make_queries(count, hosts, rnd):
+    queries = set()
+    while len(queries) < count:
+        host = rnd.choice(['web%d' % rnd.randrange(hosts), 'web*', 'db[0-9]', '*'])
+        queries.add('servers.%s.%s' % (host, rnd.choice(QUERIES)))
+    return list(queries)
+
+
+def make_names(count, hosts, rnd):
+    kinds = ['web%d' % num for num in range(hosts)] + ['db%d' % num for num in range(10)]
+    return ['servers.%s.%s' % (rnd.choice(kinds), rnd.choice(METRICS)) for _ in range(count)]
+
+
+def measure(match, names):
+    started = time.perf_counter()
+    matched = sum(len(match(name)) for name in names)
+    return time.perf_counter() - started, matched
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--patterns', type=int, default=10000, help='number of alert queries')
+    parser.add_argument('--names', type=int, default=1000000, help='number of metric names')
+    parser.add_argument('--hosts', type=int, default=5000, help='number of distinct hosts')
+    parser.add_argument('--sample', type=int, default=1000,
+                        help='number of names for the linear scan')
+    args = parser.parse_args()
+
+    rnd = random.Random(42)
+    queries = make_queries(args.patterns, args.hosts, rnd)
+    names = make_names(args.names, args.hosts, rnd)
+
+    started = time.perf_counter()
+    index = PatternIndex()
+    for query in queries:
+        index.add(query, query)
+    print('%-20s %8.2f sec for %d patterns' % ('index build', time.perf_counter() - started,
+                                              len(queries)))
+
+    compiled = [(compile_pattern(query), query) for query in queries]
+
+    def scan(name):
+        return [query for regexp, query in compiled if regexp.match(name)]
+
+    def uncached(name):
+        index.cache.clear()
+        return index.match(name)
+
+    cases = [('linear scan', scan, names[:args.sample]), ('index', uncached, names),
+             ('index + cache', index.match, names)]
+    for name, match, sample in cases:
+        elapsed, matched = measure(match, sample)
+        print('%-20s %8.2f us/name %10.0f names/sec %6.2f matches/name' % (
+            name, elapsed / len(sample) * 1e6, len(sample) / elapsed, matched / len(sample)))
+
+
+if __name__ == '__main__':
+    main()
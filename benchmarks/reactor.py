@@ -0,0 +1,137 @@
+"""Run a Reactor against the local Graphite stand-in and report its throughput.
+
+Usage::
+
+    python -m benchmarks.reactor --alerts 100 --series 1000 --points 10 --duration 30
+
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import resource
+import socket
+import time
+
+from tornado import httpclient, ioloop
+
+from graphite_beacon.core import Reactor
+
+from . import server
+
+
+def free_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def wait_for_port(port, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except socket.error:
+            time.sleep(0.05)
+    raise RuntimeError('Server has not started on port %s' % port)
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * pct / 100.0), len(values) - 1)]
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--alerts', type=int, default=10, help='number of alerts')
+    parser.add_argument('--series', type=int, default=1000, help='series per response')
+    parser.add_argument('--points', type=int, default=10, help='points per series')
+    parser.add_argument('--latency', type=float, default=0, help='render latency (seconds)')
+    parser.add_argument('--errors', type=float, default=0, help='render error rate (0..1)')
+    parser.add_argument('--interval', default='1second', help='alerts interval')
+    parser.add_argument('--duration', type=float, default=10, help='benchmark duration (seconds)')
+    parser.add_argument('--method', default='average', help='alerts method')
+    parser.add_argument('--rules', nargs='+', default=['critical: > 99', 'warning: > 98'])
+    return parser.parse_args(args)
+
+
+def run(args):
+    port, smtp_port = free_port(), free_port()
+    options = dict(series=args.series, points=args.points,
+                   latency=args.latency, errors=args.errors)
+    process = multiprocessing.Process(target=server.serve, args=(port, smtp_port, options))
+    process.daemon = True
+    process.start()
+    wait_for_port(port)
+    wait_for_port(smtp_port)
+
+    base_url = 'http://127.0.0.1:%d' % port
+    handlers = ['http', 'smtp']
+    reactor = Reactor(
+        graphite_url=base_url,
+        interval=args.interval,
+        method=args.method,
+        logging='warning',
+        critical_handlers=handlers, warning_handlers=handlers, normal_handlers=handlers,
+        http={'url': base_url + '/sink', 'method': 'POST'},
+        smtp={'host': '127.0.0.1', 'port': smtp_port, 'to': ['bench@localhost']},
+        alerts=[{'name': 'bench%d' % num, 'query': 'bench.series.*', 'rules': args.rules}
+                for num in range(args.alerts)])
+
+    latencies = []
+    release = reactor.overload.release
+
+    def timed_release(alert):
+        release(alert)
+        latencies.append(alert.load_duration)
+
+    reactor.overload.release = timed_release
+
+    async def bench():
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        started = time.time()
+        reactor.start(start_loop=False)
+        await asyncio.sleep(args.duration)
+        failed = sum(1 for alert in reactor.alerts if alert.state['loading'] != 'normal')
+        reactor.stop(stop_loop=False)
+        elapsed = time.time() - started
+        finished = resource.getrusage(resource.RUSAGE_SELF)
+
+        response = await httpclient.AsyncHTTPClient().fetch(base_url + '/stats')
+        return dict(
+            checks=len(latencies),
+            failed_alerts=failed,
+            checks_per_sec=len(latencies) / elapsed,
+            series_per_sec=len(latencies) * args.series / elapsed,
+            p50_ms=percentile(latencies, 50) * 1000,
+            p99_ms=percentile(latencies, 99) * 1000,
+            cpu_sec=(finished.ru_utime - usage.ru_utime) + (finished.ru_stime - usage.ru_stime),
+            max_rss_mb=finished.ru_maxrss / 1024.0,
+            backoff=max(alert.backoff for alert in reactor.alerts) if reactor.alerts else 1,
+            server=json.loads(response.body.decode('utf-8')),
+        )
+
+    try:
+        return ioloop.IOLoop.current().run_sync(bench)
+    finally:
+        process.terminate()
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.ERROR)
+    report = run(args)
+    for key in sorted(report):
+        value = report[key]
+        print('%-16s %s' % (key, '%.2f' % value if isinstance(value, float) else value))
+
+
+if __name__ == '__main__':
+    main()
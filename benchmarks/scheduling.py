@@ -0,0 +1,77 @@
+"""Measure the scheduling overhead of alert loads.
+
+Every round starts a load for each of the alerts concurrently and waits for all of
+them. A load awaits a ready future (a mocked fetch) and yields to the loop once, like
+`GraphiteAlert.load` does. Legacy `gen.coroutine` loads are compared with native
+`async def` ones, on the default asyncio loop and on uvloop (when installed).
+
+Usage::
+
+    python -m benchmarks.scheduling --alerts 5000 --rounds 20
+
+"""
+
+import argparse
+import asyncio
+import time
+
+from tornado import gen, ioloop
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+
+def ready():
+    future = asyncio.Future()
+    future.set_result(None)
+    return future
+
+
+@gen.coroutine
+def legacy_load():
+    yield ready()
+    yield gen.moment
+
+
+async def native_load():
+    await ready()
+    await asyncio.sleep(0)
+
+
+def measure(load, alerts, rounds, policy=None):
+    asyncio.set_event_loop_policy(policy)
+    asyncio.set_event_loop(asyncio.new_event_loop())
+
+    async def bench():
+        started = time.perf_counter()
+        for _ in range(rounds):
+            await asyncio.gather(*[gen.convert_yielded(load()) for _ in range(alerts)])
+        return time.perf_counter() - started
+
+    try:
+        return ioloop.IOLoop.current().run_sync(bench)
+    finally:
+        ioloop.IOLoop.current().close(all_fds=True)
+        asyncio.set_event_loop_policy(None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--alerts', type=int, default=5000, help='number of alerts')
+    parser.add_argument('--rounds', type=int, default=20, help='number of rounds')
+    args = parser.parse_args()
+
+    cases = [('gen.coroutine', legacy_load, None), ('async def', native_load, None)]
+    if uvloop:
+        cases.append(('async def + uvloop', native_load, uvloop.EventLoopPolicy()))
+
+    loads = args.alerts * args.rounds
+    for name, load, policy in cases:
+        elapsed = measure(load, args.alerts, args.rounds, policy)
+        print('%-20s %8.2f us/load %10.0f loads/sec' % (name, elapsed / loads * 1e6, loads / elapsed))
+
+
+if __name__ == '__main__':
+    main()
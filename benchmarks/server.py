@@ -0,0 +1,122 @@
+"""Local stand-ins for Graphite and the handlers' endpoints.
+
+The server runs in its own process so it does not take CPU from the measured reactor:
+
+* `/render` serves raw Graphite data (N series x M points) with an adjustable latency
+  and error rate;
+* `/sink` accepts HTTP handler notifications;
+* an SMTP sink accepts SMTP handler messages;
+* `/stats` reports the counters.
+"""
+
+import asyncio
+import json
+import random
+
+from tornado import ioloop, tcpserver, web
+
+
+class Stats(object):
+
+    def __init__(self):
+        self.renders = 0
+        self.errors = 0
+        self.http_notifications = 0
+        self.smtp_messages = 0
+
+
+def build_body(series, points, prefix='bench.series'):
+    """Build a raw Graphite response."""
+    lines = []
+    for num in range(series):
+        values = ','.join('%.2f' % (random.random() * 100) for _ in range(points))
+        lines.append('%s.%d,1480000000,%d,60|%s' % (prefix, num, 1480000000 + points * 60, values))
+    return '\n'.join(lines) + '\n'
+
+
+class RenderHandler(web.RequestHandler):
+
+    def initialize(self, options, stats, bodies):
+        self.options = options
+        self.stats = stats
+        self.bodies = bodies
+
+    async def get(self):
+        self.stats.renders += 1
+        if self.options['latency']:
+            await asyncio.sleep(self.options['latency'])
+
+        if random.random() < self.options['errors']:
+            self.stats.errors += 1
+            raise web.HTTPError(500)
+
+        # Pregenerated bodies keep the server out of the way
+        self.write(random.choice(self.bodies))
+
+
+class SinkHandler(web.RequestHandler):
+
+    def initialize(self, stats):
+        self.stats = stats
+
+    def get(self):
+        self.stats.http_notifications += 1
+
+    post = get
+
+
+class StatsHandler(web.RequestHandler):
+
+    def initialize(self, stats):
+        self.stats = stats
+
+    def get(self):
+        self.write(json.dumps(self.stats.__dict__))
+
+
+class SMTPSink(tcpserver.TCPServer):
+
+    """Accept everything, count messages."""
+
+    def __init__(self, stats):
+        super().__init__()
+        self.stats = stats
+
+    async def handle_stream(self, stream, address):
+        try:
+            await stream.write(b'220 sink ESMTP\r\n')
+            while True:
+                line = await stream.read_until(b'\r\n')
+                command = line[:4].upper()
+                if command == b'DATA':
+                    await stream.write(b'354 End data with <CR><LF>.<CR><LF>\r\n')
+                    await stream.read_until(b'\r\n.\r\n')
+                    self.stats.smtp_messages += 1
+                    await stream.write(b'250 OK\r\n')
+                elif command == b'QUIT':
+                    await stream.write(b'221 Bye\r\n')
+                    stream.close()
+                    return
+                elif command in (b'EHLO', b'HELO'):
+                    await stream.write(b'250 sink\r\n')
+                else:
+                    await stream.write(b'250 OK\r\n')
+        except Exception:  # pylint: disable=broad-except
+            stream.close()
+
+
+def make_app(options, stats):
+    bodies = [build_body(options['series'], options['points']) for _ in range(4)]
+    return web.Application([
+        (r'/render/?', RenderHandler, dict(options=options, stats=stats, bodies=bodies)),
+        (r'/sink', SinkHandler, dict(stats=stats)),
+        (r'/stats', StatsHandler, dict(stats=stats)),
+    ])
+
+
+def serve(port, smtp_port, options):
+    """Run the servers (blocking)."""
+    stats = Stats()
+    make_app(options, stats).listen(port, address='127.0.0.1')
+    SMTPSink(stats).listen(smtp_port, address='127.0.0.1')
+    ioloop.IOLoop.current().start()
@@ -0,0 +1,115 @@
+"""Compare reading Whisper files directly with loading the series from `/render`.
+
+N Whisper files with M points in the time window are generated in a temporary
+storage. A whisper alert reads them, a Graphite alert loads the same series from a
+local `/render` stand-in which serves a pregenerated raw response (so the render
+side is a lower bound: graphite-web has to read the same files and render them too).
+
+Usage::
+
+    python -m benchmarks.whisper --series 1000 --points 60
+
+"""
+
+import argparse
+import os
+import random
+import shutil
+import socket
+import tempfile
+import time
+
+from tornado import httpserver, ioloop, web
+
+from graphite_beacon import whisper
+from graphite_beacon.alerts import BaseAlert
+from graphite_beacon.core import Reactor
+from graphite_beacon.graphite import GraphiteRecord
+
+
+def generate(root, series, points, now, rnd):
+    """Generate Whisper files and the raw Graphite response of the same series."""
+    lines = []
+    start = now - points * 60
+    for num in range(series):
+        name = 'bench.series%d.value' % num
+        values = [rnd.random() * 100 for _ in range(points)]
+        whisper.create(
+            os.path.join(root, *name.split('.')) + whisper.EXTENSION,
+            [(60, 1440), (600, 1008)],
+            [(start + pos * 60, value) for pos, value in enumerate(values)])
+        lines.append('%s,%d,%d,60|%s' % (
+            name, start, now, ','.join('%.2f' % value for value in values)))
+    return '\n'.join(lines) + '\n'
+
+
+class RenderHandler(web.RequestHandler):
+
+    def initialize(self, body):
+        self.body = body
+
+    def get(self):
+        self.write(self.body)
+
+
+def measure(rounds, load):
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        load()
+        timings.append(time.perf_counter() - started)
+    return min(timings), sum(timings) / len(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--series', type=int, default=1000, help='number of series')
+    parser.add_argument('--points', type=int, default=60, help='points per series')
+    parser.add_argument('--rounds', type=int, default=10, help='loads to measure')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='beacon-whisper-')
+    try:
+        now = int(time.time())
+        started = time.perf_counter()
+        body = generate(root, args.series, args.points, now, random.Random(42))
+        print('generated %d files in %.2fs' % (args.series, time.perf_counter() - started))
+
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+        sock.close()
+
+        loop = ioloop.IOLoop.current()
+        server = httpserver.HTTPServer(web.Application([
+            (r'/render/', RenderHandler, {'body': body})]))
+        server.listen(port, '127.0.0.1')
+
+        reactor = Reactor(graphite_url='http://127.0.0.1:%d' % port, critical_handlers=[],
+                          warning_handlers=[], normal_handlers=[])
+        options = dict(name='Bench', query='bench.*.value', time_window='%dminute' % args.points,
+                       rules=['critical: > 100'])
+        whisper_alert = BaseAlert.get(reactor, source='whisper', storage=root, **options)
+        graphite_alert = BaseAlert.get(reactor, source='graphite', **options)
+
+        def render():
+            async def fetch():
+                response = await graphite_alert.client.fetch(graphite_alert.request)
+                return [(record.average, record.target)
+                        for record in map(GraphiteRecord, response.buffer)]
+            return loop.run_sync(fetch)
+
+        for name, load in (('whisper', whisper_alert.read), ('render', render)):
+            data = load()
+            assert len(data) == args.series, name
+            best, average = measure(args.rounds, load)
+            print('%-8s best %.4fs, average %.4fs, %.0f series/s' % (
+                name, best, average, args.series / average))
+
+        server.stop()
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
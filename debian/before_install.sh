@@ -1,3 +1,3 @@
 #!/bin/sh
 
-python -m pip install tornado funcparserlib
+python3 -m pip install tornado funcparserlib
@@ -1,20 +1,30 @@
 """Implement alerts."""
 
+import heapq
+import itertools
+import logging
 import math
-from collections import defaultdict, deque
-from itertools import islice
+import time
+from functools import lru_cache
+from urllib.parse import urlsplit
 
 from tornado import httpclient as hc
-from tornado import escape, gen, ioloop, log
+from tornado import escape, ioloop, log
 
-from . import _compat as _
-from . import units
-from .graphite import GraphiteRecord
+from . import units, whisper
+from .graphite import RawParser, ResponseTooLarge, RollingWindow, top_query
+from .evaluation import GroupRules, evaluate_rules
+from .stats import Statistics
+from .store import LEVEL_IDS, TargetStore
 from .units import MILLISECOND, TimeUnit
-from .utils import HISTORICAL, LOGICAL_OPERATORS, convert_to_format, parse_rule
+from .utils import (COMPARATORS, LOGICAL_OPERATORS, convert_to_format, is_baseline,
+                    parse_group_rule, parse_rule)
 
 LOGGER = log.gen_log
-METHODS = "average", "last_value", "sum", "minimum", "maximum"
+METHODS = (
+    "average", "last_value", "sum", "minimum", "maximum", "median", "p90", "p95", "p99")
+URL_VALUES = "status", "ttfb", "total"
+GRAPH_URLS_CACHE_SIZE = 1024
 LEVELS = {
     'critical': 0,
     'warning': 10,
@@ -22,18 +32,6 @@ LEVELS = {
 }
 
 
-class sliceable_deque(deque):  # pylint: disable=invalid-name
-
-    """Deque with slices support."""
-
-    def __getitem__(self, index):
-        """Support slices."""
-        try:
-            return deque.__getitem__(self, index)
-        except TypeError:
-            return type(self)(islice(self, index.start, index.stop, index.step))
-
-
 class AlertFabric(type):
 
     """Register alert's classes and produce an alert by source."""
@@ -55,11 +53,13 @@ class AlertFabric(type):
         return acls(reactor, **options)
 
 
-class BaseAlert(_.with_metaclass(AlertFabric)):
+class BaseAlert(metaclass=AlertFabric):
 
     """Abstract basic alert class."""
 
     source = None
+    # Level to log the checked values at
+    values_log_level = logging.INFO
 
     def __init__(self, reactor, **options):
         """Initialize alert."""
@@ -74,8 +74,18 @@ class BaseAlert(_.with_metaclass(AlertFabric)):
             raise ValueError("Invalid alert configuration: %s" % e)
 
         self.waiting = False
-        self.state = {None: "normal", "waiting": "normal", "loading": "normal"}
-        self.history = defaultdict(lambda: sliceable_deque([], self.history_size))
+        self.backoff = 1
+        self.load_started = self.load_duration = 0.0
+        self.store = TargetStore(self.history_size)
+        self.state = self.store.state
+        self.history = self.store.history
+        for target in (None, "waiting", "loading"):
+            self.state[target] = "normal"
+        self.store.pin(None, "waiting", "loading")
+        if self.group_rules:
+            self.store.pin("group")
+        self.stats = Statistics(
+            self.store, self.baselines, self.stats_options) if self.baselines else None
 
         LOGGER.info("Alert '%s': has inited", self)
 
@@ -97,10 +107,21 @@ class BaseAlert(_.with_metaclass(AlertFabric)):
         if not name:
             raise AssertionError("Alert's name should be defined and not empty.")
 
-        if not rules:
+        group_rules = options.get('group_rules')
+        if not (rules or group_rules):
             raise AssertionError("%s: Alert's rules is invalid" % name)
-        self.rules = [parse_rule(rule) for rule in rules]
+        self.rules = [parse_rule(rule) for rule in rules or []]
         self.rules = list(sorted(self.rules, key=lambda r: LEVELS.get(r.get('level'), 99)))
+        self.group_rules = [parse_group_rule(rule) for rule in group_rules or []]
+        self.group_rules = list(
+            sorted(self.group_rules, key=lambda r: LEVELS.get(r.get('level'), 99)))
+        # Notify the group rules only (the targets' levels are still tracked)
+        self.group_only = options.get('group_only', False)
+        self.baselines = set(
+            name for rule in self.rules + [
+                rule['where'] for rule in self.group_rules if rule['where']]
+            for expr in rule['exprs'][::2]
+            for name in (expr['value'], expr.get('stat')) if is_baseline(name))
 
         assert query, "%s: Alert's query is invalid" % self.name
         self.query = query
@@ -133,13 +154,49 @@ class BaseAlert(_.with_metaclass(AlertFabric)):
         history_size_ms = history_size_unit.convert_to(MILLISECOND)
         self.history_size = int(math.ceil(history_size_ms / interval_ms))
 
+        season_raw = options.get('season', self.reactor.options['season'])
+        season_ms = TimeUnit.from_interval(season_raw).convert_to(MILLISECOND)
+        self.stats_options = dict(
+            (name, options.get(name, self.reactor.options[name])) for name in (
+                'ewma_alpha', 'seasonal_alpha', 'seasonal_beta', 'seasonal_gamma'))
+        self.stats_options['season_period'] = int(math.ceil(season_ms / interval_ms))
+
         self.no_data = options.get('no_data', self.reactor.options['no_data'])
         self.loading_error = options.get('loading_error', self.reactor.options['loading_error'])
 
+        self.target_ttl = options.get('target_ttl', self.reactor.options['target_ttl'])
+        self.max_targets = options.get('max_targets', self.reactor.options['max_targets'])
+        self.vanished = options.get('vanished', self.reactor.options['vanished'])
+
+        # Fetches are served by priority (see `scheduler.FetchQueue`), the most severe
+        # rule's level by default
+        self.priority = options.get('priority', min(
+            LEVELS.get(rule['level'], 99) for rule in self.rules + self.group_rules))
+
+        # Deadlines to notify failed targets again: a heap of (deadline, seq, target)
+        repeat_raw = options.get('repeat_interval', self.reactor.options['repeat_interval'])
+        self.repeat_interval = TimeUnit.from_interval(repeat_raw).convert_to(units.SECOND)
+        self.repeats = []
+        self.repeat_at = {}
+        self.repeat_seq = itertools.count()
+        # Levels of the targets before their state was reset to repeat notifications
+        self.repeated = {}
+
         if self.reactor.options.get('debug'):
             self.callback = ioloop.PeriodicCallback(self.load, 5000)
         else:
             self.callback = ioloop.PeriodicCallback(self.load, interval_ms)
+        self.callback_time = self.callback.callback_time
+
+    @property
+    def effective_interval(self):
+        """Get the current interval (stretched when the alert is overloaded)."""
+        return TimeUnit(self.interval.value * self.backoff, self.interval.unit)
+
+    def set_backoff(self, backoff):
+        """Stretch the alert's interval by the given factor."""
+        self.backoff = backoff
+        self.callback.callback_time = self.callback_time * backoff
 
     def convert(self, value):
         """Convert self value."""
@@ -148,85 +205,192 @@ class BaseAlert(_.with_metaclass(AlertFabric)):
         except (ValueError, TypeError):
             return value
 
-    def reset(self):
-        """Reset state to normal for all targets.
+    def repeat_due(self):
+        """Reset the state of the targets which were notified `repeat_interval` ago.
 
-        It will repeat notification if a metric is still failed.
+        The next check notifies them again if they are still failed.
         """
-        for target in self.state:
-            self.state[target] = "normal"
+        repeats = self.repeats
+        if not repeats:
+            return
+
+        now = self.reactor.loop.time()
+        while repeats and repeats[0][0] <= now:
+            deadline, _, target = heapq.heappop(repeats)
+            # Skip the deadlines of targets notified again since
+            if self.repeat_at.get(target) == deadline:
+                del self.repeat_at[target]
+                if target in self.state:
+                    self.repeated[target] = self.state[target]
+                    self.state[target] = 'normal'
+
+    def forget_repeat(self, target):
+        """Drop the target's repeat deadline.
+
+        The heap is rebuilt when most of its entries are stale.
+        """
+        if self.repeat_at.pop(target, None) is None:
+            return
+        if len(self.repeats) > 2 * len(self.repeat_at) + 16:
+            repeat_at = self.repeat_at
+            self.repeats = [item for item in self.repeats if repeat_at.get(item[2]) == item[0]]
+            heapq.heapify(self.repeats)
 
     def start(self):
         """Start checking."""
         self.callback.start()
-        self.load()
+        ioloop.IOLoop.current().add_callback(self.load)
 
     def stop(self):
         """Stop checking."""
         self.callback.stop()
 
-    def check(self, records):
-        """Check current value."""
+    def check(self, records, complete=True):
+        """Check current value.
+
+        :param complete bool: whether the records cover all the targets (when they do
+                              not, targets are not expired and group rules are skipped)
+        """
+        self.store.tick()
+        group = GroupRules(self.group_rules) if self.group_rules and complete else None
+
+        # Targets are checked in batches, a batch has at most one value for each target
+        batch, targets = [], set()
+        for record in records:
+            if record[1] in targets:
+                self.check_batch(batch, group)
+                batch, targets = [], set()
+            batch.append(record)
+            targets.add(record[1])
+        self.check_batch(batch, group)
+
+        if group is not None and group.total:
+            self.check_group(group)
+        if complete:
+            self.expire()
+
+    def check_group(self, group):
+        """Notify the level of the group rules."""
+        idx, value = group.evaluate()
+        rule = self.group_rules[idx]
+        LOGGER.info("%s [group]: %s", self.name, value)
+        self.notify('normal' if idx < 0 else rule['level'], value, 'group', rule=rule)
+
+    def check_batch(self, records, group=None):
+        """Check values of different targets at once."""
+        self.repeat_due()
+        store = self.store
+        values, tids = [], []
         for value, target in records:
-            LOGGER.info("%s [%s]: %s", self.name, target, value)
+            LOGGER.log(self.values_log_level, "%s [%s]: %s", self.name, target, value)
             if value is None:
-                self.notify(self.no_data, value, target)
+                tid = store.touch(target)
+                if self.group_only:
+                    store.set_level(tid, self.no_data)
+                else:
+                    self.notify(self.no_data, value, target)
                 continue
-            for rule in self.rules:
-                if self.evaluate_rule(rule, value, target):
-                    self.notify(rule['level'], value, target, rule=rule)
-                    break
-            else:
-                self.notify('normal', value, target, rule=rule)
-
-            self.history[target].append(value)
+            values.append(value)
+            tids.append(store.touch(target))
+
+        stats = self.stats
+        baselines = stats.baselines(tids, values) if stats else None
+        matched = evaluate_rules(self.rules, values, baselines)
+        if group is not None:
+            group.add(values, baselines)
+
+        levels, normal, repeated = store.levels, LEVEL_IDS['normal'], self.repeated
+        for tid, value, idx in zip(tids, values, matched):
+            # The last rule is reported with normal values
+            rule = self.rules[idx] if self.rules else None
+            code = normal if idx < 0 else LEVEL_IDS[rule['level']]
+            # Skip the notification if the level has not changed (or was reset to repeat it)
+            if levels[tid] != code or (repeated and store.targets[tid] in repeated):
+                if self.group_only:
+                    levels[tid] = code
+                else:
+                    self.notify('normal' if idx < 0 else rule['level'], value,
+                                store.targets[tid], rule=rule)
+            store.push(tid, value)
+            if stats:
+                stats.push(tid, value)
+
+    def expire(self):
+        """Forget targets which stopped reporting."""
+        if not (self.target_ttl or self.max_targets):
+            return
+
+        for target in self.store.stale(self.target_ttl, self.max_targets):
+            LOGGER.debug("%s [%s]: target has vanished", self.name, target)
+            # The target's level is forgotten with it
+            if not self.group_only:
+                self.notify(self.vanished, 'Target vanished', target, ntype='common')
+            self.store.remove(target)
+            self.forget_repeat(target)
+            self.repeated.pop(target, None)
 
     def evaluate_rule(self, rule, value, target):
         """Calculate the value."""
-        def evaluate(expr):
-            if expr in LOGICAL_OPERATORS.values():
-                return expr
-            rvalue = self.get_value_for_expr(expr, target)
-            if rvalue is None:
-                return False  # ignore this result
-            return expr['op'](value, rvalue)
-
-        evaluated = [evaluate(expr) for expr in rule['exprs']]
-        while len(evaluated) > 1:
-            lhs, logical_op, rhs = (evaluated.pop(0) for _ in range(3))
-            evaluated.insert(0, logical_op(lhs, rhs))
-
-        return evaluated[0]
+        tid = self.store.ids.get(target)
+        baselines = None
+        if self.stats and tid is not None:
+            baselines = self.stats.baselines([tid], [value])
+        return evaluate_rules([rule], [value], baselines)[0] == 0
 
     def get_value_for_expr(self, expr, target):
-        """I have no idea."""
+        """Get the right side value of the expression for the target."""
         if expr in LOGICAL_OPERATORS.values():
             return None
         rvalue = expr['value']
-        if rvalue == HISTORICAL:
-            history = self.history[target]
-            if len(history) < self.history_size:
+        if is_baseline(rvalue):
+            tid = self.store.ids.get(target)
+            if tid is None or not self.stats:
+                return None
+            rvalue = self.stats.baselines([tid], [0.0])[rvalue][0]
+            if rvalue is None:
                 return None
-            rvalue = sum(history) / float(len(history))
 
         rvalue = expr['mod'](rvalue)
         return rvalue
 
     def notify(self, level, value, target=None, ntype=None, rule=None):
         """Notify main reactor about event."""
+        self.repeat_due()
+
+        # A repeated notification is not a transition of the level
+        state = self.state.get(target)
+        previous = self.repeated.pop(target, state) if self.repeated else state
+
         # Did we see the event before?
-        if target in self.state and level == self.state[target]:
+        if target in self.state and level == state:
+            self.journal(target, previous, level, value, rule)
             return False
 
         # Do we see the event first time?
         if target not in self.state and level == 'normal' \
                 and not self.reactor.options['send_initial']:
+            # Remember the level so the target is not notified until it changes
+            self.state[target] = level
             return False
 
+        self.journal(target, previous, level, value, rule)
+
         self.state[target] = level
+        if level == 'normal':
+            self.forget_repeat(target)
+        else:
+            deadline = self.reactor.loop.time() + self.repeat_interval
+            self.repeat_at[target] = deadline
+            heapq.heappush(self.repeats, (deadline, next(self.repeat_seq), target))
         return self.reactor.notify(level, self, value, target=target, ntype=ntype, rule=rule)
 
-    def load(self):
+    def journal(self, target, previous, level, value, rule=None):
+        """Record a transition of the target's level to the reactor's journal."""
+        if self.reactor.journal is not None and previous != level:
+            self.reactor.journal.record(
+                self.name, target, previous, level, value, rule and rule['raw'])
+
+    async def load(self):
         """Load from remote."""
         raise NotImplementedError()
 
@@ -251,51 +415,198 @@ class GraphiteAlert(BaseAlert):
         self.auth_password = self.reactor.options.get('auth_password')
         self.validate_cert = self.reactor.options.get('validate_cert', True)
 
+        self.incremental = options.get('incremental', self.reactor.options['incremental'])
+        self.window_size = self.time_window.convert_to(units.SECOND)
+        self.windows = {}
+        self.fetched_until = None
+        # A query shared with other alerts (see `planner.plan`)
+        self.shared = None
+
+        self.compression = options.get('compression', self.reactor.options['compression'])
+        self.parser = None
+
+        # Limits of the responses (see `RawParser`)
+        self.max_series = options.get('max_series', self.reactor.options['max_series'])
+        self.max_response_bytes = options.get(
+            'max_response_bytes', self.reactor.options['max_response_bytes'])
+        self.oversized = options.get('oversized', self.reactor.options['oversized'])
+        # Counted by `estimator.CostEstimator`
+        self.estimated_series = None
+
+        # Request the top series only, all the series are requested every `top_sweep`
+        self.top = options.get('top')
+        self.top_sweep = TimeUnit.from_interval(
+            options.get('top_sweep', self.reactor.options['top_sweep'])).convert_to(units.SECOND)
+        self.swept_at = None
+        self.top_request = None
+        if self.top:
+            assert not self.incremental, \
+                "%s: top is not supported by incremental alerts" % self.name
+            self.top_request = self._render_request(self._graphite_url(
+                top_query(self.query, self.top_direction(), self.method, self.top),
+                graphite_url=self.reactor.options.get('graphite_url'), raw_data=True),
+                streaming_callback=self._on_chunk)
+
         self.url = self._graphite_url(
             self.query, graphite_url=self.reactor.options.get('graphite_url'), raw_data=True)
+        self.request = self._render_request(self.url, streaming_callback=self._on_chunk)
+        self._graph_urls = lru_cache(GRAPH_URLS_CACHE_SIZE)(self._graph_url)
         LOGGER.debug('%s: url = %s', self.name, self.url)
 
-    @gen.coroutine
-    def load(self):
+    def top_direction(self):
+        """Get the direction of the failing values (highest or lowest).
+
+        :raises AssertionError: when the rules fail on values of both directions or
+                                compare them with baselines
+        """
+        directions = set()
+        for rule in self.rules:
+            if rule['level'] == 'normal':
+                continue
+            for expr in rule['exprs'][::2]:
+                assert not (is_baseline(expr['value']) or 'stat' in expr), \
+                    "%s: top rules should compare values with numbers" % self.name
+                if expr['op'] in (COMPARATORS['>'], COMPARATORS['>=']):
+                    directions.add('highest')
+                elif expr['op'] in (COMPARATORS['<'], COMPARATORS['<=']):
+                    directions.add('lowest')
+                else:
+                    directions.add(None)
+        assert len(directions) == 1 and None not in directions, \
+            "%s: top rules should fail on either high or low values" % self.name
+        return directions.pop()
+
+    async def load(self):
         """Load data from Graphite."""
         LOGGER.debug('%s: start checking: %s', self.name, self.query)
-        if self.waiting:
-            self.notify('warning', 'Process takes too much time', target='waiting', ntype='common')
-        else:
-            self.waiting = True
+        if not self.reactor.overload.acquire(self):
+            return
+
+        request = self.request
+        if self.incremental and self.fetched_until:
+            request = self._render_request(self._graphite_url(
+                self.query, graphite_url=self.reactor.options.get('graphite_url'),
+                raw_data=True, since=self.fetched_until), streaming_callback=self._on_chunk)
+
+        # Targets which are out of the top keep their levels until the next sweep
+        now, sweep = self.reactor.loop.time(), not self.top
+        if self.top:
+            sweep = self.swept_at is None or now - self.swept_at >= self.top_sweep
+            if not sweep:
+                request = self.top_request
+
+        self.parser = parser = RawParser(
+            self.default_nan_value, self.ignore_nan, self.max_series, self.max_response_bytes)
+        try:
             try:
-                response = yield self.client.fetch(self.url, auth_username=self.auth_username,
-                                                   auth_password=self.auth_password,
-                                                   request_timeout=self.request_timeout,
-                                                   connect_timeout=self.connect_timeout,
-                                                   validate_cert=self.validate_cert)
-                records = (
-                    GraphiteRecord(line, self.default_nan_value, self.ignore_nan)
-                    for line in response.buffer)
+                if self.shared is not None:
+                    for line in await self.shared.fetch(self):
+                        parser.feed(line)
+                else:
+                    await self.reactor.fetches.acquire(self.priority)
+                    try:
+                        await self.client.fetch(request)
+                    finally:
+                        self.reactor.fetches.release()
+                records = parser.close()
+            except Exception:
+                # The client reports an aborted response as a closed connection
+                if parser.oversized is not None:
+                    raise parser.oversized
+                raise
+            if 'oversized' in self.state:
+                self.notify('normal', 'Response size is OK', target='oversized', ntype='common')
+            if self.incremental:
+                data = self.merge(records)
+            else:
                 data = [
                     (None if record.empty else getattr(record, self.method), record.target)
                     for record in records]
-                if len(data) == 0:
-                    raise ValueError('No data')
-                self.check(data)
-                self.notify('normal', 'Metrics are loaded', target='loading', ntype='common')
-            except Exception as e:
-                self.notify(
-                    self.loading_error, 'Loading error: %s' % e, target='loading', ntype='common')
-            self.waiting = False
+            if len(data) == 0:
+                raise ValueError('No data')
+            self.check(data, complete=sweep)
+            if self.top and sweep:
+                self.swept_at = now
+            self.notify('normal', 'Metrics are loaded', target='loading', ntype='common')
+        except ResponseTooLarge as e:
+            self.store.pin('oversized')
+            self.notify(self.oversized, str(e), target='oversized', ntype='common')
+        except Exception as e:
+            self.notify(
+                self.loading_error, 'Loading error: %s' % e, target='loading', ntype='common')
+        self.parser = None
+        self.reactor.overload.release(self)
+
+    def merge(self, records):
+        """Merge new points into the windows of targets.
+
+        The next load requests the points after the earliest last point of the targets
+        (Graphite starts the series one step after `from`).
+        """
+        windows, data, since = {}, [], None
+        for record in records:
+            window = self.windows.get(record.target)
+            if window is None:
+                window = RollingWindow(self.window_size)
+            windows[record.target] = window
+
+            last = window.last_timestamp
+            for timestamp, value in record.points:
+                if last is None or timestamp > last:
+                    window.push(timestamp, value)
+            # The last point of a series is at `end_time - step`
+            window.trim(record.end_time - record.step)
+
+            data.append((getattr(window, self.method) if window else None, record.target))
+
+            # Targets without new points should not make us request the whole window again
+            start = record.end_time - record.step - self.window_size
+            if window:
+                start = max(start, window.last_timestamp)
+            since = start if since is None else min(since, start)
+
+        self.windows = windows
+        self.fetched_until = since and int(since)
+        return data
 
     def get_graph_url(self, target, graphite_url=None):
-        """Get Graphite URL."""
+        """Get Graphite URL (the latest URLs are cached)."""
+        return self._graph_urls(target, graphite_url)
+
+    def _graph_url(self, target, graphite_url):
         return self._graphite_url(target, graphite_url=graphite_url, raw_data=False)
 
-    def _graphite_url(self, query, raw_data=False, graphite_url=None):
+    def _render_request(self, url, streaming_callback=None):
+        """Build a request to Graphite render API.
+
+        Responses are requested gzipped (when `compression` is enabled) and are
+        decompressed as they are received.
+        """
+        return hc.HTTPRequest(
+            url, auth_username=self.auth_username, auth_password=self.auth_password,
+            request_timeout=self.request_timeout, connect_timeout=self.connect_timeout,
+            validate_cert=self.validate_cert, decompress_response=self.compression,
+            streaming_callback=streaming_callback,
+            header_callback=streaming_callback and self._on_render_header)
+
+    def _on_chunk(self, chunk):
+        """Parse a chunk of the response."""
+        self.parser.feed(chunk)
+
+    def _on_render_header(self, line):
+        """Reject a response by its length before it is received."""
+        name, _, value = line.partition(':')
+        if name.lower() == 'content-length' and value.strip().isdigit():
+            self.parser.check_size(int(value))
+
+    def _graphite_url(self, query, raw_data=False, graphite_url=None, since=None):
         """Build Graphite URL."""
         query = escape.url_escape(query)
         graphite_url = graphite_url or self.reactor.options.get('public_graphite_url')
 
-        url = "{base}/render/?target={query}&from=-{from_time}&until=-{until}".format(
+        url = "{base}/render/?target={query}&from={from_time}&until=-{until}".format(
             base=graphite_url, query=query,
-            from_time=self.from_time.as_graphite(),
+            from_time=since if since else '-' + self.from_time.as_graphite(),
             until=self.until.as_graphite(),
         )
         if raw_data:
@@ -305,33 +616,181 @@ class GraphiteAlert(BaseAlert):
 
 class URLAlert(BaseAlert):
 
-    """Check URLs."""
+    """Check URLs.
+
+    The checked value is the response status, or the time to the first byte of the
+    response or the total time of the request in seconds (see the `value` option).
+    Response bodies are not read into memory.
+    """
 
     source = 'url'
 
+    def configure(self, **options):
+        """Configure the alert."""
+        super(URLAlert, self).configure(**options)
+        self.value = options.get('value', 'status')
+        assert self.value in URL_VALUES, "Value is invalid"
+        self.host = urlsplit(self.query).netloc
+        self.started = self.first_byte = None
+        # Bodies are discarded, so a compressed body is not decompressed
+        compression = options.get('compression', self.reactor.options['compression'])
+        self.request = hc.HTTPRequest(
+            self.query, method=options.get('method', 'GET'),
+            request_timeout=self.request_timeout,
+            connect_timeout=self.connect_timeout,
+            validate_cert=options.get('validate_cert', True),
+            headers={'Accept-Encoding': 'gzip'} if compression else None,
+            decompress_response=False,
+            header_callback=self._on_header, streaming_callback=_discard)
+
     @staticmethod
     def get_data(response):
         """Value is response.status."""
         return response.code
 
-    @gen.coroutine
-    def load(self):
+    async def load(self):
         """Load URL."""
         LOGGER.debug('%s: start checking: %s', self.name, self.query)
-        if self.waiting:
-            self.notify('warning', 'Process takes too much time', target='waiting', ntype='common')
-        else:
-            self.waiting = True
+        if not self.reactor.overload.acquire(self):
+            return
+
+        semaphore = self.reactor.hosts.get(self.host)
+        if semaphore is not None:
+            await semaphore.acquire()
+
+        try:
+            await self.reactor.fetches.acquire(self.priority)
             try:
-                response = yield self.client.fetch(
-                    self.query, method=self.options.get('method', 'GET'),
-                    request_timeout=self.request_timeout,
-                    connect_timeout=self.connect_timeout,
-                    validate_cert=self.options.get('validate_cert', True))
-                self.check([(self.get_data(response), self.query)])
-                self.notify('normal', 'Metrics are loaded', target='loading', ntype='common')
-
-            except Exception as e:
-                self.notify('critical', str(e), target='loading', ntype='common')
-
-            self.waiting = False
+                self.started, self.first_byte = self.reactor.loop.time(), None
+                response = await self.client.fetch(self.request)
+            finally:
+                self.reactor.fetches.release()
+
+            if self.value == 'ttfb':
+                value = self.first_byte if self.first_byte is not None else response.request_time
+            elif self.value == 'total':
+                value = self.reactor.loop.time() - self.started
+            else:
+                value = self.get_data(response)
+            self.check([(value, self.query)])
+            self.notify('normal', 'Metrics are loaded', target='loading', ntype='common')
+
+        except Exception as e:
+            self.notify('critical', str(e), target='loading', ntype='common')
+
+        finally:
+            if semaphore is not None:
+                semaphore.release()
+
+        self.reactor.overload.release(self)
+
+    def _on_header(self, line):  # pylint: disable=unused-argument
+        """Remember the time to the first byte."""
+        if self.first_byte is None:
+            self.first_byte = self.reactor.loop.time() - self.started
+
+
+def _discard(chunk):  # pylint: disable=unused-argument
+    """Skip a chunk of response body."""
+
+
+class CarbonAlert(GraphiteAlert):
+
+    """Check metrics pushed with the carbon protocols.
+
+    Points are checked as they arrive, the periodic callback only expires old data.
+    """
+
+    source = 'carbon'
+    # Every pushed point is checked
+    values_log_level = logging.DEBUG
+
+    def configure(self, **options):
+        """Configure the alert."""
+        super(CarbonAlert, self).configure(**options)
+        assert not self.group_rules, "%s: carbon alerts do not support group rules" % self.name
+
+    def start(self):
+        """Start receiving points."""
+        self.reactor.carbon.register(self)
+        self.callback.start()
+
+    def stop(self):
+        """Stop receiving points."""
+        self.reactor.carbon.unregister(self)
+        self.callback.stop()
+
+    def receive(self, target, value, timestamp):
+        """Check a received point."""
+        if value != value or (self.ignore_nan and value == self.default_nan_value):
+            return
+
+        window = self.windows.get(target)
+        if window is None:
+            window = self.windows[target] = RollingWindow(self.window_size)
+        window.push(timestamp, value)
+        self.check_batch([(getattr(window, self.method), target)])
+
+    async def load(self):
+        """Forget points which are out of the time window."""
+        self.store.tick()
+        now = time.time() - self.until.convert_to(units.SECOND)
+        for target, window in list(self.windows.items()):
+            window.trim(now)
+            if not window:
+                del self.windows[target]
+                self.check_batch([(None, target)])
+        self.expire()
+
+
+class WhisperAlert(GraphiteAlert):
+
+    """Check metrics in the Whisper files of a local carbon storage.
+
+    The query is resolved against the storage directory, the files are read in a
+    thread so the event loop is not blocked by disk I/O.
+    """
+
+    source = 'whisper'
+
+    def configure(self, **options):
+        """Configure the alert."""
+        super(WhisperAlert, self).configure(**options)
+        self.storage = options.get('storage', self.reactor.options['whisper_storage'])
+
+    async def load(self):
+        """Read the metrics."""
+        LOGGER.debug('%s: start checking: %s', self.name, self.query)
+        if not self.reactor.overload.acquire(self):
+            return
+
+        try:
+            data = await self.reactor.loop.run_in_executor(None, self.read)
+            if len(data) == 0:
+                raise ValueError('No data')
+            self.check(data)
+            self.notify('normal', 'Metrics are loaded', target='loading', ntype='common')
+        except Exception as e:
+            self.notify(
+                self.loading_error, 'Loading error: %s' % e, target='loading', ntype='common')
+        self.reactor.overload.release(self)
+
+    def read(self, now=None):
+        """Aggregate the points of the time window of the matched metrics."""
+        now = now or time.time()
+        until_time = now - self.until.convert_to(units.SECOND)
+        from_time = until_time - self.time_window.convert_to(units.SECOND)
+
+        data = []
+        for target, path in whisper.find(self.storage, self.query):
+            try:
+                fetched = whisper.fetch(path, from_time, until_time, now=now)
+            except (OSError, ValueError) as e:
+                LOGGER.warning('%s [%s]: skip %s: %s', self.name, target, path, e)
+                continue
+            series = fetched and whisper.WhisperSeries(
+                target, *fetched, default_nan_value=self.default_nan_value,
+                ignore_nan=self.ignore_nan)
+            data.append((
+                getattr(series, self.method) if series and not series.empty else None, target))
+        return data
@@ -1,3 +1,4 @@
+import asyncio
 import os.path
 import signal
 import sys
@@ -15,6 +16,7 @@ define('config', default=None,
        help='Path to a JSON or YAML config file (default config.json)')
 define('pidfile', default=Reactor.defaults['pidfile'], help='Set pid file')
 define('graphite_url', default=Reactor.defaults['graphite_url'], help='Graphite URL')
+define('uvloop', default=False, type=bool, help='Run on uvloop (should be installed)')
 
 
 def run():
@@ -22,6 +24,14 @@ def run():
 
     options_dict = options.as_dict()
 
+    if options_dict.pop('uvloop', False):
+        try:
+            import uvloop
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        except ImportError:
+            LOGGER.error("uvloop must be installed to use it.")
+            sys.exit(1)
+
     if not options_dict.get('config', None):
         if os.path.isfile(DEFAULT_CONFIG_PATH):
             options_dict['config'] = DEFAULT_CONFIG_PATH
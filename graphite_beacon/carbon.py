@@ -0,0 +1,181 @@
+"""Receive metrics pushed with the carbon protocols.
+
+Supported are the plaintext protocol over TCP and UDP (`<path> <value> <timestamp>`)
+and the pickle protocol over TCP (a 4 bytes length header then a pickled list of
+`(path, (timestamp, value))`).
+"""
+
+import io
+import pickle
+import socket
+import struct
+
+from tornado import ioloop, log, tcpserver
+from tornado.iostream import StreamClosedError
+
+from .patterns import PatternIndex
+
+LOGGER = log.gen_log
+
+PICKLE_HEADER = struct.Struct('!L')
+MAX_PICKLE_LENGTH = 2 ** 20
+MAX_DATAGRAM = 65535
+
+
+def parse_line(line):
+    """Parse a plaintext protocol line.
+
+    :return: a tuple of (path, value, timestamp)
+    :rtype: (str, float, float)
+    """
+    if isinstance(line, bytes):
+        line = line.decode('utf-8')
+    path, value, timestamp = line.split()
+    return path, float(value), float(timestamp)
+
+
+class SafeUnpickler(pickle.Unpickler):
+
+    """Do not let the network load any classes."""
+
+    def find_class(self, module, name):
+        raise pickle.UnpicklingError('Forbidden global: %s.%s' % (module, name))
+
+
+def parse_pickle(data):
+    """Parse a pickle protocol payload.
+
+    :return: a list of (path, value, timestamp)
+    :rtype: list
+    """
+    points = SafeUnpickler(io.BytesIO(data)).load()
+    return [(str(path), float(value), float(timestamp))
+            for path, (timestamp, value) in points]
+
+
+class CarbonServer(tcpserver.TCPServer):
+
+    """Accept carbon TCP connections."""
+
+    def __init__(self, receiver, protocol='plaintext'):
+        super().__init__()
+        self.receiver = receiver
+        self.protocol = protocol
+
+    async def handle_stream(self, stream, address):
+        try:
+            while True:
+                if self.protocol == 'pickle':
+                    header = await stream.read_bytes(PICKLE_HEADER.size)
+                    length, = PICKLE_HEADER.unpack(header)
+                    if length > MAX_PICKLE_LENGTH:
+                        LOGGER.warning('Carbon: too long pickle from %s', address)
+                        stream.close()
+                        return
+                    points = parse_pickle(await stream.read_bytes(length))
+                else:
+                    line = await stream.read_until(b'\n', max_bytes=MAX_DATAGRAM)
+                    try:
+                        points = [parse_line(line)]
+                    except ValueError as e:
+                        LOGGER.warning('Carbon: invalid line %r: %s', line, e)
+                        continue
+                self.receiver.receive(points)
+        except StreamClosedError:
+            pass
+        except Exception as e:
+            LOGGER.warning('Carbon: invalid data from %s: %s', address, e)
+            stream.close()
+
+
+class CarbonReceiver(object):
+
+    """Listen to carbon ports and route the points to carbon alerts."""
+
+    defaults = {
+        'host': '127.0.0.1',
+        'port': 2003,
+        'pickle_port': None,
+        'udp_port': None,
+    }
+
+    def __init__(self, reactor):
+        self.reactor = reactor
+        self.alerts = PatternIndex()
+        self.servers = []
+        self.udp = None
+
+    @property
+    def is_listening(self):
+        return bool(self.servers or self.udp)
+
+    def register(self, alert):
+        """Route points matched the alert's query to the alert."""
+        if not self.is_listening:
+            self.listen()
+        self.alerts.add(alert.query, alert)
+
+    def unregister(self, alert):
+        self.alerts.remove(alert)
+        if not self.alerts:
+            self.close()
+
+    def match(self, path):
+        """Get the alerts interested in the path."""
+        return self.alerts.match(path)
+
+    def receive(self, points):
+        for path, value, timestamp in points:
+            for alert in self.match(path):
+                alert.receive(path, value, timestamp)
+
+    def listen(self):
+        options = dict(self.defaults, **self.reactor.options.get('carbon', {}))
+        host = options['host']
+
+        if options['port']:
+            server = CarbonServer(self)
+            server.listen(options['port'], address=host)
+            self.servers.append(server)
+
+        if options['pickle_port']:
+            server = CarbonServer(self, protocol='pickle')
+            server.listen(options['pickle_port'], address=host)
+            self.servers.append(server)
+
+        if options['udp_port']:
+            self.udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.udp.setblocking(False)
+            self.udp.bind((host, options['udp_port']))
+            ioloop.IOLoop.current().add_handler(
+                self.udp.fileno(), self.handle_datagrams, ioloop.IOLoop.READ)
+
+        LOGGER.info('Carbon: listening on %s (%s)', host, ', '.join(
+            '%s=%s' % (name, options[name]) for name in ('port', 'pickle_port', 'udp_port')))
+
+    def handle_datagrams(self, fd, events):  # pylint: disable=unused-argument
+        while True:
+            try:
+                data = self.udp.recv(MAX_DATAGRAM)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                LOGGER.warning('Carbon: UDP receive failed: %s', e)
+                return
+            points = []
+            for line in data.splitlines():
+                try:
+                    points.append(parse_line(line))
+                except ValueError as e:
+                    LOGGER.warning('Carbon: invalid line %r: %s', line, e)
+            self.receive(points)
+
+    def close(self):
+        for server in self.servers:
+            server.stop()
+        self.servers = []
+
+        if self.udp:
+            ioloop.IOLoop.current().remove_handler(self.udp.fileno())
+            self.udp.close()
+            self.udp = None
@@ -5,11 +5,22 @@ from re import compile as re
 from re import M
 
 import yaml
-from tornado import ioloop, log
+from tornado import gen, ioloop, log
+from tornado.httpclient import AsyncHTTPClient
 
 from .alerts import BaseAlert
+from .carbon import CarbonReceiver
+from .estimator import CostEstimator
 from .handlers import registry
-from .units import MILLISECOND, TimeUnit
+from .journal import Journal
+from .planner import plan
+from .scheduler import FetchQueue, HostLimiter, OverloadController
+from .units import TimeUnit
+
+try:
+    import pycurl
+except ImportError:
+    pycurl = None
 
 LOGGER = log.gen_log
 
@@ -46,26 +57,65 @@ class Reactor(object):
         'default_nan_value': 0,
         'ignore_nan': False,
         'loading_error': 'critical',
+        'max_inflight': None,
+        'max_backoff': 8,
+        'target_ttl': None,
+        'max_targets': None,
+        'incremental': False,
+        'top_sweep': '1hour',
+        'merge_queries': False,
+        'max_merged_paths': 100,
+        'whisper_storage': '/opt/graphite/storage/whisper',
+        'ewma_alpha': 0.1,
+        'season': '1day',
+        'seasonal_alpha': 0.2,
+        'seasonal_beta': 0.01,
+        'seasonal_gamma': 0.3,
+        'vanished': 'normal',
+        'max_clients': 10,
+        'reserved_clients': 5,
+        'max_host_connections': None,
+        'fetch_aging': 1.0,
+        'curl': False,
+        'compression': True,
+        'max_series': None,
+        'max_response_bytes': None,
+        'oversized': 'critical',
+        'estimate_series': False,
+        'retries': 3,
+        'retry_delay': 1.0,
+        'retry_max_delay': 60.0,
+        'breaker_threshold': 5,
+        'breaker_timeout': '1minute',
+        'spool': None,
+        'journal': None,
+        'journal_segment_size': 16777216,
+        'journal_segments': 16,
         'alerts': []
     }
 
     def __init__(self, **options):
         self.alerts = set()
-        self.loop = ioloop.IOLoop.instance()
+        self.loop = ioloop.IOLoop.current()
         self.options = dict(self.defaults)
+        self.overload = OverloadController()
+        self.hosts = HostLimiter()
+        self.fetches = FetchQueue()
+        self.carbon = CarbonReceiver(self)
+        self.running = False
+        self.journal = None
+        self.estimator = CostEstimator(self)
         self.reinit(**options)
 
         repeat_interval = TimeUnit.from_interval(self.options['repeat_interval'])
-        LOGGER.info("Alarm reset interval is {}".format(repeat_interval))
-        self.callback = ioloop.PeriodicCallback(
-            self.repeat, repeat_interval.convert_to(MILLISECOND))
+        LOGGER.info("Alarm repeat interval is {}".format(repeat_interval))
 
     def is_running(self):
         """Check whether the reactor is running.
 
         :rtype: bool
         """
-        return hasattr(self, 'callback') and self.callback.is_running()
+        return self.running
 
     def reinit(self, **options):  # pylint: disable=unused-argument
         LOGGER.info('Read configuration')
@@ -84,6 +134,14 @@ class Reactor(object):
             self.options['public_graphite_url'] = self.options['graphite_url']
 
         LOGGER.setLevel(self.options.get('logging', 'info').upper())
+
+        self.overload.budget = self.options['max_inflight']
+        self.overload.max_backoff = self.options['max_backoff']
+        self.hosts = HostLimiter(self.options['max_host_connections'])
+        self.fetches.limit = self.options['max_clients']
+        self.fetches.aging = self.options['fetch_aging']
+        self.configure_client()
+        self.configure_journal()
         registry.clean()
 
         self.handlers = {'warning': set(), 'critical': set(), 'normal': set()}
@@ -95,6 +153,10 @@ class Reactor(object):
 
         self.alerts = set(
             BaseAlert.get(self, **opts) for opts in self.options.get('alerts'))  # pylint: disable=no-member
+        self.shared = plan(
+            self.alerts, self.options['max_merged_paths']) if self.options['merge_queries'] else []
+        if self.options['estimate_series']:
+            self.loop.add_callback(self.estimator.check, list(self.alerts))
 
         # Only auto-start alerts if the reactor is already running
         if self.is_running():
@@ -104,6 +166,36 @@ class Reactor(object):
         LOGGER.debug(json.dumps(self.options, indent=2))
         return self
 
+    def configure_client(self):
+        """Configure HTTP clients (applied to the clients which are not created yet).
+
+        Alert fetches are limited to `max_clients` by the fetch queue, the clients
+        are larger so notifications, the series estimator and Telegram's long poll
+        do not take the fetches' slots (admitted fetches would wait inside the client
+        in FIFO order and the priorities would not hold).
+        """
+        impl = None
+        if self.options['curl']:
+            if pycurl is None:
+                LOGGER.error('pycurl is not installed, keep-alive connections are disabled')
+            else:
+                impl = 'tornado.curl_httpclient.CurlAsyncHTTPClient'
+        AsyncHTTPClient.configure(impl, max_clients=(
+            self.options['max_clients'] + self.options['reserved_clients']))
+
+    def configure_journal(self):
+        """Open the journal of transitions (or close it when it is disabled)."""
+        directory = self.options['journal']
+        if self.journal is not None and self.journal.directory != directory:
+            self.journal.stop()
+            self.journal = None
+        if directory and self.journal is None:
+            self.journal = Journal(
+                directory, segment_size=self.options['journal_segment_size'],
+                max_segments=self.options['journal_segments'])
+            if self.is_running():
+                self.journal.start()
+
     def remove_alerts(self):
         for alert in list(self.alerts):
             alert.stop()
@@ -141,29 +233,43 @@ class Reactor(object):
                 LOGGER.error('Handler "%s" did not init. Error: %s' % (name, e))
 
     def repeat(self):
-        LOGGER.info('Reset alerts')
+        """Reset the failed targets whose repeat deadlines have passed.
+
+        Only the due deadlines are processed (see `BaseAlert.repeat_due`), the next
+        checks notify the targets again if they are still failed.
+        """
         for alert in self.alerts:
-            alert.reset()
+            alert.repeat_due()
 
     def start(self, start_loop=True):
         """Start all the things.
 
+        The reactor runs on the current asyncio event loop, so it can be embedded into any
+        asyncio application with `start_loop=False`.
+
         :param start_loop bool: whether to start the ioloop. should be False if
                                 the IOLoop is managed externally
         """
+        self.loop = ioloop.IOLoop.current()
         self.start_alerts()
+        for handler in set(handler for handlers in self.handlers.values() for handler in handlers):
+            self.loop.add_callback(handler.replay)
         if self.options.get('pidfile'):
             with open(self.options.get('pidfile'), 'w') as fpid:
                 fpid.write(str(os.getpid()))
-        self.callback.start()
+        self.running = True
+        if self.journal is not None:
+            self.journal.start()
         LOGGER.info('Reactor starts')
 
         if start_loop:
             self.loop.start()
 
     def stop(self, stop_loop=True):
-        self.callback.stop()
+        self.running = False
         self.remove_alerts()
+        if self.journal is not None:
+            self.journal.stop()
         if stop_loop:
             self.loop.stop()
         if self.options.get('pidfile'):
@@ -179,7 +285,13 @@ class Reactor(object):
             ntype = alert.source
 
         for handler in self.handlers.get(level, []):
-            handler.notify(level, alert, value, target=target, ntype=ntype, rule=rule)
+            self.loop.add_future(gen.convert_yielded(handler.deliver(
+                level, alert, value, target=target, ntype=ntype, rule=rule)), _raise_error)
+
+
+def _raise_error(future):
+    """Let the loop log an error of a finished handler."""
+    future.result()
 
 
 def _get_loader(config):
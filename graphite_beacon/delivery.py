@@ -0,0 +1,141 @@
+"""Deliver notifications reliably: retries, circuit breakers, rate limits and an on-disk spool."""
+
+import json
+import os
+import random
+
+from tornado import gen, ioloop, locks, log
+
+LOGGER = log.gen_log
+
+
+def backoff_delay(attempt, base=1.0, limit=60.0):
+    """Get a delay before the next attempt (exponential backoff with full jitter)."""
+    return random.uniform(0, min(limit, base * 2 ** attempt))
+
+
+class CircuitBreaker(object):
+
+    """Fail fast while an endpoint is down.
+
+    The breaker opens after the given number of consecutive failures and lets a single
+    trial call through when the timeout has passed. A success closes the breaker, a
+    failure of the trial opens it again.
+    """
+
+    def __init__(self, threshold=5, timeout=60.0):
+        self.threshold = threshold
+        self.timeout = timeout
+        self.failures = 0
+        self.opened = None
+        self.probing = False
+
+    @property
+    def is_open(self):
+        return self.opened is not None
+
+    def allow(self, now):
+        """Check that a call can be made (the call must report its success or failure)."""
+        if self.opened is None:
+            return True
+        if self.probing or now - self.opened < self.timeout:
+            return False
+        self.probing = True
+        return True
+
+    def success(self):
+        self.failures = 0
+        self.opened = None
+        self.probing = False
+
+    def failure(self, now):
+        self.failures += 1
+        self.probing = False
+        if self.threshold and self.failures >= self.threshold:
+            if self.opened is None:
+                LOGGER.warning('Circuit breaker is open after %d failures', self.failures)
+            self.opened = now
+
+
+class RateLimiter(object):
+
+    """Spread calls to at most `rate` calls per second."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.next_slot = 0.0
+
+    async def acquire(self):
+        """Wait for a free slot."""
+        if not self.rate:
+            return
+
+        now = ioloop.IOLoop.current().time()
+        slot = max(now, self.next_slot)
+        self.next_slot = slot + 1.0 / self.rate
+        if slot > now:
+            await gen.sleep(slot - now)
+
+
+class Spool(object):
+
+    """Keep undelivered notifications in a JSON lines file.
+
+    The files are read and written in the loop's executor. Taken records are kept in
+    a second file until they are replayed, so they are not lost (but replayed again)
+    when the process stops in the middle of a replay.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.taken = path + '.replay'
+        self.lock = locks.Lock()
+
+    @property
+    def pending(self):
+        return any(os.path.exists(path) and os.path.getsize(path) > 0
+                   for path in (self.path, self.taken))
+
+    async def append(self, record):
+        async with self.lock:
+            await ioloop.IOLoop.current().run_in_executor(
+                None, self._append, json.dumps(record) + '\n')
+
+    def _append(self, line):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(self.path, 'a') as fspool:
+            fspool.write(line)
+
+    async def take(self):
+        """Take the spooled records (new records go to a new file).
+
+        The records are taken again until `done` is called.
+        """
+        async with self.lock:
+            return await ioloop.IOLoop.current().run_in_executor(None, self._take)
+
+    def _take(self):
+        if not os.path.exists(self.taken):
+            if not os.path.exists(self.path):
+                return []
+            os.rename(self.path, self.taken)
+
+        records = []
+        with open(self.taken) as fspool:
+            for line in fspool:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    LOGGER.warning('Spool %s: skip invalid record %r', self.path, line)
+        return records
+
+    async def done(self):
+        """Forget the taken records."""
+        async with self.lock:
+            await ioloop.IOLoop.current().run_in_executor(None, self._done)
+
+    def _done(self):
+        if os.path.exists(self.taken):
+            os.remove(self.taken)
@@ -0,0 +1,119 @@
+"""Estimate the number of series the Graphite alerts request.
+
+The metric paths of an alert's query (the arguments of its functions) are counted
+with graphite-web's `/metrics/find` API. Counts are cached, so alerts which share
+paths (or a configuration which is loaded again) do not repeat the requests.
+
+Alerts which would exceed their `max_series` are notified before their first load
+(the responses are still limited by `RawParser` while they are loaded).
+"""
+
+import json
+import re
+
+from tornado import escape, httpclient, log
+
+LOGGER = log.gen_log
+QUOTED_RE = re.compile(r'"[^"]*"|\'[^\']*\'')
+KEYWORDS = {'true', 'false', 'none', 'True', 'False', 'None'}
+
+
+def query_paths(query):
+    """Get the metric paths of a Graphite query.
+
+    Quoted strings, numbers and keywords are skipped, commas inside braces are kept
+    (`servers.{web1,web2}.cpu`).
+
+    :rtype: list
+    """
+    query = QUOTED_RE.sub('', query)
+    paths, token, depth = [], [], 0
+    for char in query + ',':
+        if char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+        if depth <= 0 and (char in '(),' or char.isspace()):
+            # A token before "(" is a function name
+            if token and char != '(':
+                path = ''.join(token)
+                if path not in KEYWORDS and not _is_number(path) and path not in paths:
+                    paths.append(path)
+            token = []
+        else:
+            token.append(char)
+    return paths
+
+
+def _is_number(token):
+    try:
+        float(token)
+    except ValueError:
+        return False
+    return True
+
+
+class CostEstimator(object):
+
+    """Count the series of the alerts' queries.
+
+    :param ttl float: seconds to cache the counts for
+    """
+
+    def __init__(self, reactor, ttl=3600.0):
+        self.reactor = reactor
+        self.ttl = ttl
+        # Pattern -> (time, number of series)
+        self.cache = {}
+
+    async def count(self, alert, pattern):
+        """Count the series matched by a path pattern.
+
+        :rtype: int
+        """
+        now = self.reactor.loop.time()
+        cached = self.cache.get(pattern)
+        if cached is not None and now - cached[0] < self.ttl:
+            return cached[1]
+
+        url = '%s/metrics/find?query=%s' % (
+            self.reactor.options.get('graphite_url'), escape.url_escape(pattern))
+        response = await alert.client.fetch(httpclient.HTTPRequest(
+            url, auth_username=alert.auth_username, auth_password=alert.auth_password,
+            request_timeout=alert.request_timeout, connect_timeout=alert.connect_timeout,
+            validate_cert=alert.validate_cert))
+        count = sum(1 for node in json.loads(response.body.decode('utf-8')) if node.get('leaf'))
+        self.cache[pattern] = (now, count)
+        return count
+
+    async def estimate(self, alert):
+        """Estimate the number of series an alert requests.
+
+        :rtype: int
+        """
+        total = 0
+        for pattern in query_paths(alert.query):
+            total += await self.count(alert, pattern)
+        return total
+
+    async def check(self, alerts):
+        """Estimate the series of Graphite alerts and notify the oversized ones."""
+        for alert in sorted(alerts, key=lambda alert: alert.name):
+            if alert.source != 'graphite':
+                continue
+
+            try:
+                alert.estimated_series = await self.estimate(alert)
+            except Exception as e:
+                LOGGER.warning('%s: series are not estimated: %s', alert.name, e)
+                continue
+
+            LOGGER.info('%s: about %d series', alert.name, alert.estimated_series)
+            # Top alerts request at most `top` series on most loads
+            if alert.max_series is not None and alert.estimated_series > alert.max_series \
+                    and not alert.top:
+                alert.store.pin('oversized')
+                alert.notify(
+                    alert.oversized, 'Query matches about %d series (max_series is %d)' % (
+                        alert.estimated_series, alert.max_series),
+                    target='oversized', ntype='common')
@@ -0,0 +1,170 @@
+"""Evaluate alert rules for a batch of targets at once.
+
+NumPy is used when it is installed, there is a pure Python fallback otherwise.
+"""
+
+from .utils import is_baseline
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Small batches are cheaper to evaluate without NumPy
+NUMPY_THRESHOLD = 64
+
+
+def evaluate_rules(rules, values, baselines=None):
+    """Find the first matched rule for each value.
+
+    :param rules list: parsed rules (see `utils.parse_rule`)
+    :param values list: the values to check
+    :param baselines dict: lists of baselines (None when unknown) for each value by name,
+                           e.g. historical means or z-scores (see `stats.Statistics`)
+    :return: indexes of the matched rules (-1 when no rule is matched)
+    :rtype: list
+    """
+    if not values:
+        return []
+
+    baselines = baselines or {}
+    if np is not None and len(values) >= NUMPY_THRESHOLD:
+        return _evaluate_numpy(rules, values, baselines)
+    return _evaluate_python(rules, values, baselines)
+
+
+def _fold(exprs, evaluate):
+    """Combine results of expressions from left to right."""
+    result = evaluate(exprs[0])
+    for pos in range(1, len(exprs), 2):
+        result = exprs[pos](result, evaluate(exprs[pos + 1]))
+    return result
+
+
+def _evaluate_numpy(rules, values, baselines):
+    values = np.asarray(values, dtype=float)
+    arrays = dict(
+        (name, np.array([np.nan if item is None else item for item in items], dtype=float))
+        for name, items in baselines.items())
+    known = dict((name, ~np.isnan(array)) for name, array in arrays.items())
+    unknown = np.zeros(len(values), dtype=bool)
+
+    def evaluate(expr):
+        stat, rvalue = expr.get('stat'), expr['value']
+        if (stat and stat not in arrays) or (is_baseline(rvalue) and rvalue not in arrays):
+            return unknown
+
+        result = expr['op'](
+            arrays[stat] if stat else values,
+            expr['mod'](arrays[rvalue] if is_baseline(rvalue) else rvalue))
+        if stat:
+            result &= known[stat]
+        if is_baseline(rvalue):
+            result &= known[rvalue]
+        return result
+
+    matched = np.full(len(values), -1, dtype=np.int32)
+    with np.errstate(invalid='ignore'):
+        for idx, rule in enumerate(rules):
+            mask = _fold(rule['exprs'], evaluate)
+            matched[(matched < 0) & mask] = idx
+    return matched.tolist()
+
+
+def _evaluate_python(rules, values, baselines):
+    # Calculate constant values once per batch
+    constants = dict(
+        (id(expr), expr['mod'](expr['value']))
+        for rule in rules for expr in rule['exprs'][::2] if not is_baseline(expr['value']))
+
+    matched = []
+    for pos, value in enumerate(values):
+
+        def evaluate(expr, pos=pos, value=value):
+            rvalue = constants.get(id(expr))
+            if rvalue is None:
+                rvalue = baselines.get(expr['value'])
+                rvalue = rvalue and rvalue[pos]
+                if rvalue is None:
+                    return False
+                rvalue = expr['mod'](rvalue)
+            stat = expr.get('stat')
+            if stat:
+                value = baselines.get(stat)
+                value = value and value[pos]
+                if value is None:
+                    return False
+            return expr['op'](value, rvalue)
+
+        for idx, rule in enumerate(rules):
+            if _fold(rule['exprs'], evaluate):
+                matched.append(idx)
+                break
+        else:
+            matched.append(-1)
+    return matched
+
+
+class GroupRules(object):
+
+    """Aggregate the values of a check's targets for group rules.
+
+    Batches of values are added as they are checked, so the group rules are evaluated
+    in the same pass as the targets' rules.
+
+    :param rules list: parsed group rules (see `utils.parse_group_rule`)
+    """
+
+    def __init__(self, rules):
+        self.rules = rules
+        self.total = 0
+        # The number, sum, maximum and minimum of the values matched by each rule
+        self.aggregates = [[0, 0.0, None, None] for _ in rules]
+
+    def add(self, values, baselines=None):
+        """Aggregate a batch of values (see `evaluate_rules` for the baselines)."""
+        if not values:
+            return
+
+        self.total += len(values)
+        for rule, aggregates in zip(self.rules, self.aggregates):
+            matched = values
+            if rule['where'] is not None:
+                matched = [
+                    value for value, idx in zip(
+                        values, evaluate_rules([rule['where']], values, baselines))
+                    if idx == 0]
+            if not matched:
+                continue
+
+            high, low = max(matched), min(matched)
+            aggregates[0] += len(matched)
+            aggregates[1] += sum(matched)
+            aggregates[2] = high if aggregates[2] is None else max(aggregates[2], high)
+            aggregates[3] = low if aggregates[3] is None else min(aggregates[3], low)
+
+    def value(self, pos):
+        """Get the aggregate of a rule (None when there are no values to aggregate)."""
+        aggregate = self.rules[pos]['aggregate']
+        count, total, high, low = self.aggregates[pos]
+        if aggregate == 'count':
+            return count
+        if aggregate == 'percent':
+            return count * 100.0 / self.total if self.total else None
+        if aggregate == 'sum':
+            return total
+        if aggregate == 'avg':
+            return total / count if count else None
+        return high if aggregate == 'max' else low
+
+    def evaluate(self):
+        """Find the first matched group rule.
+
+        :return: (index of the rule or -1, its value or the last rule's one)
+        """
+        value = None
+        for pos, rule in enumerate(self.rules):
+            value = self.value(pos)
+            if value is not None and evaluate_rules([rule], [value])[0] == 0:
+                return pos, value
+        return -1, value
@@ -1,6 +1,229 @@
-class GraphiteRecord(object):
+import math
+import random
+from array import array
+from collections import deque
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Small series are cheaper to select from without NumPy
+NUMPY_THRESHOLD = 256
+
+# Graphite functions which keep the series with the highest/lowest aggregates
+TOP_FUNCTIONS = {
+    ('highest', 'average'): 'highestAverage',
+    ('highest', 'maximum'): 'highestMax',
+    ('highest', 'last_value'): 'highestCurrent',
+    ('lowest', 'average'): 'lowestAverage',
+    ('lowest', 'last_value'): 'lowestCurrent',
+}
+# Aggregation functions of the generic `highest`/`lowest` (graphite-web 1.1)
+TOP_AGGREGATES = {
+    'average': 'average', 'last_value': 'last', 'sum': 'sum', 'minimum': 'min',
+    'maximum': 'max', 'median': 'median'}
+
+
+def top_query(query, direction, method, count):
+    """Wrap a query to keep the `count` series with the highest/lowest aggregates.
+
+    :param direction str: highest or lowest
+    :param method str: the alert's method
+    :raises ValueError: when Graphite can not aggregate series with the method
+    """
+    function = TOP_FUNCTIONS.get((direction, method))
+    if function is not None:
+        return '%s(%s,%d)' % (function, query, count)
+    if method not in TOP_AGGREGATES:
+        raise ValueError('Method %s can not select top series' % method)
+    return "%s(%s,%d,'%s')" % (direction, query, count, TOP_AGGREGATES[method])
+
+
+def percentile_ranks(size, percent):
+    """Get the ranks of the values the percentile is calculated from.
+
+    The median of an even number of values is the average of the two middle values,
+    other percentiles use the nearest rank (like Graphite's `percentileOfSeries`).
+    """
+    if percent == 50 and size % 2 == 0:
+        return (size // 2 - 1, size // 2)
+    rank = max(int(math.ceil(percent / 100.0 * size)) - 1, 0)
+    return (rank,)
+
+
+def select(values, ranks):
+    """Find the values of the given ranks (as if the values were sorted).
+
+    Uses a partition instead of a full sort: NumPy's introselect for long series,
+    quickselect otherwise. Ranks are selected from the smallest one, each selection
+    only partitions the values right to the previous rank.
+
+    :return: the values by rank
+    :rtype: dict
+    """
+    ranks = sorted(set(ranks))
+    if np is not None and len(values) >= NUMPY_THRESHOLD:
+        selected = np.partition(np.asarray(values, dtype=float), ranks)
+        return dict((rank, float(selected[rank])) for rank in ranks)
+
+    values = list(values)
+    result, left = {}, 0
+    for rank in ranks:
+        result[rank] = _quickselect(values, left, len(values) - 1, rank)
+        left = rank + 1
+    return result
+
+
+def _quickselect(values, left, right, rank):
+    """Partition the values in place around the value of the rank and return it."""
+    while left < right:
+        pivot = values[random.randint(left, right)]
+        low, high = left, right
+        while low <= high:
+            while values[low] < pivot:
+                low += 1
+            while values[high] > pivot:
+                high -= 1
+            if low <= high:
+                values[low], values[high] = values[high], values[low]
+                low += 1
+                high -= 1
+        if rank <= high:
+            right = high
+        elif rank >= low:
+            left = low
+        else:
+            break
+    return values[rank]
+
+
+class Aggregates(object):
+
+    """Aggregate self.values."""
+
+    @property
+    def average(self):
+        return self.sum / len(self.values)
+
+    @property
+    def last_value(self):
+        return self.values[-1]
+
+    @property
+    def sum(self):
+        return sum(self.values)
+
+    @property
+    def minimum(self):
+        return min(self.values)
+
+    @property
+    def maximum(self):
+        return max(self.values)
+
+    @property
+    def median(self):
+        return self.percentile(50)
+
+    @property
+    def p90(self):
+        return self.percentile(90)
+
+    @property
+    def p95(self):
+        return self.percentile(95)
+
+    @property
+    def p99(self):
+        return self.percentile(99)
+
+    def percentile(self, percent):
+        """Select the percentile of the values (without sorting them)."""
+        ranks = percentile_ranks(len(self.values), percent)
+        selected = select(self.values, ranks)
+        return sum(selected[rank] for rank in ranks) / len(ranks)
+
+
+class RollingWindow(Aggregates):
+
+    """Keep values for the given period of time.
+
+    The aggregates are maintained incrementally: a running sum and monotonic queues
+    of the minimum and maximum candidates. Points are expected in time order, a late
+    point is counted as the latest one.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.timestamps = deque()
+        self.values = deque()
+        self.total = 0.0
+        self.mins = deque()
+        self.maxs = deque()
+        self.pushed = 0
+
+    def __len__(self):
+        return len(self.values)
+
+    @property
+    def last_timestamp(self):
+        return self.timestamps[-1] if self.timestamps else None
+
+    @property
+    def sum(self):
+        return self.total
+
+    @property
+    def minimum(self):
+        return self.mins[0][1]
+
+    @property
+    def maximum(self):
+        return self.maxs[0][1]
+
+    def push(self, timestamp, value):
+        if self.timestamps and timestamp < self.timestamps[-1]:
+            timestamp = self.timestamps[-1]
+        self.timestamps.append(timestamp)
+        self.values.append(value)
+
+        # Recalculate the sum once per window turn to not accumulate rounding errors
+        self.pushed += 1
+        if self.pushed >= len(self.values):
+            self.total, self.pushed = sum(self.values), 0
+        else:
+            self.total += value
+
+        while self.mins and self.mins[-1][1] >= value:
+            self.mins.pop()
+        self.mins.append((timestamp, value))
+        while self.maxs and self.maxs[-1][1] <= value:
+            self.maxs.pop()
+        self.maxs.append((timestamp, value))
+
+        self.trim(timestamp)
+
+    def trim(self, now):
+        """Drop values older than the window."""
+        threshold = now - self.size
+        timestamps, values = self.timestamps, self.values
+        while timestamps and timestamps[0] <= threshold:
+            timestamps.popleft()
+            self.total -= values.popleft()
+        while self.mins and self.mins[0][0] <= threshold:
+            self.mins.popleft()
+        while self.maxs and self.maxs[0][0] <= threshold:
+            self.maxs.popleft()
+        if not values:
+            self.total = 0.0
+
+
+class GraphiteRecord(Aggregates):
 
     def __init__(self, metric_string, default_nan_value=None, ignore_nan=False):
+        if isinstance(metric_string, bytes):
+            metric_string = metric_string.decode('utf-8')
         try:
             meta, data = metric_string.split('|')
         except ValueError:
@@ -14,34 +237,112 @@ class GraphiteRecord(object):
         self.step = int(step)
         self.default_nan_value = default_nan_value
         self.ignore_nan = ignore_nan
-        self.values = list(self._values(data.rsplit(',')))
+        self.values = []
+        # Positions of the values in the series, None when no point is skipped
+        self.positions = None
+        self._parse(data.split(','))
         self.empty = len(self.values) == 0
 
-    def _values(self, values):
-        for value in values:
+    @property
+    def points(self):
+        """Get the values with their timestamps."""
+        start, step = self.start_time, self.step
+        positions = self.positions or range(len(self.values))
+        for pos, value in zip(positions, self.values):
+            yield start + pos * step, value
+
+    def _parse(self, data):
+        values, positions = self.values, self.positions
+        for pos, value in enumerate(data):
             try:
-                if self.ignore_nan and float(value) == self.default_nan_value:
-                    continue
-                yield float(value)
+                value = float(value)
             except ValueError:
+                value = None
+            if value is None or (self.ignore_nan and value == self.default_nan_value):
+                if positions is None:
+                    positions = array('I', range(len(values)))
                 continue
+            values.append(value)
+            if positions is not None:
+                positions.append(pos)
+        self.positions = positions
 
-    @property
-    def average(self):
-        return self.sum / len(self.values)
 
-    @property
-    def last_value(self):
-        return self.values[-1]
+class ResponseTooLarge(ValueError):
 
-    @property
-    def sum(self):
-        return sum(self.values)
+    """A response exceeds the limits of an alert."""
 
-    @property
-    def minimum(self):
-        return min(self.values)
 
-    @property
-    def maximum(self):
-        return max(self.values)
+class RawParser(object):
+
+    """Parse a raw Graphite response into records as its chunks are received.
+
+    Chunks are fed by the streaming callback of a request (after the response is
+    decompressed), so the whole response body is never kept in memory. A response
+    over `max_series` series or `max_bytes` bytes is rejected as soon as the limit is
+    exceeded: the records are dropped and `ResponseTooLarge` is raised (which aborts
+    the request when raised from a streaming callback).
+    """
+
+    def __init__(self, default_nan_value=None, ignore_nan=False, max_series=None,
+                 max_bytes=None):
+        self.default_nan_value = default_nan_value
+        self.ignore_nan = ignore_nan
+        self.max_series = max_series
+        self.max_bytes = max_bytes
+        self.received = 0
+        self.records = []
+        self.pending = []
+        self.error = None
+        self.oversized = None
+
+    def check_size(self, size):
+        """Reject a response of the given size (e.g. its Content-Length)."""
+        if self.max_bytes and size > self.max_bytes:
+            self.reject('Response is larger than %d bytes' % self.max_bytes)
+
+    def reject(self, reason):
+        self.records, self.pending = [], []
+        self.oversized = ResponseTooLarge(reason)
+        raise self.oversized
+
+    def feed(self, chunk):
+        if self.oversized is not None:
+            raise self.oversized
+        self.received += len(chunk)
+        self.check_size(self.received)
+
+        self.pending.append(chunk)
+        if b'\n' in chunk:
+            lines = b''.join(self.pending).split(b'\n')
+            self.pending = [lines.pop()]
+            for line in lines:
+                self._parse(line)
+
+        if self.max_series and len(self.records) > self.max_series:
+            self.reject('Response has more than %d series' % self.max_series)
+
+    def close(self):
+        """Parse the rest of the response.
+
+        :return: the records
+        :raises ValueError: when the response has an invalid record
+        :raises ResponseTooLarge: when the response exceeds the limits
+        """
+        if self.oversized is not None:
+            raise self.oversized
+        self._parse(b''.join(self.pending))
+        self.pending = []
+        if self.max_series and len(self.records) > self.max_series:
+            self.reject('Response has more than %d series' % self.max_series)
+        if self.error is not None:
+            raise self.error
+        return self.records
+
+    def _parse(self, line):
+        # Errors are raised on close, a streaming callback should not fail the request
+        if self.error is None and line.strip():
+            try:
+                self.records.append(GraphiteRecord(line, self.default_nan_value, self.ignore_nan))
+            except ValueError as e:
+                self.error = e
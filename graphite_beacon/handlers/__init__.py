@@ -1,7 +1,11 @@
-from tornado import log
+import inspect
+import os
 
-from graphite_beacon import _compat as _
+from tornado import gen, log
+
+from graphite_beacon.delivery import CircuitBreaker, Spool, backoff_delay
 from graphite_beacon.template import TEMPLATES
+from graphite_beacon.units import SECOND, TimeUnit
 
 LOGGER = log.gen_log
 
@@ -21,6 +25,8 @@ class HandlerMeta(type):
 
     @classmethod
     def clean(mcs):
+        for handler in mcs.loaded.values():
+            handler.stop()
         mcs.loaded = {}
 
     @classmethod
@@ -30,7 +36,7 @@ class HandlerMeta(type):
         return mcs.loaded[name]
 
 
-class AbstractHandler(_.with_metaclass(HandlerMeta)):
+class AbstractHandler(metaclass=HandlerMeta):
 
     name = None
     defaults = {}
@@ -39,6 +45,7 @@ class AbstractHandler(_.with_metaclass(HandlerMeta)):
         self.reactor = reactor
         self.options = dict(self.defaults)
         self.options.update(self.reactor.options.get(self.name, {}))
+        self.configure_delivery()
         self.init_handler()
         LOGGER.debug('Handler "%s" has inited: %s', self.name, self.options)
 
@@ -51,9 +58,92 @@ class AbstractHandler(_.with_metaclass(HandlerMeta)):
         """ Init configuration here."""
         raise NotImplementedError()
 
+    def stop(self):
+        """Stop background work (the handler is replaced when the config is reloaded)."""
+
     def notify(self, level, alert, value, target=None, ntype=None, rule=None):
         raise NotImplementedError()
 
+    def configure_delivery(self):
+        """Configure retries, the circuit breaker and the spool.
+
+        Reactor's options can be redefined in the handler's options.
+        """
+        get = lambda name: self.options.get(name, self.reactor.options[name])
+        self.retries = get('retries')
+        self.retry_delay = get('retry_delay')
+        self.retry_max_delay = get('retry_max_delay')
+        self.breaker = CircuitBreaker(
+            get('breaker_threshold'),
+            TimeUnit.from_interval(get('breaker_timeout')).convert_to(SECOND))
+        self.spool = get('spool') and Spool(os.path.join(get('spool'), '%s.jsonl' % self.name))
+        self.replaying = False
+
+    async def deliver(self, level, alert, value, target=None, ntype=None, rule=None):
+        """Notify with retries.
+
+        A notification which cannot be delivered (all the attempts have failed or the
+        circuit breaker is open) is spooled and replayed after the next success (so the
+        failures of a replay are spooled again).
+
+        :return: whether the notification is delivered
+        """
+        loop = self.reactor.loop
+        for attempt in range(self.retries + 1):
+            if not self.breaker.allow(loop.time()):
+                error = 'circuit breaker is open'
+                break
+
+            try:
+                result = self.notify(level, alert, value, target=target, ntype=ntype, rule=rule)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                error = e
+                self.breaker.failure(loop.time())
+                LOGGER.warning('Handler "%s": attempt %d failed: %s', self.name, attempt + 1, e)
+                if attempt < self.retries:
+                    await gen.sleep(backoff_delay(
+                        attempt, self.retry_delay, self.retry_max_delay))
+                continue
+
+            self.breaker.success()
+            if self.spool and not self.replaying and self.spool.pending:
+                loop.add_callback(self.replay)
+            return True
+
+        LOGGER.error('Handler "%s": notification is not delivered: %s', self.name, error)
+        if self.spool:
+            await self.spool.append({
+                'level': level, 'alert': alert.name, 'value': value, 'target': target,
+                'ntype': ntype, 'rule': rule and rule['raw']})
+        return False
+
+    async def replay(self):
+        """Deliver the spooled notifications."""
+        if not self.spool or self.replaying:
+            return
+
+        self.replaying = True
+        try:
+            alerts = dict((alert.name, alert) for alert in self.reactor.alerts)
+            for record in await self.spool.take():
+                alert = alerts.get(record['alert'])
+                if alert is None:
+                    LOGGER.warning('Handler "%s": skip spooled notification of unknown alert %s',
+                                   self.name, record['alert'])
+                    continue
+
+                rules = [rule for rule in alert.rules + alert.group_rules
+                         if rule['raw'] == record['rule']]
+                await self.deliver(
+                    record['level'], alert, record['value'], target=record['target'],
+                    ntype=record['ntype'], rule=rules[0] if rules else None)
+            await self.spool.done()
+        finally:
+            self.replaying = False
+
+
 registry = HandlerMeta  # pylint: disable=invalid-name
 
 from .hipchat import HipChatHandler      # pylint: disable=wrong-import-position
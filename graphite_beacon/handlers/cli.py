@@ -1,4 +1,12 @@
-import subprocess
+import asyncio
+import json
+import os
+import signal
+from asyncio.subprocess import DEVNULL, PIPE
+
+from tornado import ioloop, locks
+from tornado.concurrent import Future, chain_future
+from tornado.gen import convert_yielded
 
 from graphite_beacon.handlers import LOGGER, AbstractHandler
 
@@ -11,6 +19,11 @@ class CliHandler(AbstractHandler):
     defaults = {
         'command': None,
         'alerts_whitelist': [],
+        'max_processes': 4,
+        'max_queue': 1000,
+        'timeout': 60.0,
+        'batch': False,
+        'batch_delay': 1.0,
     }
 
     def init_handler(self):
@@ -18,7 +31,12 @@ class CliHandler(AbstractHandler):
         self.whitelist = self.options.get('alerts_whitelist')
         assert self.command_template, 'Command line command is not defined.'
 
-    def notify(self, level, *args, **kwargs):
+        self.semaphore = locks.Semaphore(self.options['max_processes'])
+        self.queued = 0
+        self.events = []
+        self.flushed = None
+
+    async def notify(self, level, *args, **kwargs):
         LOGGER.debug("Handler (%s) %s", self.name, level)
 
         def get_alert_name(*args):
@@ -27,15 +45,76 @@ class CliHandler(AbstractHandler):
             return name.rsplit(' ', 1)[0].strip()
 
         # Run only for whitelisted names if specified
-        if not self.whitelist or get_alert_name(*args) in self.whitelist:
-            command = substitute_variables(self.command_template, level, *args, **kwargs)
-            subprocess.Popen(
-                command,
-                shell=True,
-                stdin=None,
-                stdout=None,
-                stderr=None,
-                close_fds=True)
+        if self.whitelist and get_alert_name(*args) not in self.whitelist:
+            return
+
+        if self.options['batch']:
+            await self.enqueue(get_event(level, *args, **kwargs))
+        else:
+            await self.run(substitute_variables(self.command_template, level, *args, **kwargs))
+
+    def enqueue(self, event):
+        """Send the event with the others collected during `batch_delay`.
+
+        :raises RuntimeError: when the batch is full
+        """
+        if len(self.events) >= self.options['max_queue']:
+            raise RuntimeError('Too many events are queued')
+
+        if not self.events:
+            self.flushed = Future()
+            ioloop.IOLoop.current().call_later(self.options['batch_delay'], self.flush)
+        self.events.append(event)
+        return self.flushed
+
+    def flush(self):
+        """Run the command with the collected events as JSON lines in stdin."""
+        events, flushed = self.events, self.flushed
+        self.events, self.flushed = [], None
+        stdin = ''.join(json.dumps(event, default=str) + '\n' for event in events)
+        chain_future(convert_yielded(self.run(self.command_template, stdin.encode('utf-8'))),
+                     flushed)
+
+    async def run(self, command, stdin=None):
+        """Run the command when a process slot is free.
+
+        :raises RuntimeError: when the queue is full, the command has timed out or failed
+        """
+        if self.queued >= self.options['max_queue']:
+            raise RuntimeError('Too many commands are queued')
+
+        self.queued += 1
+        try:
+            async with self.semaphore:
+                # The command runs in its own process group to kill its children too
+                process = await asyncio.create_subprocess_shell(
+                    command, stdin=DEVNULL if stdin is None else PIPE, start_new_session=True)
+                try:
+                    await asyncio.wait_for(process.communicate(stdin), self.options['timeout'])
+                except asyncio.TimeoutError:
+                    try:
+                        os.killpg(process.pid, signal.SIGKILL)
+                    except ProcessLookupError:
+                        pass
+                    await process.wait()
+                    raise RuntimeError('Command has timed out: %s' % command)
+        finally:
+            self.queued -= 1
+
+        if process.returncode:
+            raise RuntimeError('Command has failed (%s): %s' % (process.returncode, command))
+
+
+def get_event(level, alert, value, target=None, rule=None, **_):
+    """Describe an event for a batch."""
+    return {
+        'level': level,
+        'name': alert.name,
+        'value': value,
+        'target': target,
+        'limit_value': rule.get('value') if rule else None,
+        'rule': rule['raw'] if rule else None,
+    }
 
 
 def substitute_variables(command, level, name, value, target=None, **kwargs):
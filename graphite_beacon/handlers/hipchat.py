@@ -1,7 +1,6 @@
 import json
 
 from tornado import httpclient as hc
-from tornado import gen
 
 from graphite_beacon.handlers import LOGGER, AbstractHandler
 
@@ -30,8 +29,7 @@ class HipChatHandler(AbstractHandler):
         assert self.key, 'Hipchat key is not defined.'
         self.client = hc.AsyncHTTPClient()
 
-    @gen.coroutine
-    def notify(self, level, *args, **kwargs):
+    async def notify(self, level, *args, **kwargs):
         LOGGER.debug("Handler (%s) %s", self.name, level)
 
         data = {
@@ -41,6 +39,6 @@ class HipChatHandler(AbstractHandler):
             'message_format': 'text',
         }
 
-        yield self.client.fetch('{url}/v2/room/{room}/notification?auth_token={token}'.format(
+        await self.client.fetch('{url}/v2/room/{room}/notification?auth_token={token}'.format(
             url=self.options.get('url'), room=self.room, token=self.key), headers={
                 'Content-Type': 'application/json'}, method='POST', body=json.dumps(data))
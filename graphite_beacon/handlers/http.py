@@ -1,7 +1,6 @@
-import urllib
+from urllib.parse import urlencode
 
 from tornado import httpclient as hc
-from tornado import gen
 
 from graphite_beacon.handlers import LOGGER, AbstractHandler
 
@@ -23,8 +22,7 @@ class HttpHandler(AbstractHandler):
         self.method = self.options['method']
         self.client = hc.AsyncHTTPClient()
 
-    @gen.coroutine
-    def notify(self, level, alert, value, target=None, ntype=None, rule=None):
+    async def notify(self, level, alert, value, target=None, ntype=None, rule=None):
         LOGGER.debug("Handler (%s) %s", self.name, level)
 
         message = self.get_short(level, alert, value, target=target, ntype=ntype, rule=rule)
@@ -34,10 +32,10 @@ class HttpHandler(AbstractHandler):
         if rule:
             data['rule'] = rule['raw']
 
-        if alert.source == 'graphite':
+        if alert.source in ('graphite', 'carbon', 'whisper'):
             data['graph_url'] = alert.get_graph_url(target)
             data['value'] = value
 
         data.update(self.params)
-        body = urllib.urlencode(data)
-        yield self.client.fetch(self.url, method=self.method, body=body)
+        body = urlencode(data)
+        await self.client.fetch(self.url, method=self.method, body=body)
@@ -1,7 +1,7 @@
 import json
-import urllib
+from urllib.parse import urlencode
 
-from tornado import gen, httpclient
+from tornado import httpclient
 
 from graphite_beacon.handlers import AbstractHandler
 
@@ -19,17 +19,16 @@ class OpsgenieHandler(AbstractHandler):
         assert self.api_key, "Opsgenie API key not defined."
         self.client = httpclient.AsyncHTTPClient()
 
-    @gen.coroutine
-    def notify(self, level, alert, value, target=None, *args, **kwargs):
+    async def notify(self, level, alert, value, target=None, *args, **kwargs):
 
-        message = self.get_short(level, alert, value, target, *args, **kwargs)
+        message = self.get_short(level, alert, value, target, *args, **kwargs).decode('utf-8')
         description = "{url}/composer/?{params}".format(
             url=self.reactor.options['public_graphite_url'],
-            params=urllib.urlencode({'target': alert.query}))
+            params=urlencode({'target': alert.query}))
         alias = target + ':' + alert.name
 
         if level == 'critical':
-            yield self.client.fetch(
+            await self.client.fetch(
                 'https://api.opsgenie.com/v1/json/alert',
                 method='POST',
                 headers={'Content-Type': 'application/json'},
@@ -39,7 +38,7 @@ class OpsgenieHandler(AbstractHandler):
                                  'description': description}))
         elif level == 'normal':
             # Close issue
-            yield self.client.fetch(
+            await self.client.fetch(
                 'https://api.opsgenie.com/v1/json/alert/close',
                 method='POST',
                 headers={'Content-Type': 'application/json'},
@@ -1,7 +1,6 @@
 import json
 
 from tornado import httpclient as hc
-from tornado import gen
 
 from graphite_beacon.handlers import LOGGER, AbstractHandler
 
@@ -26,10 +25,10 @@ class PagerdutyHandler(AbstractHandler):
         assert self.service_key, 'service_key is not defined'
         self.client = hc.AsyncHTTPClient()
 
-    @gen.coroutine
-    def notify(self, level, alert, value, target=None, ntype=None, rule=None):
+    async def notify(self, level, alert, value, target=None, ntype=None, rule=None):
         LOGGER.debug("Handler (%s) %s", self.name, level)
-        message = self.get_short(level, alert, value, target=target, ntype=ntype, rule=rule)
+        message = self.get_short(
+            level, alert, value, target=target, ntype=ntype, rule=rule).decode('utf-8')
         LOGGER.debug('message1:%s', message)
         if level == 'normal':
             event_type = 'resolve'
@@ -56,7 +55,7 @@ class PagerdutyHandler(AbstractHandler):
             "client": 'graphite-beacon',
             "client_url": client_url
         }
-        yield self.client.fetch(
+        await self.client.fetch(
             "https://events.pagerduty.com/generic/2010-04-15/create_event.json",
             body=json.dumps(data),
             headers=headers,
@@ -1,7 +1,6 @@
 import json
 
 from tornado import httpclient as hc
-from tornado import gen
 
 from graphite_beacon.handlers import LOGGER, AbstractHandler
 from graphite_beacon.template import TEMPLATES
@@ -35,13 +34,13 @@ class SlackHandler(AbstractHandler):
         self.client = hc.AsyncHTTPClient()
 
     def get_message(self, level, alert, value, target=None, ntype=None, rule=None):  # pylint: disable=unused-argument
-        msg_type = 'slack' if ntype == 'graphite' else 'short'
+        msg_type = 'slack' if ntype in ('graphite', 'carbon', 'whisper') else 'short'
         tmpl = TEMPLATES[ntype][msg_type]
         return tmpl.generate(
-            level=level, reactor=self.reactor, alert=alert, value=value, target=target).strip()
+            level=level, reactor=self.reactor, alert=alert, value=value,
+            target=target).decode('utf-8').strip()
 
-    @gen.coroutine
-    def notify(self, level, *args, **kwargs):
+    async def notify(self, level, *args, **kwargs):
         LOGGER.debug("Handler (%s) %s", self.name, level)
 
         message = self.get_message(level, *args, **kwargs)
@@ -53,7 +52,7 @@ class SlackHandler(AbstractHandler):
             data['channel'] = self.channel
 
         body = json.dumps(data)
-        yield self.client.fetch(
+        await self.client.fetch(
             self.webhook,
             method='POST',
             headers={'Content-Type': 'application/json'},
@@ -3,7 +3,7 @@ from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from smtplib import SMTP
 
-from tornado import concurrent, gen
+from tornado import ioloop
 
 from graphite_beacon.handlers import LOGGER, TEMPLATES, AbstractHandler
 
@@ -32,25 +32,27 @@ class SMTPHandler(AbstractHandler):
         if not isinstance(self.options['to'], (list, tuple)):
             self.options['to'] = [self.options['to']]
 
-    @gen.coroutine
-    def notify(self, level, *args, **kwargs):
+    async def notify(self, level, *args, **kwargs):
         LOGGER.debug("Handler (%s) %s", self.name, level)
 
         msg = self.get_message(level, *args, **kwargs)
-        msg['Subject'] = self.get_short(level, *args, **kwargs)
+        msg['Subject'] = self.get_short(level, *args, **kwargs).decode('utf-8')
         msg['From'] = self.options['from']
         msg['To'] = ", ".join(self.options['to'])
 
+        # smtplib is blocking, so talk to the server in a thread
+        await ioloop.IOLoop.current().run_in_executor(None, self.send, msg)
+
+    def send(self, msg):
+        """Send the message (blocking)."""
         smtp = SMTP()
-        yield smtp_connect(smtp, self.options['host'], self.options['port'])  # pylint: disable=no-value-for-parameter
+        smtp.connect(self.options['host'], self.options['port'])
 
         if self.options['use_tls']:
-            yield smtp_starttls(smtp)  # pylint: disable=no-value-for-parameter
+            smtp.starttls()
 
         if self.options['username'] and self.options['password']:
-            yield smtp_login(smtp,  # pylint: disable=no-value-for-parameter
-                             self.options['username'],
-                             self.options['password'])
+            smtp.login(self.options['username'], self.options['password'])
 
         try:
             LOGGER.debug("Send message to: %s", ", ".join(self.options['to']))
@@ -64,27 +66,10 @@ class SMTPHandler(AbstractHandler):
             reactor=self.reactor, alert=alert, value=value, level=level, target=target,
             dt=dt, rule=rule, **self.options)
         msg = MIMEMultipart('alternative')
-        plain = MIMEText(str(txt_tmpl.generate(**ctx)), 'plain')
+        plain = MIMEText(txt_tmpl.generate(**ctx).decode('utf-8'), 'plain')
         msg.attach(plain)
         if self.options['html']:
             html_tmpl = TEMPLATES[ntype]['html']
-            html = MIMEText(str(html_tmpl.generate(**ctx)), 'html')
+            html = MIMEText(html_tmpl.generate(**ctx).decode('utf-8'), 'html')
             msg.attach(html)
         return msg
-
-
-@concurrent.return_future
-def smtp_connect(smtp, host, port, callback):
-    callback(smtp.connect(host, port))
-
-
-@concurrent.return_future
-def smtp_starttls(smtp, callback):
-    callback(smtp.starttls())
-
-
-@concurrent.return_future
-def smtp_login(smtp, username, password, callback):
-    callback(smtp.login(username, password))
-
-#  pylama:ignore=E1120
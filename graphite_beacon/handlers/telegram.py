@@ -1,10 +1,14 @@
 """Send alerts to telegram chats"""
 
+import asyncio
 import json
+import os
+import tempfile
 from os.path import exists
 
-from tornado import gen, httpclient
+from tornado import httpclient, ioloop, locks
 
+from graphite_beacon.delivery import RateLimiter
 from graphite_beacon.handlers import LOGGER, AbstractHandler
 from graphite_beacon.template import TEMPLATES
 
@@ -42,9 +46,16 @@ class TelegramHandler(AbstractHandler):
     defaults = {
         'token': None,
         'bot_ident': None,
-        'chatfile': None
+        'chatfile': None,
+        # Seconds to wait for updates in a getUpdates request
+        'poll_timeout': 60,
+        # Telegram allows bots to send about 30 messages per second
+        'rate_limit': 30,
     }
 
+    # The handlers which listen to the bots' updates by token
+    listening = {}
+
     def init_handler(self):
 
         token = self.options.get('token')
@@ -63,29 +74,57 @@ class TelegramHandler(AbstractHandler):
             chatfile = None
         self.chatfile = chatfile
         self.chats = get_chatlist(self.chatfile)
+        self.limiter = RateLimiter(self.options.get('rate_limit'))
+
+        # A handler of a reloaded config waits for the previous one to finish its poll
+        self.stopped = False
+        self.finished = locks.Event()
+        self.previous = self.listening.get(token)
+        self.listening[token] = self
+        ioloop.IOLoop.current().spawn_callback(self._listen_commands)
 
-        self._listen_commands()
+    def stop(self):
+        """Stop listening to the updates after the current poll."""
+        self.stopped = True
 
-    @gen.coroutine
-    def _listen_commands(self):
+    async def _listen_commands(self):
         """Monitor new updates and send them further to
         self._respond_commands, where bot actions
         are decided.
+
+        Updates are long-polled: there is a single request waiting
+        for updates at a time. The updates received after the handler
+        is stopped are not confirmed, so they are received again by
+        the next handler.
         """
+        if self.previous is not None:
+            await self.previous.finished.wait()
+            self.previous = None
 
         self._last_update = None
-        update_body = {'timeout': 2}
-
-        while True:
-            latest = self._last_update
-            # increase offset to filter out older updates
-            update_body.update({'offset': latest + 1} if latest else {})
-            update_resp = self.client.get_updates(update_body)
-            update_resp.add_done_callback(self._respond_commands)
-            yield gen.sleep(5)
-
-    @gen.coroutine
-    def _respond_commands(self, update_response):
+        poll_timeout = self.options.get('poll_timeout')
+        update_body = {'timeout': poll_timeout}
+
+        try:
+            while not self.stopped:
+                latest = self._last_update
+                # increase offset to filter out older updates
+                update_body.update({'offset': latest + 1} if latest else {})
+                try:
+                    update_resp = await self.client.get_updates(
+                        update_body, request_timeout=poll_timeout + 10)
+                    if self.stopped:
+                        break
+                    await self._respond_commands(update_resp)
+                except Exception as exc:
+                    LOGGER.error(str(exc))
+                    # do not hammer the api when it fails
+                    if not self.stopped:
+                        await asyncio.sleep(5)
+        finally:
+            self.finished.set()
+
+    async def _respond_commands(self, update_response):
         """Extract commands to bot from update and
         act accordingly. For description of commands,
         see HELP_MESSAGE variable on top of this module.
@@ -94,9 +133,7 @@ class TelegramHandler(AbstractHandler):
         chatfile = self.chatfile
         chats = self.chats
 
-        exc, upd = update_response.exception(), update_response.result().body
-        if exc:
-            LOGGER.error(str(exc))
+        upd = update_response.body
         if not upd:
             return
 
@@ -126,7 +163,8 @@ class TelegramHandler(AbstractHandler):
                     chats_changed = True
 
             if chats_changed and chatfile:
-                write_to_file(chats, chatfile)
+                await ioloop.IOLoop.current().run_in_executor(
+                    None, write_to_file, list(chats), chatfile)
 
             elif command == '/help':
                 reply_text = HELP_MESSAGE
@@ -136,15 +174,14 @@ class TelegramHandler(AbstractHandler):
                                'bot ident is wrong or missing')
 
             if reply_text:
-                yield self.client.send_message({
+                await self.client.send_message({
                     'chat_id': chat_id,
                     'reply_to_message_id': message_id,
                     'text': reply_text,
                     'parse_mode': 'Markdown',
                 })
 
-    @gen.coroutine
-    def notify(self, level, *args, **kwargs):
+    async def notify(self, level, *args, **kwargs):
         """Sends alerts to telegram chats.
         This method is called from top level module.
         Do not rename it.
@@ -153,9 +190,21 @@ class TelegramHandler(AbstractHandler):
         LOGGER.debug('Handler (%s) %s', self.name, level)
 
         notify_text = self.get_message(level, *args, **kwargs)
-        for chat in self.chats.copy():
-            data = {"chat_id": chat, "text": notify_text}
-            yield self.client.send_message(data)
+        chats = list(self.chats)
+        results = await asyncio.gather(
+            *[self._send(chat, notify_text) for chat in chats], return_exceptions=True)
+
+        errors = [(chat, exc) for chat, exc in zip(chats, results) if exc is not None]
+        for chat, exc in errors:
+            LOGGER.error('Could not notify chat [%s]: %s', chat, exc)
+        # Report the failure to be retried only when telegram is unavailable
+        if errors and len(errors) == len(chats):
+            raise errors[0][1]
+
+    async def _send(self, chat, text):
+        """Send a message to the chat within the rate limit."""
+        await self.limiter.acquire()
+        await self.client.send_message({"chat_id": chat, "text": text})
 
     def get_message(self, level, alert, value, **kwargs):
         """Standart alert message. Same format across all
@@ -163,7 +212,7 @@ class TelegramHandler(AbstractHandler):
         """
         target, ntype = kwargs.get('target'), kwargs.get('ntype')
 
-        msg_type = 'telegram' if ntype == 'graphite' else 'short'
+        msg_type = 'telegram' if ntype in ('graphite', 'carbon', 'whisper') else 'short'
         tmpl = TEMPLATES[ntype][msg_type]
         generated = tmpl.generate(
             level=level, reactor=self.reactor, alert=alert,
@@ -172,9 +221,18 @@ class TelegramHandler(AbstractHandler):
 
 
 def write_to_file(chats, chatfile):
-    """called every time chats are modified"""
-    with open(chatfile, 'w') as handler:
-        handler.write('\n'.join((str(id_) for id_ in chats)))
+    """called every time chats are modified
+
+    The file is replaced atomically, so it is never left half written.
+    """
+    fd, path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(chatfile)))
+    try:
+        with os.fdopen(fd, 'w') as handler:
+            handler.write('\n'.join((str(id_) for id_ in chats)))
+        os.replace(path, chatfile)
+    except BaseException:
+        os.unlink(path)
+        raise
 
 
 def get_chatlist(chatfile):
@@ -264,12 +322,12 @@ class CustomClient(object):
         fetch = self.client.fetch
         request = self.url(telegram_api_method)
 
-        def _fetcher(body, method='POST', headers=None):
+        def _fetcher(body, method='POST', headers=None, **kwargs):
             """Uses fetch method of tornado http client."""
             body = json.dumps(body)
             if not headers:
                 headers = {}
             headers.update({'Content-Type': 'application/json'})
             return fetch(
-                request=request, body=body, method=method, headers=headers)
+                request=request, body=body, method=method, headers=headers, **kwargs)
         return _fetcher
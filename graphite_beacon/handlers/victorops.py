@@ -1,15 +1,11 @@
 import json
 
+from urllib.parse import urljoin
+
 from tornado import httpclient as hc
-from tornado import gen
 
 from graphite_beacon.handlers import LOGGER, AbstractHandler
 
-try:
-    from urlparse import urljoin
-except ImportError:
-    from urllib.parse import urljoin
-
 
 class VictorOpsHandler(AbstractHandler):
 
@@ -24,11 +20,11 @@ class VictorOpsHandler(AbstractHandler):
 
         self.client = hc.AsyncHTTPClient()
 
-    @gen.coroutine
-    def notify(self, level, alert, value, target=None, ntype=None, rule=None):
+    async def notify(self, level, alert, value, target=None, ntype=None, rule=None):
         LOGGER.debug("Handler (%s) %s", self.name, level)
 
-        message = self.get_short(level, alert, value, target=target, ntype=ntype, rule=rule)
+        message = self.get_short(
+            level, alert, value, target=target, ntype=ntype, rule=rule).decode('utf-8')
         data = {'entity_display_name': alert.name, 'state_message': message, 'message_type': level}
         if target:
             data['target'] = target
@@ -36,4 +32,4 @@ class VictorOpsHandler(AbstractHandler):
             data['rule'] = rule['raw']
         body = json.dumps(data)
         headers = {'Content-Type': 'application/json;'}
-        yield self.client.fetch(self.url, method="POST", body=body, headers=headers)
+        await self.client.fetch(self.url, method="POST", body=body, headers=headers)
@@ -0,0 +1,334 @@
+"""Keep an append-only journal of the alerts' level transitions.
+
+Transitions are appended to binary segment files in a directory. A segment is
+closed when it exceeds the segment size, the oldest segments are removed when there
+are too many of them. Records are buffered in memory and written by a thread of the
+default executor, so the event loop never waits for the disk.
+
+Each record is a fixed header followed by UTF-8 strings::
+
+    size, timestamp, old level, new level, value, lengths of the alert name,
+    the target, the rule and the message
+
+Levels are the codes of `store.LEVEL_CODES` (-1 when unknown), the value is NaN when
+it is not a number (the message is kept instead).
+
+An index of the records' positions by alert and target is kept in memory (and
+rebuilt from the segments on start). Queries read the records from memory-mapped
+segments::
+
+    python -m graphite_beacon.journal /var/lib/beacon/journal history --alert CPU --target web1
+    python -m graphite_beacon.journal /var/lib/beacon/journal flapping --since 1hour
+
+"""
+
+import argparse
+import bisect
+import math
+import mmap
+import os
+import struct
+import time
+from collections import defaultdict, namedtuple
+
+from tornado import ioloop, log
+
+from .store import LEVEL_CODES, LEVEL_IDS, NO_LEVEL
+from .units import SECOND, TimeUnit
+
+LOGGER = log.gen_log
+HEADER = struct.Struct('!IdbbdHHHH')
+MAX_STRING = 0xFFFF
+SUFFIX = '.journal'
+
+Transition = namedtuple(
+    'Transition', 'timestamp alert target old_level new_level value rule message')
+
+
+def encode(timestamp, alert, target, old_level, new_level, value, rule=None):
+    """Pack a transition into a record."""
+    try:
+        number, message = float(value), b''
+    except (TypeError, ValueError):
+        number, message = math.nan, str(value).encode('utf-8')
+    strings = [
+        string[:MAX_STRING] for string in (
+            str(alert).encode('utf-8'), _encode_target(target),
+            rule.encode('utf-8') if rule else b'', message)]
+    return HEADER.pack(
+        HEADER.size + sum(len(string) for string in strings), timestamp,
+        LEVEL_IDS.get(old_level, NO_LEVEL), LEVEL_IDS.get(new_level, NO_LEVEL), number,
+        *[len(string) for string in strings]) + b''.join(strings)
+
+
+def decode(buf, offset=0):
+    """Unpack a record.
+
+    :return: (transition, size)
+    """
+    size, timestamp, old, new, value, *lengths = HEADER.unpack_from(buf, offset)
+    strings, pos = [], offset + HEADER.size
+    for length in lengths:
+        strings.append(bytes(buf[pos:pos + length]).decode('utf-8', 'replace'))
+        pos += length
+    alert, target, rule, message = strings
+    return Transition(
+        timestamp, alert, target or None, _level(old), _level(new),
+        None if math.isnan(value) else value, rule or None, message or None), size
+
+
+def _encode_target(target):
+    return b'' if target is None else str(target).encode('utf-8')
+
+
+def _level(code):
+    return None if code == NO_LEVEL else LEVEL_CODES[code]
+
+
+class Journal(object):
+
+    """Write and query the journal of transitions.
+
+    :param directory str: the directory of segment files
+    :param segment_size int: the size (in bytes) to close a segment at
+    :param max_segments int: the number of segments to keep
+    """
+
+    def __init__(self, directory, segment_size=16 * 1024 * 1024, max_segments=16,
+                 flush_interval=1.0, flush_size=64 * 1024):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.max_segments = max_segments
+        self.flush_size = flush_size
+
+        # Positions of the records by (alert, target): timestamps, segments, offsets
+        self.index = defaultdict(lambda: ([], [], []))
+        self.segments = []
+        self.size = 0
+        self.pending, self.pending_size = [], 0
+        self.writing = []
+        self.maps = {}
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.load()
+
+        self.callback = ioloop.PeriodicCallback(self.flush, flush_interval * 1000)
+
+    def load(self):
+        """Rebuild the index from the segments."""
+        self.segments = sorted(
+            int(name[:-len(SUFFIX)]) for name in os.listdir(self.directory)
+            if name.endswith(SUFFIX) and name[:-len(SUFFIX)].isdigit())
+        for segment in self.segments:
+            buf = self._map(segment)
+            offset = 0
+            while offset + HEADER.size <= len(buf):
+                try:
+                    transition, size = decode(buf, offset)
+                except struct.error:
+                    size = 0
+                if not size or offset + size > len(buf):
+                    # A record torn by a crash, next records go to a new segment
+                    LOGGER.warning('Journal: skip a broken record in segment %d', segment)
+                    break
+                self._index(transition.alert, _target_key(transition.target),
+                            transition.timestamp, segment, offset)
+                offset += size
+
+        if not self.segments:
+            self.segments.append(0)
+        else:
+            self.segments.append(self.segments[-1] + 1)
+        self.size = 0
+
+    def start(self):
+        self.callback.start()
+
+    def stop(self):
+        """Stop flushing periodically and write the buffered records."""
+        self.callback.stop()
+        self.pending, batch = [], self.pending
+        self.pending_size = 0
+        self._complete(self._write(self._plan(batch)))
+        for buf in self.maps.values():
+            buf.close()
+        self.maps = {}
+
+    def record(self, alert, target, old_level, new_level, value, rule=None, timestamp=None):
+        """Buffer a transition."""
+        timestamp = time.time() if timestamp is None else timestamp
+        data = encode(timestamp, alert, target, old_level, new_level, value, rule)
+        self.pending.append((str(alert), _target_key(target), timestamp, data))
+        self.pending_size += len(data)
+        if self.pending_size >= self.flush_size:
+            ioloop.IOLoop.current().add_callback(self.flush)
+
+    async def flush(self):
+        """Write the buffered records in a thread."""
+        if self.writing or not self.pending:
+            return
+
+        batch, self.pending, self.pending_size = self.pending, [], 0
+        self.writing = batch
+        try:
+            plan = self._plan(batch)
+            written = await ioloop.IOLoop.current().run_in_executor(None, self._write, plan)
+            self._complete(written)
+        except Exception as e:
+            LOGGER.error('Journal: records are lost: %s', e)
+        finally:
+            self.writing = []
+
+    def _plan(self, batch):
+        """Assign the positions of the records (rotate segments when they are full)."""
+        plan = []
+        for alert, target, timestamp, data in batch:
+            if self.size and self.size + len(data) > self.segment_size:
+                self.segments.append(self.segments[-1] + 1)
+                self.size = 0
+            plan.append((alert, target, timestamp, self.segments[-1], self.size, data))
+            self.size += len(data)
+        return plan
+
+    def _write(self, plan):
+        """Write the records at their positions (so batches can be written in any order)."""
+        chunks = {}
+        for _, _, _, segment, offset, data in plan:
+            chunks.setdefault(segment, (offset, []))[1].append(data)
+        for segment, (offset, datas) in sorted(chunks.items()):
+            fd = os.open(self._path(segment), os.O_WRONLY | os.O_CREAT, 0o644)
+            try:
+                os.pwrite(fd, b''.join(datas), offset)
+            finally:
+                os.close(fd)
+        return plan
+
+    def _complete(self, plan):
+        for alert, target, timestamp, segment, offset, _ in plan:
+            self._index(alert, target, timestamp, segment, offset)
+        self._expire()
+
+    def _expire(self):
+        """Remove the oldest segments."""
+        excess = len(self.segments) - self.max_segments
+        if excess <= 0:
+            return
+
+        removed, self.segments = self.segments[:excess], self.segments[excess:]
+        for segment in removed:
+            buf = self.maps.pop(segment, None)
+            if buf is not None:
+                buf.close()
+            try:
+                os.remove(self._path(segment))
+            except OSError:
+                pass
+
+        oldest = self.segments[0]
+        for key, (timestamps, segments, offsets) in list(self.index.items()):
+            start = bisect.bisect_left(segments, oldest)
+            if start == len(segments):
+                del self.index[key]
+            elif start:
+                del timestamps[:start], segments[:start], offsets[:start]
+
+    def _index(self, alert, target, timestamp, segment, offset):
+        timestamps, segments, offsets = self.index[(alert, target)]
+        timestamps.append(timestamp)
+        segments.append(segment)
+        offsets.append(offset)
+
+    def _path(self, segment):
+        return os.path.join(self.directory, '%012d%s' % (segment, SUFFIX))
+
+    def _map(self, segment):
+        """Map a segment (the current one is mapped again when it has grown)."""
+        buf = self.maps.get(segment)
+        path = self._path(segment)
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        if buf is not None and len(buf) >= size:
+            return buf
+        if buf is not None:
+            buf.close()
+        if not size:
+            return b''
+        with open(path, 'rb') as fjournal:
+            buf = self.maps[segment] = mmap.mmap(fjournal.fileno(), 0, access=mmap.ACCESS_READ)
+        return buf
+
+    def history(self, alert, target, since=None):
+        """Get the transitions of the target (the oldest first).
+
+        :rtype: list
+        """
+        key = (str(alert), _target_key(target))
+        result = []
+        if key in self.index:
+            timestamps, segments, offsets = self.index[key]
+            start = 0 if since is None else bisect.bisect_left(timestamps, since)
+            for segment, offset in zip(segments[start:], offsets[start:]):
+                result.append(decode(self._map(segment), offset)[0])
+
+        result.extend(
+            decode(data)[0] for alert_, target_, timestamp, data in self.writing + self.pending
+            if (alert_, target_) == key and (since is None or timestamp >= since))
+        return result
+
+    def targets(self, alert=None):
+        """Get the (alert, target) of the journal."""
+        keys = set(self.index) | set(
+            (alert_, target_) for alert_, target_, _, _ in self.writing + self.pending)
+        return sorted(key for key in keys if alert is None or key[0] == str(alert))
+
+    def flapping(self, since, min_transitions=4):
+        """Find targets which have changed the level at least `min_transitions` times.
+
+        :return: (alert, target, number of transitions) the most flapping first
+        :rtype: list
+        """
+        counts = defaultdict(int)
+        for key, (timestamps, _, _) in self.index.items():
+            counts[key] += len(timestamps) - bisect.bisect_left(timestamps, since)
+        for alert, target, timestamp, _ in self.writing + self.pending:
+            if timestamp >= since:
+                counts[(alert, target)] += 1
+        return sorted(
+            ((alert, target or None, count) for (alert, target), count in counts.items()
+             if count >= min_transitions), key=lambda item: (-item[2], item[0], item[1] or ''))
+
+
+def _target_key(target):
+    return '' if target is None else str(target)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Query the journal of alert transitions.')
+    parser.add_argument('directory', help='journal directory')
+    commands = parser.add_subparsers(dest='command')
+    history = commands.add_parser('history', help='transitions of a target')
+    history.add_argument('--alert', required=True, help='alert name')
+    history.add_argument('--target', default=None, help='target name')
+    history.add_argument('--since', default=None, help='period, e.g. 1day')
+    flapping = commands.add_parser('flapping', help='targets which change levels often')
+    flapping.add_argument('--since', default='1hour', help='period, e.g. 1hour')
+    flapping.add_argument('--min', type=int, default=4, help='minimal number of transitions')
+    args = parser.parse_args(args)
+
+    journal = Journal(args.directory)
+    since = args.since and time.time() - TimeUnit.from_interval(args.since).convert_to(SECOND)
+    if args.command == 'history':
+        for item in journal.history(args.alert, args.target, since):
+            print('%s %s -> %s %s %s' % (
+                time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(item.timestamp)),
+                item.old_level, item.new_level,
+                item.message if item.value is None else item.value, item.rule or ''))
+    elif args.command == 'flapping':
+        for alert, target, count in journal.flapping(since, args.min):
+            print('%d %s [%s]' % (count, alert, target))
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+"""Match metric names against Graphite glob patterns."""
+
+import re
+
+GLOB_CHARS = re.compile(r'[*?\[{]')
+
+
+def is_literal(pattern):
+    """Check that the pattern has no glob syntax."""
+    return not GLOB_CHARS.search(pattern)
+
+
+def translate(pattern):
+    """Translate a Graphite glob (`*`, `?`, `[0-9]`, `{a,b}`) to a regular expression.
+
+    Wildcards never match the dots between path segments.
+    """
+    result, pos, depth = [], 0, 0
+    while pos < len(pattern):
+        char = pattern[pos]
+        pos += 1
+        if char == '*':
+            result.append('[^.]*')
+        elif char == '?':
+            result.append('[^.]')
+        elif char == '[':
+            end = pattern.find(']', pos)
+            if end < 0:
+                result.append(re.escape(char))
+                continue
+            chars = pattern[pos:end]
+            pos = end + 1
+            if chars.startswith('!'):
+                chars = '^' + chars[1:]
+            result.append('[%s]' % chars.replace('\\', '\\\\'))
+        elif char == '{':
+            depth += 1
+            result.append('(?:')
+        elif char == '}' and depth:
+            depth -= 1
+            result.append(')')
+        elif char == ',' and depth:
+            result.append('|')
+        else:
+            result.append(re.escape(char))
+    return ''.join(result) + ')' * depth
+
+
+def compile_pattern(pattern):
+    """Compile a Graphite glob to a regular expression matching whole names."""
+    return re.compile('^%s$' % translate(pattern))
+
+
+def expand(pattern):
+    """Expand the `{a,b}` alternatives of a glob to separate patterns."""
+    start = pattern.find('{')
+    if start < 0:
+        return [pattern]
+
+    alternatives, depth, pos = [], 0, start
+    for end in range(start, len(pattern)):
+        char = pattern[end]
+        if char == '{':
+            depth += 1
+        elif char == ',' and depth == 1:
+            alternatives.append(pattern[pos + 1:end])
+            pos = end
+        elif char == '}':
+            depth -= 1
+            if not depth:
+                alternatives.append(pattern[pos + 1:end])
+                break
+    else:
+        # Unbalanced braces are left to the regular expression
+        return [pattern]
+
+    prefix, suffix = pattern[:start], pattern[end + 1:]
+    return [
+        expanded for alternative in alternatives
+        for expanded in expand(prefix + alternative + suffix)]
+
+
+class _Node(object):
+
+    __slots__ = 'literals', 'star', 'globs', 'values'
+
+    def __init__(self):
+        self.literals = {}
+        self.star = None
+        self.globs = {}
+        self.values = set()
+
+    def __bool__(self):
+        return bool(self.literals or self.star or self.globs or self.values)
+
+
+class PatternIndex(object):
+
+    """Find the values registered with globs matching a metric name.
+
+    The globs are kept in a trie of their dotted segments. Literal segments are
+    looked up in a dict, `*` segments match anything and other segments are
+    checked with a regular expression, so a name is matched in time proportional
+    to its length rather than to the number of the globs. Brace alternatives are
+    expanded to separate paths of the trie.
+    """
+
+    cache_size = 100000
+
+    def __init__(self):
+        self.root = _Node()
+        self.patterns = {}
+        self.cache = {}
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def __contains__(self, value):
+        return value in self.patterns
+
+    def add(self, pattern, value):
+        """Register the value with the glob."""
+        if value in self.patterns:
+            self.remove(value)
+        self.patterns[value] = pattern
+        self.cache.clear()
+
+        for expanded in expand(pattern):
+            node = self.root
+            for segment in expanded.split('.'):
+                node = self._child(node, segment)
+            node.values.add(value)
+
+    def remove(self, value):
+        """Unregister the value."""
+        pattern = self.patterns.pop(value, None)
+        if pattern is None:
+            return
+        self.cache.clear()
+
+        for expanded in expand(pattern):
+            path, node = [], self.root
+            for segment in expanded.split('.'):
+                path.append((node, segment))
+                node = self._child(node, segment)
+            node.values.discard(value)
+
+            # Prune the empty branches
+            while path and not node:
+                node, segment = path.pop()
+                self._prune(node, segment)
+
+    def match(self, name):
+        """Get the values interested in the metric name.
+
+        :rtype: frozenset
+        """
+        result = self.cache.get(name)
+        if result is not None:
+            return result
+
+        nodes = [self.root]
+        for segment in name.split('.'):
+            found = []
+            for node in nodes:
+                child = node.literals.get(segment)
+                if child is not None:
+                    found.append(child)
+                if node.star is not None:
+                    found.append(node.star)
+                for regexp, child in node.globs.values():
+                    if regexp.match(segment):
+                        found.append(child)
+            nodes = found
+            if not nodes:
+                break
+
+        result = frozenset(value for node in nodes for value in node.values)
+        if len(self.cache) >= self.cache_size:
+            self.cache.clear()
+        self.cache[name] = result
+        return result
+
+    @staticmethod
+    def _child(node, segment):
+        """Get or create the child node for the segment."""
+        if segment == '*':
+            if node.star is None:
+                node.star = _Node()
+            return node.star
+
+        if is_literal(segment):
+            child = node.literals.get(segment)
+            if child is None:
+                child = node.literals[segment] = _Node()
+            return child
+
+        if segment not in node.globs:
+            node.globs[segment] = compile_pattern(segment), _Node()
+        return node.globs[segment][1]
+
+    @staticmethod
+    def _prune(node, segment):
+        """Drop the child node for the segment."""
+        if segment == '*':
+            node.star = None
+        elif is_literal(segment):
+            del node.literals[segment]
+        else:
+            del node.globs[segment]
@@ -0,0 +1,157 @@
+"""Merge the queries of Graphite alerts which request sibling series.
+
+Alerts which query plain metric paths (`servers.web1.cpu.user`,
+`servers.web2.cpu.user`, ...) with the same time range and schedule are grouped and
+their paths are merged into brace expressions (`servers.{web1,web2}.cpu.user`). The
+merged query is fetched once and the returned series are routed back to the alerts
+by name.
+
+Only alternatives of literal path segments are used, so a merged query never
+expands to other series than the original paths. Alerts with response limits
+(`max_series`, `max_response_bytes`) are not merged: they fetch their own queries
+so the limits are checked while the responses are received.
+"""
+
+import re
+from collections import defaultdict
+
+from tornado import gen, log
+
+from . import units
+from .patterns import expand
+
+LOGGER = log.gen_log
+PATH_RE = re.compile(r'^[\w\-:]+(\.[\w\-:]+)*$')
+
+
+def is_path(query):
+    """Check that the query is a plain metric path (no globs or functions)."""
+    return bool(PATH_RE.match(query))
+
+
+class SharedQuery(object):
+
+    """Fetch a merged query once for all the alerts which own its series.
+
+    The response is shared by the loads of the alerts during half of their interval,
+    the next load fetches the query again.
+    """
+
+    def __init__(self, query, alerts):
+        self.query = query
+        self.alerts = alerts
+        leader = alerts[0]
+        self.client = leader.client
+        self.request = leader._render_request(leader._graphite_url(
+            query, graphite_url=leader.reactor.options.get('graphite_url'), raw_data=True))
+        self.ttl = leader.interval.convert_to(units.SECOND) / 2.0
+        self.priority = min(alert.priority for alert in alerts)
+        self.fetches = leader.reactor.fetches
+        self.fetched = None
+        self.fetched_at = None
+
+    def __len__(self):
+        return len(self.alerts)
+
+    async def fetch(self, alert):
+        """Get the raw series of the alert's path.
+
+        :return: raw Graphite lines
+        :rtype: list
+        """
+        now = alert.reactor.loop.time()
+        if self.fetched is None or now - self.fetched_at >= self.ttl:
+            self.fetched_at = now
+            self.fetched = gen.convert_yielded(self._fetch())
+        routed = await self.fetched
+        return routed.get(alert.query, [])
+
+    async def _fetch(self):
+        await self.fetches.acquire(self.priority)
+        try:
+            response = await self.client.fetch(self.request)
+        finally:
+            self.fetches.release()
+        routed = defaultdict(list)
+        for line in response.buffer:
+            meta, sep, _ = line.partition(b'|')
+            if sep:
+                routed[meta.rsplit(b',', 3)[0].decode('utf-8')].append(line)
+        return routed
+
+
+def fetch_key(alert):
+    """Get the parameters which should be the same to share a fetch."""
+    return (alert.from_time.as_graphite(), alert.until.as_graphite(),
+            alert.interval.as_graphite(), alert.request_timeout, alert.connect_timeout)
+
+
+def merge_paths(paths, limit=100):
+    """Merge sibling paths (which differ in one segment) into brace expressions.
+
+    The largest groups of siblings are merged first, a path is merged once.
+
+    :param limit int: the maximum number of paths in an expression
+    :return: the expressions with the paths they expand to
+    :rtype: list
+    """
+    siblings = defaultdict(list)
+    for path in sorted(set(paths)):
+        segments = path.split('.')
+        for pos in range(len(segments)):
+            siblings[(
+                len(segments), pos, tuple(segments[:pos]), tuple(segments[pos + 1:]))].append(path)
+
+    merged, taken = [], set()
+    for (_, pos, head, tail), group in sorted(
+            siblings.items(), key=lambda item: (-len(item[1]), item[0])):
+        group = [path for path in group if path not in taken]
+        for start in range(0, len(group), limit):
+            chunk = group[start:start + limit]
+            if len(chunk) < 2:
+                continue
+            names = [path.split('.')[pos] for path in chunk]
+            query = '.'.join(head + ('{%s}' % ','.join(names),) + tail)
+            # The expression should expand to the merged paths only
+            if set(expand(query)) != set(chunk):
+                LOGGER.warning('Paths are not merged, %s expands to other paths', query)
+                continue
+            merged.append((query, chunk))
+            taken.update(chunk)
+
+    merged.extend((path, [path]) for path in sorted(set(paths) - taken))
+    return merged
+
+
+def plan(alerts, limit=100):
+    """Share the fetches of Graphite alerts with sibling paths.
+
+    :return: the shared queries
+    :rtype: list
+    """
+    groups = defaultdict(list)
+    for alert in alerts:
+        # The responses of alerts with limits are checked while they are received
+        limited = alert.max_series is not None or alert.max_response_bytes is not None
+        if alert.source == 'graphite' and not (alert.incremental or alert.top or limited) \
+                and is_path(alert.query):
+            groups[fetch_key(alert)].append(alert)
+
+    shared = []
+    for group in groups.values():
+        by_path = defaultdict(list)
+        for alert in group:
+            by_path[alert.query].append(alert)
+
+        for query, paths in merge_paths(by_path, limit):
+            owners = sorted(
+                (alert for path in paths for alert in by_path[path]), key=lambda a: a.name)
+            if len(owners) < 2:
+                continue
+            query = SharedQuery(query, owners)
+            for alert in owners:
+                alert.shared = query
+            shared.append(query)
+            LOGGER.debug('Merged %d alerts into %s', len(owners), query.query)
+
+    return shared
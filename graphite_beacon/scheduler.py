@@ -0,0 +1,136 @@
+"""Control alerts' load under overload."""
+
+import heapq
+import itertools
+
+from tornado import ioloop, locks, log
+from tornado.concurrent import Future
+
+LOGGER = log.gen_log
+
+
+class OverloadController(object):
+
+    """Stretch the interval of expensive alerts under overload and shrink it back on recovery.
+
+    An alert is stretched when its previous load is still running or when the number of
+    loads in flight exceeds the global budget (only alerts which are slower than average
+    are stretched in this case). It is shrunk back when a load fits into its interval.
+    """
+
+    def __init__(self, budget=None, max_backoff=8):
+        self.budget = budget
+        self.max_backoff = max_backoff
+        self.inflight = 0
+        self.avg_duration = 0.0
+
+    @property
+    def overloaded(self):
+        """Check whether the in-flight work exceeds the budget."""
+        return bool(self.budget) and self.inflight >= self.budget
+
+    def acquire(self, alert):
+        """Register a load start.
+
+        :return: False if the alert is still loading and should skip this cycle
+        :rtype: bool
+        """
+        if alert.waiting:
+            self.stretch(alert)
+            return False
+
+        if self.overloaded and alert.load_duration >= self.avg_duration:
+            self.stretch(alert)
+
+        alert.waiting = True
+        alert.load_started = alert.reactor.loop.time()
+        self.inflight += 1
+        return True
+
+    def release(self, alert):
+        """Register a load finish."""
+        alert.waiting = False
+        alert.load_duration = alert.reactor.loop.time() - alert.load_started
+        self.avg_duration += (alert.load_duration - self.avg_duration) * 0.1
+        self.inflight = max(self.inflight - 1, 0)
+        # A load which does not fit into the interval would overlap the next one again
+        if not self.overloaded and alert.load_duration * 1000 <= alert.callback_time:
+            self.shrink(alert)
+
+    def stretch(self, alert):
+        """Double the alert's effective interval."""
+        if alert.backoff >= self.max_backoff:
+            alert.notify(
+                'warning', 'Process takes too much time', target='waiting', ntype='common')
+            return
+
+        alert.set_backoff(min(alert.backoff * 2, self.max_backoff))
+        LOGGER.info("%s: interval is stretched to %s", alert.name, alert.effective_interval)
+
+    @staticmethod
+    def shrink(alert):
+        """Halve the alert's effective interval."""
+        if alert.backoff == 1:
+            return
+
+        alert.set_backoff(max(alert.backoff // 2, 1))
+        LOGGER.info("%s: interval is shrunk to %s", alert.name, alert.effective_interval)
+        if alert.backoff == 1:
+            alert.notify('normal', 'Process is back on schedule', target='waiting', ntype='common')
+
+
+class HostLimiter(object):
+
+    """Limit the number of concurrent requests to each host."""
+
+    def __init__(self, limit=None):
+        self.limit = limit
+        self.semaphores = {}
+
+    def get(self, host):
+        """Get the semaphore of the host (None when the requests are not limited)."""
+        if not self.limit:
+            return None
+
+        semaphore = self.semaphores.get(host)
+        if semaphore is None:
+            semaphore = self.semaphores[host] = locks.Semaphore(self.limit)
+        return semaphore
+
+
+class FetchQueue(object):
+
+    """Limit the number of concurrent fetches and serve the waiting ones by priority.
+
+    Lower priorities are served first (alerts use the order of `LEVELS`). A waiting
+    fetch ages: its priority decreases by `aging` per second of waiting, so low
+    priority fetches are not starved. As every waiting fetch ages at the same rate,
+    the order only depends on `priority + aging * enqueued time` and a heap is enough.
+    """
+
+    def __init__(self, limit=None, aging=1.0):
+        self.limit = limit
+        self.aging = aging
+        self.active = 0
+        self.waiters = []
+        self.seq = itertools.count()
+
+    async def acquire(self, priority=0):
+        """Wait for a fetch slot."""
+        if not self.limit or (self.active < self.limit and not self.waiters):
+            self.active += 1
+            return
+
+        waiter = Future()
+        key = priority + self.aging * ioloop.IOLoop.current().time()
+        heapq.heappush(self.waiters, (key, next(self.seq), waiter))
+        await waiter
+
+    def release(self):
+        """Free a fetch slot (it is passed to the first waiting fetch)."""
+        while self.waiters:
+            _, _, waiter = heapq.heappop(self.waiters)
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active = max(self.active - 1, 0)
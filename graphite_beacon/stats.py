@@ -0,0 +1,240 @@
+"""Incremental statistics for anomaly detection rules.
+
+A statistic keeps a compact state for each target id of a `TargetStore` and updates
+it in O(1) per value. It provides the baseline for the next value of a target (None
+while not enough values are seen).
+"""
+
+import math
+from array import array
+
+from .utils import HISTORICAL, ZSCORE
+
+NAN = float('nan')
+
+
+class Ewma(object):
+
+    """Exponentially weighted moving average."""
+
+    def __init__(self, alpha):
+        self.alpha = alpha
+        self.values = array('d')
+
+    def get(self, tid):
+        value = self.values[tid] if tid < len(self.values) else NAN
+        return None if math.isnan(value) else value
+
+    def push(self, tid, value):
+        values = self.values
+        if tid >= len(values):
+            values.extend(array('d', [NAN]) * (tid + 1 - len(values)))
+        average = values[tid]
+        values[tid] = value if math.isnan(average) else average + self.alpha * (value - average)
+
+    def reset(self, tid):
+        if tid < len(self.values):
+            self.values[tid] = NAN
+
+
+class HoltWinters(object):
+
+    """Additive Holt-Winters forecast (level, trend and season).
+
+    The state of a target is an array of the level, the trend, the number of seen
+    values and a seasonal component per point of the season. The forecast is known
+    after the first season. Unlike the other statistics the state grows with the
+    season: 8 bytes per point (about 11KB for a day of minutes).
+    """
+
+    LEVEL, TREND, COUNT, SEASON = 0, 1, 2, 3
+
+    def __init__(self, period, alpha=0.2, beta=0.01, gamma=0.3):
+        self.period = max(int(period), 1)
+        self.alpha, self.beta, self.gamma = alpha, beta, gamma
+        self.states = []
+
+    def get(self, tid):
+        state = self.states[tid] if tid < len(self.states) else None
+        if state is None or state[self.COUNT] < self.period:
+            return None
+        pos = int(state[self.COUNT]) % self.period
+        return state[self.LEVEL] + state[self.TREND] + state[self.SEASON + pos]
+
+    def push(self, tid, value):
+        states = self.states
+        if tid >= len(states):
+            states.extend([None] * (tid + 1 - len(states)))
+        state = states[tid]
+        if state is None:
+            state = states[tid] = array('d', [value, 0.0, 0.0]) + array('d', [0.0]) * self.period
+
+        count = int(state[self.COUNT])
+        pos = self.SEASON + count % self.period
+        if count < self.period:
+            # The first season is measured against the first value
+            state[pos] = value - state[self.LEVEL]
+        else:
+            level, trend, season = state[self.LEVEL], state[self.TREND], state[pos]
+            state[self.LEVEL] = self.alpha * (value - season) + (1 - self.alpha) * (level + trend)
+            state[self.TREND] = self.beta * (state[self.LEVEL] - level) + (1 - self.beta) * trend
+            state[pos] = self.gamma * (value - state[self.LEVEL]) + (1 - self.gamma) * season
+        state[self.COUNT] = count + 1
+
+    def reset(self, tid):
+        if tid < len(self.states):
+            self.states[tid] = None
+
+
+class Quantile(object):
+
+    """Streaming quantile estimation with the P-square algorithm.
+
+    Jain R. and Chlamtac I., The P-square algorithm for dynamic calculation of
+    quantiles and histograms without storing observations, 1985.
+
+    The state of a target is 5 marker heights, 5 marker positions and the number of
+    seen values. The quantile is known after 5 values.
+    """
+
+    MARKERS = 5
+    COUNT = 10
+
+    def __init__(self, probability):
+        self.probability = p = probability
+        self.increments = (0.0, p / 2, p, (1 + p) / 2, 1.0)
+        self.states = []
+
+    def get(self, tid):
+        state = self.states[tid] if tid < len(self.states) else None
+        if state is None or state[self.COUNT] < self.MARKERS:
+            return None
+        return state[2]
+
+    def push(self, tid, value):
+        states = self.states
+        if tid >= len(states):
+            states.extend([None] * (tid + 1 - len(states)))
+        state = states[tid]
+        if state is None:
+            state = states[tid] = array('d', [0.0]) * (self.COUNT + 1)
+
+        count = int(state[self.COUNT])
+        state[self.COUNT] = count + 1
+        heights, positions = state, self.MARKERS
+
+        # Collect the first values as the initial markers
+        if count < self.MARKERS:
+            heights[count] = value
+            if count + 1 == self.MARKERS:
+                initial = sorted(heights[:self.MARKERS])
+                for idx in range(self.MARKERS):
+                    heights[idx] = initial[idx]
+                    state[positions + idx] = idx
+            return
+
+        if value < heights[0]:
+            heights[0] = value
+            cell = 0
+        elif value >= heights[4]:
+            heights[4] = value
+            cell = 3
+        else:
+            cell = 0
+            while value >= heights[cell + 1]:
+                cell += 1
+        for idx in range(cell + 1, self.MARKERS):
+            state[positions + idx] += 1
+
+        # Adjust the middle markers towards their desired positions
+        for idx in (1, 2, 3):
+            position = state[positions + idx]
+            delta = self.increments[idx] * count - position
+            right = state[positions + idx + 1] - position
+            left = state[positions + idx - 1] - position
+            if (delta >= 1 and right > 1) or (delta <= -1 and left < -1):
+                sign = 1 if delta > 0 else -1
+                height = self._parabolic(state, idx, sign)
+                if not heights[idx - 1] < height < heights[idx + 1]:
+                    height = heights[idx] + sign * (
+                        heights[idx + sign] - heights[idx]) / (
+                            state[positions + idx + sign] - position)
+                heights[idx] = height
+                state[positions + idx] = position + sign
+
+    def _parabolic(self, state, idx, sign):
+        heights, positions = state, self.MARKERS
+        position = state[positions + idx]
+        left, right = state[positions + idx - 1], state[positions + idx + 1]
+        upper = (position - left + sign) * (heights[idx + 1] - heights[idx]) / (right - position)
+        lower = (right - position - sign) * (heights[idx] - heights[idx - 1]) / (position - left)
+        return heights[idx] + sign / (right - left) * (upper + lower)
+
+    def reset(self, tid):
+        if tid < len(self.states):
+            self.states[tid] = None
+
+
+class Statistics(object):
+
+    """Calculate the baselines used by the rules of an alert.
+
+    `historical` and `zscore` are calculated from the store's history, other
+    baselines are tracked by the statistics above.
+    """
+
+    def __init__(self, store, names, options):
+        self.store = store
+        self.names = set(names)
+        self.trackers = {}
+        for name in self.names:
+            if name == 'ewma':
+                self.trackers[name] = Ewma(options['ewma_alpha'])
+            elif name == 'seasonal':
+                self.trackers[name] = HoltWinters(
+                    options['season_period'], options['seasonal_alpha'],
+                    options['seasonal_beta'], options['seasonal_gamma'])
+            elif name.startswith('p'):
+                probability = float(name[1:]) / 100
+                if not 0 < probability < 1:
+                    raise ValueError('Invalid percentile: %s' % name)
+                self.trackers[name] = Quantile(probability)
+        store.trackers.append(self)
+
+    def baselines(self, tids, values):
+        """Get the baselines for the values of the targets.
+
+        :return: a list of the baselines (None when unknown) per name
+        :rtype: dict
+        """
+        result = dict(
+            (name, [tracker.get(tid) for tid in tids])
+            for name, tracker in self.trackers.items())
+
+        if HISTORICAL in self.names or ZSCORE in self.names:
+            means = self.store.means(tids)
+            result[HISTORICAL] = means
+
+        if ZSCORE in self.names:
+            result[ZSCORE] = [
+                None if mean is None else zscore(value, mean, stddev)
+                for value, mean, stddev in zip(values, means, self.store.stddevs(tids))]
+
+        return result
+
+    def push(self, tid, value):
+        for tracker in self.trackers.values():
+            tracker.push(tid, value)
+
+    def reset(self, tid):
+        for tracker in self.trackers.values():
+            tracker.reset(tid)
+
+
+def zscore(value, mean, stddev):
+    """Get the number of standard deviations the value is away from the mean."""
+    if stddev:
+        return (value - mean) / stddev
+    if value == mean:
+        return 0.0
+    return math.copysign(float('inf'), value - mean)
@@ -0,0 +1,335 @@
+"""Compact per-target state storage.
+
+Targets are interned to integer ids. Levels, last-seen marks and history live in
+preallocated arrays indexed by the id, so a target costs tens of bytes (plus its
+history ring) instead of a dict item and a deque per target. The history rings are
+rows of a single array, the slots of removed targets are reused by new ones.
+"""
+
+import math
+from array import array
+
+from collections.abc import Mapping, MutableMapping
+
+LEVEL_CODES = ('critical', 'warning', 'normal')
+LEVEL_IDS = dict((level, code) for code, level in enumerate(LEVEL_CODES))
+NO_LEVEL = -1
+
+_FREE = object()
+
+
+class TargetStore(object):
+
+    """Columnar storage of targets' levels and histories."""
+
+    def __init__(self, history_size, capacity=16):
+        self.history_size = max(int(history_size), 1)
+        self.generation = 0
+        self.evicted = 0
+
+        self.ids = {}
+        self.targets = []
+        self.free = []
+        self.pinned = set()
+        # Objects which keep extra per-target state (reset when a target is removed)
+        self.trackers = []
+
+        self.capacity = 0
+        self.levels = array('b')
+        self.seen = array('I')
+        self.hist = array('d')
+        self.hist_len = array('I')
+        self.hist_pos = array('I')
+        self.hist_sum = array('d')
+        self.hist_sumsq = array('d')
+        self._grow(capacity)
+
+        self.state = StateView(self)
+        self.history = HistoryView(self)
+
+    def __len__(self):
+        """Get number of stored targets."""
+        return len(self.ids)
+
+    def __contains__(self, target):
+        """Check that the target is stored."""
+        return target in self.ids
+
+    def _grow(self, size):
+        self.capacity += size
+        self.levels.extend(array('b', [NO_LEVEL]) * size)
+        self.seen.extend(array('I', [0]) * size)
+        self.hist.extend(array('d', [0.0]) * (size * self.history_size))
+        self.hist_len.extend(array('I', [0]) * size)
+        self.hist_pos.extend(array('I', [0]) * size)
+        self.hist_sum.extend(array('d', [0.0]) * size)
+        self.hist_sumsq.extend(array('d', [0.0]) * size)
+
+    def intern(self, target):
+        """Get the target's id, allocate a slot for an unknown target."""
+        tid = self.ids.get(target)
+        if tid is not None:
+            return tid
+
+        if self.free:
+            tid = self.free.pop()
+            self.targets[tid] = target
+        else:
+            tid = len(self.targets)
+            if tid >= self.capacity:
+                self._grow(self.capacity)
+            self.targets.append(target)
+
+        self.ids[target] = tid
+        self.seen[tid] = self.generation
+        return tid
+
+    def pin(self, *targets):
+        """Protect the targets from eviction."""
+        self.pinned.update(self.intern(target) for target in targets)
+
+    def tick(self):
+        """Start a new check cycle."""
+        self.generation += 1
+
+    def touch(self, target):
+        """Mark the target as seen in the current cycle."""
+        tid = self.intern(target)
+        self.seen[tid] = self.generation
+        return tid
+
+    def stale(self, max_age=None, max_targets=None):
+        """Find targets to evict.
+
+        Targets which were not seen for `max_age` cycles are stale. When there are more
+        than `max_targets` targets, the least recently seen ones are stale too.
+
+        :return: a list of stale targets
+        :rtype: list
+        """
+        seen, pinned = self.seen, self.pinned
+        candidates = [(seen[tid], target) for target, tid in self.ids.items()
+                      if tid not in pinned]
+        stale = []
+
+        if max_age:
+            threshold = self.generation - max_age
+            stale = [target for last_seen, target in candidates if last_seen <= threshold]
+
+        if max_targets and len(candidates) - len(stale) > max_targets:
+            excess = len(candidates) - len(stale) - max_targets
+            stale_set = set(stale)
+            alive = sorted(
+                (item for item in candidates if item[1] not in stale_set), key=lambda x: x[0])
+            stale.extend(target for _, target in alive[:excess])
+
+        return stale
+
+    def remove(self, target):
+        """Free the target's slot."""
+        tid = self.ids.pop(target)
+        self.targets[tid] = _FREE
+        self.levels[tid] = NO_LEVEL
+        self.clear_history(tid)
+        for tracker in self.trackers:
+            tracker.reset(tid)
+        self.pinned.discard(tid)
+        self.free.append(tid)
+        self.evicted += 1
+
+    def get_level(self, tid):
+        code = self.levels[tid]
+        return None if code == NO_LEVEL else LEVEL_CODES[code]
+
+    def set_level(self, tid, level):
+        self.levels[tid] = LEVEL_IDS[level]
+
+    def reset_levels(self, level='normal'):
+        """Set all the known levels to the given one."""
+        code, levels = LEVEL_IDS[level], self.levels
+        for tid in self.ids.values():
+            if levels[tid] != NO_LEVEL:
+                levels[tid] = code
+
+    def append(self, target, value):
+        """Append the value to the target's history."""
+        tid = self.touch(target)
+        self.push(tid, value)
+        return tid
+
+    def push(self, tid, value):
+        size = self.history_size
+        pos, length = self.hist_pos[tid], self.hist_len[tid]
+        idx = tid * size + pos
+        if length == size:
+            old = self.hist[idx]
+            self.hist_sum[tid] -= old
+            self.hist_sumsq[tid] -= old * old
+        else:
+            self.hist_len[tid] = length + 1
+        self.hist[idx] = value
+        pos = (pos + 1) % size
+        self.hist_pos[tid] = pos
+        if pos == 0:
+            # Recalculate the sums once per ring turn to avoid accumulating float errors
+            self.hist_sum[tid] = sum(self.iter_history(tid))
+            self.hist_sumsq[tid] = sum(item * item for item in self.iter_history(tid))
+        else:
+            self.hist_sum[tid] += value
+            self.hist_sumsq[tid] += value * value
+
+    def clear_history(self, tid):
+        self.hist_len[tid] = self.hist_pos[tid] = 0
+        self.hist_sum[tid] = self.hist_sumsq[tid] = 0.0
+
+    def iter_history(self, tid):
+        """Iterate over the target's history from the oldest value."""
+        size, length = self.history_size, self.hist_len[tid]
+        base, start = tid * size, (self.hist_pos[tid] - length) % size
+        hist = self.hist
+        for offset in range(length):
+            yield hist[base + (start + offset) % size]
+
+    def means(self, tids):
+        """Get historical means for the targets' ids, None while a history is not full."""
+        size, hist_len, hist_sum = self.history_size, self.hist_len, self.hist_sum
+        return [hist_sum[tid] / size if hist_len[tid] == size else None for tid in tids]
+
+    def stddevs(self, tids):
+        """Get standard deviations of histories, None while a history is not full."""
+        size, hist_len = self.history_size, self.hist_len
+        hist_sum, hist_sumsq = self.hist_sum, self.hist_sumsq
+        return [
+            math.sqrt(max(hist_sumsq[tid] / size - (hist_sum[tid] / size) ** 2, 0.0))
+            if hist_len[tid] == size else None for tid in tids]
+
+    def mean(self, target):
+        """Get the historical mean, None while the history is not full."""
+        tid = self.ids.get(target)
+        if tid is None or self.hist_len[tid] < self.history_size:
+            return None
+        return self.hist_sum[tid] / self.hist_len[tid]
+
+
+class StateView(MutableMapping):
+
+    """Map targets to their levels."""
+
+    def __init__(self, store):
+        self.store = store
+
+    def __getitem__(self, target):
+        store = self.store
+        tid = store.ids.get(target)
+        level = None if tid is None else store.get_level(tid)
+        if level is None:
+            raise KeyError(target)
+        return level
+
+    def __setitem__(self, target, level):
+        self.store.set_level(self.store.intern(target), level)
+
+    def __delitem__(self, target):
+        store = self.store
+        tid = store.ids.get(target)
+        if tid is None or store.levels[tid] == NO_LEVEL:
+            raise KeyError(target)
+        store.levels[tid] = NO_LEVEL
+
+    def __contains__(self, target):
+        tid = self.store.ids.get(target)
+        return tid is not None and self.store.levels[tid] != NO_LEVEL
+
+    def __iter__(self):
+        levels = self.store.levels
+        return (target for target, tid in list(self.store.ids.items())
+                if levels[tid] != NO_LEVEL)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+class HistoryView(Mapping):
+
+    """Map targets to their histories (unknown targets get an empty one)."""
+
+    def __init__(self, store):
+        self.store = store
+
+    def __getitem__(self, target):
+        return TargetHistory(self.store, target)
+
+    def __setitem__(self, target, values):
+        history = self[target]
+        if values is not history and values != history:
+            history.clear()
+            history.extend(values)
+
+    def __iter__(self):
+        hist_len = self.store.hist_len
+        return (target for target, tid in list(self.store.ids.items()) if hist_len[tid])
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+class TargetHistory(object):
+
+    """A window to a target's history ring.
+
+    Reads do not allocate a slot for an unknown target (its history is empty),
+    writes do.
+    """
+
+    def __init__(self, store, target):
+        self.store = store
+        self.target = target
+
+    @property
+    def tid(self):
+        return self.store.ids.get(self.target)
+
+    @property
+    def maxlen(self):
+        return self.store.history_size
+
+    def __len__(self):
+        tid = self.tid
+        return 0 if tid is None else self.store.hist_len[tid]
+
+    def __iter__(self):
+        tid = self.tid
+        return iter(()) if tid is None else self.store.iter_history(tid)
+
+    def __eq__(self, other):
+        if isinstance(other, TargetHistory):
+            return self.store is other.store and self.target == other.target
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __getitem__(self, index):
+        """Support indexes and slices."""
+        return list(self)[index]
+
+    def __iadd__(self, values):
+        self.extend(values)
+        return self
+
+    def __repr__(self):
+        return 'TargetHistory(%r, %r)' % (self.target, list(self))
+
+    def append(self, value):
+        self.store.push(self.store.intern(self.target), value)
+
+    def extend(self, values):
+        tid = self.store.intern(self.target)
+        for value in values:
+            self.store.push(tid, value)
+
+    def clear(self):
+        tid = self.tid
+        if tid is not None:
+            self.store.clear_history(tid)
@@ -22,3 +22,5 @@ TEMPLATES = {
         'short': LOADER.load('common/short.txt'),
     },
 }
+
+TEMPLATES['carbon'] = TEMPLATES['whisper'] = TEMPLATES['graphite']
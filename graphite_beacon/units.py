@@ -1,5 +1,3 @@
-from __future__ import division
-
 import re
 
 NUMBER_RE = re.compile(r'(?P<value>\-?\d*\.?\d*)(?P<unit>\w+)')
@@ -42,6 +40,8 @@ class TimeUnit(object):
         YEAR: 31536000,
     }
     UNITS_IN_MILLISECONDS = {k: v * 1000 for k, v in UNITS_IN_SECONDS.items()}
+    # The largest units first
+    UNITS_BY_SIZE = sorted(UNITS_IN_MILLISECONDS.items(), key=lambda x: x[1], reverse=True)
 
     UNITS_TO_GRAPHITE = {
         SECOND: 's',
@@ -64,6 +64,7 @@ class TimeUnit(object):
             raise ValueError("Negative time units are not supported: {}".format(value))
         if not self.unit:
             raise ValueError("Unable to parse time unit: {}{}".format(value, unit))
+        self._graphite = None
 
     def display_value(self):
         return int(self.value) if self.value.is_integer() else self.value
@@ -109,9 +110,7 @@ class TimeUnit(object):
         """
         value = round(value / 1000) * 1000  # Ignore fractions of second
 
-        sorted_units = sorted(cls.UNITS_IN_MILLISECONDS.items(),
-                              key=lambda x: x[1], reverse=True)
-        for unit, unit_in_ms in sorted_units:
+        for unit, unit_in_ms in cls.UNITS_BY_SIZE:
             unit_value = value / unit_in_ms
             if unit_value.is_integer():
                 return int(unit_value), unit
@@ -130,6 +129,11 @@ class TimeUnit(object):
         return cls.UNIT_ALIASES_REVERSE.get(unit, None)
 
     def as_graphite(self):
+        if self._graphite is None:
+            self._graphite = self._as_graphite()
+        return self._graphite
+
+    def _as_graphite(self):
         # Graphite does not support decimal numbers, so normalize to an integer
         value, unit = self._normalize_value_ms(self.convert_to(MILLISECOND))
 
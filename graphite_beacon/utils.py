@@ -42,14 +42,23 @@ CONVERT_HASH['%'] = 1
 IDENTITY = lambda x: x
 
 HISTORICAL = 'historical'
+ZSCORE = 'zscore'
+# Values calculated from the targets' histories: historical mean, EWMA, Holt-Winters
+# forecast and percentiles (p50, p99, p99.9...)
+BASELINES = r'(historical|ewma|seasonal|p\d+(?:\.\d+)?)\b'
 COMPARATORS = {'>': op.gt, '>=': op.ge, '<': op.lt, '<=': op.le, '==': op.eq, '!=': op.ne}
 OPERATORS = {'*': op.mul, '/': op.truediv, '+': op.add, '-': op.sub}
 LOGICAL_OPERATORS = {'AND': op.and_, 'OR': op.or_}
+# Group rules: "{level}: {aggregate} {condition} [where {condition}]"
+GROUP_AGGREGATES = ('count', 'percent', 'sum', 'avg', 'max', 'min')
+GROUP_RULE_RE = re(r'^\s*(\w+)\s*:\s*({})\b(.*?)(?:\bwhere\b(.*))?$'.format(
+    '|'.join(GROUP_AGGREGATES)))
 
 RULE_TOKENIZER = make_tokenizer(
     [
         (u'Level', (r'(critical|warning|normal)',)),
-        (u'Historical', (HISTORICAL,)),
+        (u'Baseline', (BASELINES,)),
+        (u'Stat', (ZSCORE,)),
         (u'Comparator', (r'({})'.format('|'.join(sorted(COMPARATORS.keys(), reverse=True))),)),
         (u'LogicalOperator', (r'({})'.format('|'.join(LOGICAL_OPERATORS.keys())),)),
         (u'Sep', (r':',)),
@@ -94,12 +103,14 @@ def _parse_rule(seq):
     level = toktype(u'Level')
     comparator = toktype(u'Comparator') >> COMPARATORS.get
     number = toktype(u'Number') >> float
-    historical = toktype(u'Historical')
+    baseline = toktype(u'Baseline')
+    stat = toktype(u'Stat')
     unit = toktype(u'Unit')
     operator = toktype(u'Operator')
     logical_operator = toktype(u'LogicalOperator') >> LOGICAL_OPERATORS.get
 
-    exp = comparator + ((number + maybe(unit)) | historical) + maybe(operator + number)
+    exp = comparator + maybe(stat) + ((number + maybe(unit)) | baseline) + maybe(
+        operator + number)
     rule = (
         level + s_sep(':') + exp + many(logical_operator + exp)
     )
@@ -108,17 +119,27 @@ def _parse_rule(seq):
     return overall.parse(seq)
 
 
+def is_baseline(value):
+    """Check that an expression's value is a baseline name."""
+    return isinstance(value, str)
+
+
 def _parse_expr(expr):
-    cond, value, mod = expr
+    cond, stat, value, mod = expr
 
-    if value != HISTORICAL:
+    if not is_baseline(value):
         value = convert_from_format(*value)
+    elif stat:
+        raise ValueError('%s should be compared with a number' % stat)
 
     if mod:
         _op, num = mod
         mod = lambda x: OPERATORS[_op](x, num)
 
-    return {'op': cond, 'value': value, 'mod': mod or IDENTITY}
+    result = {'op': cond, 'value': value, 'mod': mod or IDENTITY}
+    if stat:
+        result['stat'] = stat
+    return result
 
 
 def parse_rule(rule):
@@ -131,3 +152,31 @@ def parse_rule(rule):
         result['exprs'].extend([logical_operator, _parse_expr(expr)])
 
     return result
+
+
+def parse_group_rule(rule):
+    """Parse a rule over the values of all the targets.
+
+    `count` and `percent` count the targets matched by the `where` condition, other
+    aggregates are calculated from the matched values (all the values without
+    `where`)::
+
+        critical: percent > 10 where > 90
+        warning: avg > 70
+
+    :raises ValueError: when the rule is invalid
+    """
+    match = GROUP_RULE_RE.match(rule)
+    if not match:
+        raise ValueError('Invalid group rule: %s' % rule)
+
+    level, aggregate, condition, where = match.groups()
+    result = parse_rule('%s: %s' % (level, condition.strip()))
+    if any(is_baseline(expr['value']) or 'stat' in expr for expr in result['exprs'][::2]):
+        raise ValueError('%s should be compared with a number' % aggregate)
+    if aggregate in ('count', 'percent') and not where:
+        raise ValueError('%s should have a where condition' % aggregate)
+
+    result.update(raw=rule, aggregate=aggregate, where=where and parse_rule(
+        '%s: %s' % (level, where.strip())))
+    return result
@@ -0,0 +1,195 @@
+"""Read Whisper files (the storage of carbon) directly.
+
+Only the archive slice which covers the requested period is read: files are mapped
+into memory and the points are unpacked straight from the mapping.
+
+File format: a header (aggregation type, maximum retention, xFilesFactor, number of
+archives), an info per archive (offset, seconds per point, number of points) and the
+archives, each a ring of (timestamp, value) points.
+"""
+
+import mmap
+import os
+import struct
+import time
+from functools import lru_cache
+
+from .graphite import Aggregates
+from .patterns import compile_pattern, expand, is_literal
+
+METADATA = struct.Struct('!2LfL')
+ARCHIVE_INFO = struct.Struct('!3L')
+POINT = struct.Struct('!Ld')
+EXTENSION = '.wsp'
+
+
+class Archive(object):
+
+    def __init__(self, offset, step, points):
+        self.offset = offset
+        self.step = step
+        self.points = points
+        self.retention = step * points
+
+
+@lru_cache(maxsize=64)
+def _points(count):
+    """Get a structure of the given number of points."""
+    return struct.Struct('!' + 'Ld' * count)
+
+
+def read_archives(buf):
+    """Read the archives info from the header."""
+    archives_count = METADATA.unpack_from(buf, 0)[3]
+    return [
+        Archive(*ARCHIVE_INFO.unpack_from(buf, METADATA.size + num * ARCHIVE_INFO.size))
+        for num in range(archives_count)]
+
+
+def fetch(path, from_time, until_time, now=None):
+    """Fetch the points of the period from the most precise archive which covers it.
+
+    :return: (start time, end time, step, values) where unknown values are None,
+             or None when the period is out of the file's retention
+    :raises ValueError: when the file is empty or truncated
+    """
+    now = int(now or time.time())
+    until_time = min(int(until_time), now)
+
+    with open(path, 'rb') as fwsp:
+        # An empty file can not be mapped (ValueError)
+        with mmap.mmap(fwsp.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            try:
+                return _fetch(buf, int(from_time), until_time, now)
+            except struct.error as e:
+                raise ValueError('Truncated Whisper file: %s' % e)
+
+
+def _fetch(buf, from_time, until_time, now):
+    archives = read_archives(buf)
+    if not archives:
+        raise ValueError('Whisper file has no archives')
+    from_time = max(from_time, now - archives[-1].retention)
+    if from_time >= until_time:
+        return None
+
+    archive = next(
+        (archive for archive in archives if archive.retention >= now - from_time),
+        archives[-1])
+    step = archive.step
+    from_interval = from_time - from_time % step + step
+    until_interval = until_time - until_time % step + step
+    if from_interval == until_interval:
+        until_interval += step
+    count = (until_interval - from_interval) // step
+
+    base = POINT.unpack_from(buf, archive.offset)[0]
+    if not base:
+        values = [None] * count
+    else:
+        # Points of other rounds of the ring are outdated
+        points = _read_points(buf, archive, base, from_interval, count)
+        values = [
+            value if timestamp == interval else None
+            for timestamp, value, interval in zip(
+                points[0::2], points[1::2], range(from_interval, until_interval, step))]
+
+    return from_interval, until_interval, step, values
+
+
+def _read_points(buf, archive, base, from_interval, count):
+    """Unpack the points of a ring slice (flat timestamps and values)."""
+    start = (from_interval - base) // archive.step % archive.points
+    head = min(count, archive.points - start)
+    points = _points(head).unpack_from(buf, archive.offset + start * POINT.size)
+    if head < count:
+        # The slice wraps around the end of the archive
+        points += _points(count - head).unpack_from(buf, archive.offset)
+    return points
+
+
+def create(path, archives, points=(), xff=0.5, aggregation=1):
+    """Create a Whisper file (for tests and benchmarks).
+
+    :param archives list: (seconds per point, number of points) of each archive
+    :param points list: (timestamp, value) to write to the first archive
+    """
+    header_size = METADATA.size + ARCHIVE_INFO.size * len(archives)
+    infos, offset = [], header_size
+    for step, count in archives:
+        infos.append(Archive(offset, step, count))
+        offset += count * POINT.size
+
+    data = bytearray(offset)
+    METADATA.pack_into(
+        data, 0, aggregation, max(archive.retention for archive in infos), xff, len(infos))
+    for num, archive in enumerate(infos):
+        ARCHIVE_INFO.pack_into(
+            data, METADATA.size + num * ARCHIVE_INFO.size,
+            archive.offset, archive.step, archive.points)
+
+    first, base = infos[0], None
+    for timestamp, value in points:
+        interval = int(timestamp) - int(timestamp) % first.step
+        if base is None:
+            base = interval
+        pos = (interval - base) // first.step % first.points
+        POINT.pack_into(data, first.offset + pos * POINT.size, interval, value)
+
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    with open(path, 'wb') as fwsp:
+        fwsp.write(data)
+
+
+def find(root, query):
+    """Find the files of the metrics matched by a Graphite glob.
+
+    :return: (metric name, path) sorted by name
+    """
+    found = {}
+    for pattern in expand(query):
+        for name, path in _find(root, pattern.split('.'), []):
+            found[name] = path
+    return sorted(found.items())
+
+
+def _find(root, segments, prefix):
+    segment, last = segments[0], len(segments) == 1
+    if is_literal(segment):
+        names = [segment]
+    else:
+        try:
+            names = sorted(os.listdir(root))
+        except OSError:
+            return
+        if last:
+            names = [name[:-len(EXTENSION)] for name in names if name.endswith(EXTENSION)]
+        regexp = compile_pattern(segment)
+        names = [name for name in names if regexp.match(name)]
+
+    for name in names:
+        path = os.path.join(root, name)
+        if last:
+            if os.path.isfile(path + EXTENSION):
+                yield '.'.join(prefix + [name]), path + EXTENSION
+        elif os.path.isdir(path):
+            for found in _find(path, segments[1:], prefix + [name]):
+                yield found
+
+
+class WhisperSeries(Aggregates):
+
+    """Values of a metric read from a Whisper file."""
+
+    def __init__(self, target, start_time, end_time, step, values,
+                 default_nan_value=None, ignore_nan=False):
+        self.target = target
+        self.start_time = start_time
+        self.end_time = end_time
+        self.step = step
+        self.values = [
+            value for value in values if value is not None and not (
+                ignore_nan and value == default_nan_value)]
+        self.empty = len(self.values) == 0
@@ -37,8 +37,8 @@ setup(
         'Natural Language :: English',
         'Natural Language :: Russian',
         'Operating System :: OS Independent',
-        'Programming Language :: Python :: 2',
         'Programming Language :: Python :: 3',
+        'Programming Language :: Python :: 3 :: Only',
         'Programming Language :: Python',
         'Topic :: Software Development :: Libraries :: Python Modules',
         'Topic :: Software Development :: Testing',
@@ -46,6 +46,7 @@ setup(
     ],
 
     packages=['graphite_beacon'],
+    python_requires='>=3.5',
     include_package_data=True,
     install_requires=install_requires,
     entry_points={'console_scripts': ['graphite-beacon = graphite_beacon.app:run']},
@@ -1,17 +1,18 @@
+from io import BytesIO
+
 import mock
 import tornado.gen
 from mock import ANY
 from tornado import ioloop
-from tornado.httpclient import HTTPRequest, HTTPResponse
+from tornado.httpclient import HTTPResponse
 from tornado.testing import AsyncTestCase, gen_test
 
 from graphite_beacon.alerts import GraphiteAlert
 from graphite_beacon.core import Reactor
-from graphite_beacon._compat import StringIO
 
 from ..util import build_graphite_response
 
-fetch_mock_url = lambda m: m.call_args_list[0][0][0]
+fetch_mock_url = lambda m: m.call_args_list[0][0][0].url
 
 
 class TestGraphite(AsyncTestCase):
@@ -47,11 +48,12 @@ class TestGraphite(AsyncTestCase):
         assert isinstance(alert, GraphiteAlert)
 
         metric_data = [5, 7, 9]
-        build_resp = lambda: HTTPResponse(HTTPRequest('http://localhost:80/graphite'), 200,
-                                          buffer=StringIO(build_graphite_response(data=metric_data)))
 
-        mock_fetch.side_effect = iter(tornado.gen.maybe_future(build_resp())
-                                      for _ in range(10))
+        def build_resp(request):
+            request.streaming_callback(build_graphite_response(data=metric_data).encode('utf-8'))
+            return tornado.gen.maybe_future(HTTPResponse(request, 200, buffer=BytesIO()))
+
+        mock_fetch.side_effect = build_resp
 
         self.reactor.start(start_loop=False)
         yield tornado.gen.sleep(0.5)
@@ -1,3 +1,5 @@
+from io import StringIO
+
 import mock
 import tornado.gen
 from mock import ANY
@@ -7,11 +9,10 @@ from tornado.testing import AsyncTestCase, gen_test
 
 from graphite_beacon.alerts import URLAlert
 from graphite_beacon.core import Reactor
-from graphite_beacon._compat import StringIO
 
 from ..util import build_graphite_response
 
-fetch_mock_url = lambda m: m.call_args_list[0][0][0]
+fetch_mock_url = lambda m: m.call_args_list[0][0][0].url
 
 
 class TestGraphite(AsyncTestCase):
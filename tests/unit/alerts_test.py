@@ -1,11 +1,19 @@
+import random
+from urllib import parse as urlparse
+
 import mock
+import pytest
+from tornado import gen, httpserver, ioloop, web
+from tornado.testing import bind_unused_port
 
-from graphite_beacon import units
-from graphite_beacon._compat import urlparse
+from graphite_beacon import evaluation, units
 from graphite_beacon.alerts import BaseAlert, GraphiteAlert, URLAlert
 from graphite_beacon.core import Reactor
+from graphite_beacon.graphite import GraphiteRecord
 from graphite_beacon.units import SECOND
 
+from ..util import build_graphite_response
+
 BASIC_ALERT_OPTS = {
     'name': 'GraphiteTest',
     'query': '*',
@@ -158,7 +166,12 @@ def test_multimetrics(reactor):
     assert list(alert.history['metric1']) == [60, 60, 60, 70]
     assert alert.state['metric1'] == 'warning'
 
+    # The failed targets are reset when their repeat deadlines have passed
     reactor.repeat()
+    assert alert.state['metric1'] == 'warning'
+    with mock.patch.object(
+            reactor.loop, 'time', return_value=reactor.loop.time() + alert.repeat_interval):
+        reactor.repeat()
 
     assert alert.state == {
         None: 'normal', 'metric1': 'normal', 'metric2': 'normal', 'metric3': 'normal',
@@ -182,3 +195,364 @@ def test_multiexpressions(reactor):
         assert reactor.notify.call_args_list[0][1]['target'] == 'metric1'
 
     assert list(alert.history['metric1']) == [85, 65, 68, 75]
+
+
+def test_vanished_targets(reactor):
+    alert = BaseAlert.get(
+        reactor, name="Test", query="*", rules=["critical: > 100"], target_ttl=2)
+    reactor.alerts = set([alert])
+
+    with mock.patch.object(reactor, 'notify'):
+        alert.check([(110, 'metric1'), (10, 'metric2')])
+        alert.check([(10, 'metric2')])
+        assert 'metric1' in alert.state
+
+        alert.check([(None, 'metric2')])
+        assert 'metric1' not in alert.state
+        assert 'metric2' in alert.state
+        assert alert.store.evicted == 1
+
+        # metric1 - back to normal as it has vanished
+        assert reactor.notify.call_args[0][0] == 'normal'
+        assert reactor.notify.call_args[0][2] == 'Target vanished'
+        assert reactor.notify.call_args[1]['target'] == 'metric1'
+
+    assert set(alert.state) == set([None, 'waiting', 'loading', 'metric2'])
+
+
+def test_repeat_interval(reactor):
+    alert = BaseAlert.get(
+        reactor, name='Test', query='*', rules=['critical: > 100'], repeat_interval='1minute')
+    now = [0]
+
+    def notified(values, time):
+        now[0] = time
+        with mock.patch.object(reactor, 'notify'):
+            alert.check([(value, target) for target, value in values])
+            return [call[1]['target'] for call in reactor.notify.call_args_list]
+
+    with mock.patch.object(reactor.loop, 'time', side_effect=lambda: now[0]):
+        assert notified([('a', 200)], 0) == ['a']
+        assert notified([('a', 200), ('b', 200)], 30) == ['b']
+        assert notified([('a', 200), ('b', 200)], 59) == []
+
+        # Each target is notified again a minute after its own last notification
+        assert notified([('a', 200), ('b', 200)], 60) == ['a']
+        assert notified([('a', 200), ('b', 200)], 90) == ['b']
+
+        # Recovered targets are not notified again
+        assert notified([('a', 50), ('b', 200)], 100) == ['a']
+        assert notified([('a', 50), ('b', 200)], 120) == []
+        assert notified([('a', 50), ('b', 200)], 150) == ['b']
+    assert alert.repeat_at == {'b': 210}
+
+
+def test_expired_repeats(reactor):
+    alert = BaseAlert.get(
+        reactor, name='Test', query='*', rules=['critical: > 100'], repeat_interval='1minute',
+        target_ttl=1, vanished='critical')
+    now = [0]
+
+    with mock.patch.object(reactor, 'notify'), \
+            mock.patch.object(reactor.loop, 'time', side_effect=lambda: now[0]):
+        alert.check([(200, 'target%d' % num) for num in range(50)])
+        assert len(alert.repeats) == 50
+
+        # The deadlines of the expired targets are dropped
+        now[0] = 30
+        alert.check([(200, 'other')])
+        assert list(alert.repeat_at) == ['other']
+        assert len(alert.repeats) <= 2 * len(alert.repeat_at) + 16
+        assert alert.repeated == {}
+
+
+def test_incremental(reactor):
+    alert = BaseAlert.get(
+        reactor, name='Test', query='*', rules=['critical: > 100'], method='sum',
+        time_window='30second', incremental=True)
+    assert '&from=-30s&' in alert.url
+    assert '&from=100&' in alert._graphite_url('*', since=100)
+
+    records = [
+        build_graphite_response('a', 120, 150, 10, [1, 2, 'None']),
+        build_graphite_response('b', 120, 150, 10, ['None', 'None', 'None'])]
+    data = alert.merge(GraphiteRecord(line) for line in records)
+    assert data == [(3, 'a'), (None, 'b')]
+    assert alert.fetched_until == 110
+
+    records = [
+        build_graphite_response('a', 120, 160, 10, [2, 3, 4, 5]),
+        build_graphite_response('b', 120, 160, 10, ['None', 'None', 'None', 7])]
+    data = alert.merge(GraphiteRecord(line) for line in records)
+    # Known points are merged once, the point at 120 is out of the window
+    assert data == [(11, 'a'), (7, 'b')]
+    assert list(alert.windows['a'].timestamps) == [130, 140, 150]
+    assert alert.fetched_until == 150
+
+
+def test_url_alert_value(reactor):
+    alert = BaseAlert.get(
+        reactor, name='Test', source='url', query='http://localhost/check', value='ttfb',
+        rules=['warning: > 500ms'])
+    assert alert.host == 'localhost'
+
+    async def fetch(request):
+        assert request.url == 'http://localhost/check'
+        request.header_callback('HTTP/1.1 200 OK\r\n')
+        await gen.sleep(0.01)
+        request.streaming_callback(b'body')
+        return mock.Mock(code=200, request_time=0.01)
+
+    with mock.patch.object(alert.client, 'fetch', side_effect=fetch):
+        with mock.patch.object(alert, 'check') as check:
+            ioloop.IOLoop.current().run_sync(alert.load)
+            value, target = check.call_args[0][0][0]
+            assert target == 'http://localhost/check'
+            assert value < 0.01
+
+            alert.value = 'total'
+            ioloop.IOLoop.current().run_sync(alert.load)
+            value, target = check.call_args[0][0][0]
+            assert value >= 0.01
+
+
+def test_graph_urls(reactor):
+    alert = BaseAlert.get(reactor, name='Test', query='*', rules=['critical: > 1'])
+    assert alert.request.url == alert.url
+    assert alert.request.request_timeout == reactor.options['request_timeout']
+
+    url = alert.get_graph_url('metric')
+    assert 'target=metric' in url
+    assert alert.get_graph_url('metric') is url
+
+
+def test_compressed_response(reactor):
+    body = '\n'.join(
+        build_graphite_response('metric%d' % num, data=[num] * 100) for num in range(100))
+    encodings = []
+
+    class RenderHandler(web.RequestHandler):
+        def get(self):
+            encodings.append(self.request.headers.get('Accept-Encoding'))
+            self.write(body)
+
+    sock, port = bind_unused_port()
+    server = httpserver.HTTPServer(
+        web.Application([(r'/render/', RenderHandler)], compress_response=True))
+    server.add_sockets([sock])
+
+    reactor.options['graphite_url'] = 'http://127.0.0.1:%d' % port
+    alert = BaseAlert.get(reactor, name='Test', query='*', rules=['critical: > 1000'])
+    try:
+        with mock.patch.object(alert, 'check') as check:
+            ioloop.IOLoop.current().run_sync(alert.load)
+    finally:
+        server.stop()
+
+    assert encodings == ['gzip']
+    data = check.call_args[0][0]
+    assert len(data) == 100
+    assert data[99] == (99.0, 'metric99')
+
+
+def test_oversized_response(reactor):
+    body = '\n'.join(
+        build_graphite_response('metric%d' % num, data=[num] * 100) for num in range(100))
+
+    class RenderHandler(web.RequestHandler):
+        def get(self):
+            self.write(body)
+
+    sock, port = bind_unused_port()
+    server = httpserver.HTTPServer(web.Application([(r'/render/', RenderHandler)]))
+    server.add_sockets([sock])
+
+    reactor.options['graphite_url'] = 'http://127.0.0.1:%d' % port
+    alert = BaseAlert.get(
+        reactor, name='Test', query='*', rules=['critical: > 1000'], compression=False,
+        max_response_bytes=1000)
+    try:
+        with mock.patch.object(alert, 'notify') as notify, mock.patch.object(alert, 'check'):
+            # Rejected by Content-Length
+            ioloop.IOLoop.current().run_sync(alert.load)
+            assert notify.call_args == mock.call(
+                'critical', 'Response is larger than 1000 bytes', target='oversized',
+                ntype='common')
+            assert not alert.check.called
+
+            # Rejected while streaming
+            alert.max_response_bytes = None
+            alert.max_series = 10
+            ioloop.IOLoop.current().run_sync(alert.load)
+            assert notify.call_args == mock.call(
+                'critical', 'Response has more than 10 series', target='oversized',
+                ntype='common')
+            assert not alert.check.called
+
+            alert.state['oversized'] = 'critical'
+            alert.max_series = 100
+            ioloop.IOLoop.current().run_sync(alert.load)
+            assert alert.check.called
+            assert mock.call(
+                'normal', 'Response size is OK', target='oversized',
+                ntype='common') in notify.call_args_list
+    finally:
+        server.stop()
+
+
+def test_top(reactor):
+    alert = BaseAlert.get(
+        reactor, name='Test', query='containers.*.cpu', method='maximum', top=2,
+        rules=['critical: > 90', 'warning: >= 75 AND > 70', 'normal: == 0'])
+    assert alert.top_direction() == 'highest'
+    assert 'target=highestMax%28containers.%2A.cpu%2C2%29' in alert.top_request.url
+
+    lowest = BaseAlert.get(reactor, name='Test', query='*', top=2, rules=['critical: < 1'])
+    assert 'lowestAverage' in lowest.top_request.url
+
+    for rules in (['critical: > 90', 'warning: < 10'], ['critical: == 1'],
+                  ['critical: > historical']):
+        with pytest.raises(ValueError):
+            BaseAlert.get(reactor, name='Test', query='*', top=2, rules=rules)
+
+    with pytest.raises(ValueError) as error:
+        BaseAlert.get(reactor, name='Test', query='*', top=2, incremental=True,
+                      rules=['critical: > 1'])
+    assert 'top is not supported by incremental alerts' in str(error.value)
+
+    responses = {
+        alert.url: [('a', 95), ('b', 80), ('c', 10)],
+        alert.top_request.url: [('b', 50), ('a', 95)],
+    }
+
+    async def fetch(request):
+        for target, value in responses[request.url]:
+            request.streaming_callback(
+                (build_graphite_response(target, data=[value]) + '\n').encode('utf-8'))
+
+    loop = ioloop.IOLoop.current()
+    with mock.patch.object(alert.client, 'fetch', fetch), \
+            mock.patch.object(alert, 'expire') as expire:
+        # The first load is a full sweep
+        loop.run_sync(alert.load)
+        assert expire.call_count == 1
+        assert alert.state['a'] == 'critical'
+        assert alert.state['b'] == 'warning'
+
+        loop.run_sync(alert.load)
+        assert expire.call_count == 1
+        assert alert.state['b'] == 'normal'
+
+        alert.swept_at -= alert.top_sweep
+        responses[alert.url] = [('a', 10), ('b', 10), ('c', 10)]
+        loop.run_sync(alert.load)
+        assert expire.call_count == 2
+        assert alert.state['a'] == 'normal'
+
+
+def test_group_rules(reactor):
+    alert = BaseAlert.get(
+        reactor, name='Test', query='*', rules=['critical: > 90'],
+        group_rules=['critical: percent > 10 where > 90', 'warning: avg > 50'])
+    assert alert.priority == 0
+
+    with mock.patch.object(reactor, 'notify') as notify:
+        alert.check([(95, 'a'), (10, 'b'), (20, 'c')])
+        assert [(call[0][0], call[1]['target']) for call in notify.call_args_list] == [
+            ('critical', 'a'), ('critical', 'group')]
+        assert notify.call_args[0][2] == 100.0 / 3
+        assert notify.call_args[1]['rule']['raw'] == 'critical: percent > 10 where > 90'
+
+        notify.reset_mock()
+        alert.check([(60, 'a'), (60, 'b'), (60, 'c')])
+        assert [(call[0][0], call[1]['target']) for call in notify.call_args_list] == [
+            ('normal', 'a'), ('warning', 'group')]
+
+        notify.reset_mock()
+        # A part of the targets is not aggregated
+        alert.check([(10, 'a'), (10, 'b')], complete=False)
+        assert alert.state['group'] == 'warning'
+        assert not notify.called
+
+
+def test_group_only(reactor):
+    alert = BaseAlert.get(
+        reactor, name='Test', query='*', rules=['critical: > 90'], group_only=True,
+        group_rules=['critical: count > 1 where > 90'])
+    with mock.patch.object(reactor, 'notify') as notify:
+        alert.check([(95, 'a'), (10, 'b'), (20, 'c')])
+        assert not notify.called
+        assert alert.state['a'] == 'critical'
+
+        alert.check([(95, 'a'), (95, 'b'), (20, 'c')])
+        assert notify.call_count == 1
+        assert notify.call_args[0][:3] == ('critical', alert, 2)
+        assert notify.call_args[1]['target'] == 'group'
+
+        # Targets without data and vanished targets are not notified either
+        notify.reset_mock()
+        alert.target_ttl = 1
+        alert.check([(None, 'a'), (None, 'b'), (95, 'c')])
+        assert alert.state['a'] == 'critical'
+        alert.check([(95, 'c')])
+        assert 'a' not in alert.state
+        assert [call[1]['target'] for call in notify.call_args_list] == ['group']
+
+    group = BaseAlert.get(
+        reactor, name='Test', query='*', group_rules=['warning: max > 1'])
+    assert group.priority == 10
+    with mock.patch.object(reactor, 'notify') as notify:
+        group.check([(2, 'a'), (0, 'b')])
+        assert notify.call_count == 1
+        assert notify.call_args[1]['target'] == 'group'
+
+    with pytest.raises(ValueError):
+        BaseAlert.get(reactor, name='Test', query='*', source='carbon',
+                      group_rules=['warning: max > 1'])
+
+
+def test_notify_changed_levels(reactor):
+    alert = BaseAlert.get(reactor, name='Test', query='*', rules=['critical: > 90'])
+    records = [(num, 'metric%d' % num) for num in range(100)]
+
+    with mock.patch.object(alert, 'notify', wraps=alert.notify) as notify, \
+            mock.patch.object(reactor, 'notify'):
+        alert.check(records)
+        assert notify.call_count == 100
+        assert reactor.notify.call_count == 9
+
+        notify.reset_mock()
+        alert.check(records)
+        assert notify.call_count == 0
+
+        alert.check([(95, 'metric0')])
+        assert notify.call_count == 1
+        assert reactor.notify.call_count == 10
+
+
+@pytest.mark.parametrize('rules', [
+    ['critical: > 90', 'warning: > 50'],
+    ['critical: > historical * 1.5 AND > 50', 'warning: < 10 OR == 42'],
+    ['warning: > zscore 2', 'critical: > ewma * 2', 'normal: != historical'],
+])
+def test_batch_engines(reactor, monkeypatch, rules):
+    numpy = pytest.importorskip('numpy')
+    monkeypatch.setattr(evaluation, 'NUMPY_THRESHOLD', 0)
+
+    def check(np):
+        monkeypatch.setattr(evaluation, 'np', np)
+        alert = BaseAlert.get(
+            reactor, name='Test', query='*', rules=rules, interval='1minute',
+            history_size='3minute')
+        rand = random.Random(42)
+        notified = []
+        for _ in range(6):
+            with mock.patch.object(reactor, 'notify'):
+                alert.check([(rand.choice([5, 42, 60, 95, rand.random() * 100]), 't%d' % num)
+                             for num in range(100)])
+                notified.append([
+                    (call[0][0], call[1]['target']) for call in reactor.notify.call_args_list])
+        return notified, dict(alert.state)
+
+    # The pure Python fallback and NumPy give the same levels
+    assert check(None) == check(numpy)
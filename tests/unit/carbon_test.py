@@ -0,0 +1,93 @@
+import os
+import pickle
+
+import mock
+import pytest
+from tornado import ioloop
+from tornado.iostream import StreamClosedError
+from tornado.tcpclient import TCPClient
+from tornado.testing import bind_unused_port
+
+from graphite_beacon.alerts import BaseAlert, CarbonAlert
+from graphite_beacon.carbon import MAX_DATAGRAM, CarbonServer, parse_line, parse_pickle
+
+
+def test_parse_line():
+    assert parse_line(b'servers.web1.cpu 12.5 1500000000\n') == (
+        'servers.web1.cpu', 12.5, 1500000000)
+
+    with pytest.raises(ValueError):
+        parse_line(b'servers.web1.cpu 12.5')
+
+
+def test_parse_pickle():
+    data = pickle.dumps([('servers.web1.cpu', (1500000000, 12.5))], protocol=2)
+    assert parse_pickle(data) == [('servers.web1.cpu', 12.5, 1500000000)]
+
+    # Globals are not allowed
+    data = pickle.dumps([(os.system, ('echo', 1))], protocol=2)
+    with pytest.raises(pickle.UnpicklingError):
+        parse_pickle(data)
+
+
+def test_carbon_alert(reactor):
+    alert = BaseAlert.get(
+        reactor, name='Carbon', source='carbon', query='servers.*.cpu', method='maximum',
+        time_window='10second', rules=['critical: > 90', 'warning: > 50'])
+    assert isinstance(alert, CarbonAlert)
+
+    with mock.patch.object(reactor.carbon, 'listen'):
+        alert.start()
+        assert reactor.carbon.match('servers.web1.cpu') == set([alert])
+        assert reactor.carbon.match('servers.web1.memory') == set()
+
+    with mock.patch.object(reactor, 'notify'):
+        reactor.carbon.receive([
+            ('servers.web1.cpu', 60, 100), ('servers.web1.memory', 100, 100)])
+        assert reactor.notify.call_count == 1
+        assert reactor.notify.call_args[0][:3] == ('warning', alert, 60)
+        assert reactor.notify.call_args[1]['target'] == 'servers.web1.cpu'
+
+        # The maximum of the window is checked
+        reactor.carbon.receive([('servers.web1.cpu', 10, 105)])
+        assert reactor.notify.call_count == 1
+
+        # The first point is out of the window
+        reactor.carbon.receive([('servers.web1.cpu', 20, 110)])
+        assert reactor.notify.call_args[0][:3] == ('normal', alert, 20)
+
+    with mock.patch.object(reactor.carbon, 'close'):
+        alert.stop()
+        assert len(reactor.carbon.alerts) == 0
+
+
+def test_datagram_errors(reactor):
+    receiver = reactor.carbon
+    receiver.udp = mock.Mock()
+    receiver.udp.recv.side_effect = [b'servers.web1.cpu 1 100\n', ConnectionRefusedError]
+    try:
+        with mock.patch.object(receiver, 'receive') as receive:
+            receiver.handle_datagrams(None, None)
+        receive.assert_called_once_with([('servers.web1.cpu', 1.0, 100.0)])
+    finally:
+        receiver.udp = None
+
+
+def test_long_line(reactor):
+    sock, port = bind_unused_port()
+    server = CarbonServer(reactor.carbon)
+    server.add_sockets([sock])
+
+    async def send():
+        stream = await TCPClient().connect('127.0.0.1', port)
+        await stream.write(b'a' * (MAX_DATAGRAM + 1))
+        # The server closes the connection instead of buffering the line
+        with pytest.raises(StreamClosedError):
+            await stream.read_bytes(1)
+
+    try:
+        with mock.patch.object(reactor.carbon, 'receive') as receive:
+            ioloop.IOLoop.current().run_sync(send, timeout=5)
+        assert not receive.called
+    finally:
+        server.stop()
@@ -29,3 +29,12 @@ def test_public_graphite_url():
 def test_invalid_handler(reactor):
     reactor.reinit(critical_handlers=['log', 'unknown'])
     assert len(reactor.handlers['critical']) == 1
+
+
+def test_reserved_clients():
+    from tornado.httpclient import AsyncHTTPClient
+
+    rr = Reactor(max_clients=4, reserved_clients=2)
+    assert rr.fetches.limit == 4
+    # pylint: disable=protected-access
+    assert AsyncHTTPClient._save_configuration()[1]['max_clients'] == 6
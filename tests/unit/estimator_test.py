@@ -0,0 +1,55 @@
+import json
+
+import mock
+from tornado import ioloop
+
+from graphite_beacon.alerts import BaseAlert
+from graphite_beacon.estimator import CostEstimator, query_paths
+
+
+def test_query_paths():
+    assert query_paths('servers.*.cpu') == ['servers.*.cpu']
+    assert query_paths('sumSeries(servers.{web1,web2}.cpu)') == ['servers.{web1,web2}.cpu']
+    assert query_paths(
+        'alias(scale(asPercent(a.*.used, a.*.total), 0.5), "a, b (c)")') == [
+            'a.*.used', 'a.*.total']
+    assert query_paths('removeBelowValue(a.b, -1)') == ['a.b']
+    assert query_paths('legendValue(a.b, true)') == ['a.b']
+
+
+def test_estimator(reactor):
+    nodes = {
+        'a.*.used': [{'id': 'a.%d.used' % num, 'leaf': 1} for num in range(30)],
+        'a.*.total': [{'id': 'a.%d.total' % num, 'leaf': 1} for num in range(30)] + [
+            {'id': 'a.dir.total', 'leaf': 0}],
+        'b.c': [{'id': 'b.c', 'leaf': 1}],
+    }
+    requested = []
+
+    async def fetch(request):
+        query = request.url.split('query=')[1].replace('%2A', '*')
+        requested.append(query)
+        return mock.Mock(body=json.dumps(nodes[query]).encode('utf-8'))
+
+    big = BaseAlert.get(
+        reactor, name='Big', query='asPercent(a.*.used, a.*.total)', rules=['critical: > 1'],
+        max_series=50)
+    small = BaseAlert.get(reactor, name='Small', query='b.c', rules=['critical: > 1'],
+                          max_series=50)
+    url = BaseAlert.get(reactor, name='URL', query='http://localhost', source='url',
+                        rules=['critical: != 200'])
+    estimator = CostEstimator(reactor)
+    with mock.patch.object(big.client, 'fetch', fetch), \
+            mock.patch.object(big, 'notify') as big_notify, \
+            mock.patch.object(small, 'notify') as small_notify:
+        ioloop.IOLoop.current().run_sync(lambda: estimator.check([big, small, url]))
+        assert big.estimated_series == 60
+        assert small.estimated_series == 1
+        assert big_notify.call_args == mock.call(
+            'critical', 'Query matches about 60 series (max_series is 50)', target='oversized',
+            ntype='common')
+        assert not small_notify.called
+
+        # The counts are cached
+        ioloop.IOLoop.current().run_sync(lambda: estimator.check([big, small]))
+    assert sorted(requested) == ['a.*.total', 'a.*.used', 'b.c']
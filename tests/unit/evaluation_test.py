@@ -0,0 +1,91 @@
+import random
+
+import pytest
+
+from graphite_beacon import evaluation
+from graphite_beacon.evaluation import GroupRules, evaluate_rules
+from graphite_beacon.utils import parse_group_rule, parse_rule
+
+RULES = [parse_rule(rule) for rule in (
+    "critical: > 90",
+    "warning: > historical * 1.5 AND > 50",
+    "warning: < 10 OR == 42",
+    "warning: > zscore 3 OR < p5 * 0.5",
+    "normal: != historical",
+)]
+
+
+def _expected(values, baselines):
+    result = []
+    for pos, value in enumerate(values):
+        for idx, rule in enumerate(RULES):
+            evaluated = []
+            for expr in rule['exprs']:
+                if callable(expr):
+                    evaluated.append(expr)
+                    continue
+                rvalue = expr['value']
+                if isinstance(rvalue, str):
+                    rvalue = baselines.get(rvalue, [None] * len(values))[pos]
+                lvalue = value
+                if 'stat' in expr:
+                    lvalue = baselines.get(expr['stat'], [None] * len(values))[pos]
+                evaluated.append(
+                    rvalue is not None and lvalue is not None and
+                    expr['op'](lvalue, expr['mod'](rvalue)))
+            while len(evaluated) > 1:
+                lhs, logical_op, rhs = (evaluated.pop(0) for _ in range(3))
+                evaluated.insert(0, logical_op(lhs, rhs))
+            if evaluated[0]:
+                result.append(idx)
+                break
+        else:
+            result.append(-1)
+    return result
+
+
+@pytest.fixture(params=['python', 'numpy'])
+def engine(request, monkeypatch):
+    if request.param == 'numpy':
+        pytest.importorskip('numpy')
+        monkeypatch.setattr(evaluation, 'NUMPY_THRESHOLD', 0)
+    else:
+        monkeypatch.setattr(evaluation, 'np', None)
+    return request.param
+
+
+def test_evaluate_rules(engine):
+    random.seed(42)
+    values = [random.choice([5, 42, 60, 95, random.random() * 100]) for _ in range(500)]
+    baselines = {
+        'historical': [random.choice([None, 30, 60, values[pos]]) for pos in range(500)],
+        'zscore': [random.choice([None, 0, 2.5, 4]) for _ in range(500)],
+        'p5': [random.choice([None, 20, 100]) for _ in range(500)],
+    }
+
+    assert evaluate_rules(RULES, values, baselines) == _expected(values, baselines)
+    assert evaluate_rules(RULES, values) == _expected(values, {})
+    assert evaluate_rules(RULES, []) == []
+
+
+def test_group_rules(engine):
+    rules = [parse_group_rule(rule) for rule in (
+        'critical: percent > 30 where > 90', 'critical: count >= 3 where > historical',
+        'warning: max > 80', 'warning: avg > 50 where < 10', 'normal: sum > 0',
+        'normal: min < 0')]
+    group = GroupRules(rules)
+    group.add([95, 50, 20])
+    group.add([40, 85], {'historical': [None, 60]})
+    assert group.total == 5
+    assert [group.value(pos) for pos in range(len(rules))] == [20.0, 1, 95, None, 290.0, 20]
+    assert group.evaluate() == (2, 95)
+
+    group.add([91, 92], {'historical': [1, 1]})
+    assert group.value(0) == 300.0 / 7
+    assert group.value(1) == 3
+    assert group.evaluate() == (0, 300.0 / 7)
+
+    group = GroupRules(rules[2:4])
+    group.add([10, 20])
+    assert group.evaluate() == (-1, None)
+    assert GroupRules(rules).evaluate() == (-1, None)
@@ -1,6 +1,11 @@
 import pytest
 
-from graphite_beacon.graphite import GraphiteRecord
+import random
+import statistics
+
+from graphite_beacon import graphite
+from graphite_beacon.graphite import (GraphiteRecord, RawParser, ResponseTooLarge, RollingWindow,
+                                      select)
 
 from ..util import build_graphite_response
 
@@ -22,6 +27,25 @@ class TestGraphiteRecord(object):
     def test_record(self):
         assert build_record([1, 2, 3]).values == [1.0, 2.0, 3.0]
 
+    def test_record_bytes(self):
+        record = GraphiteRecord(build_graphite_response(data=[1, 2]).encode('utf-8'))
+        assert record.values == [1.0, 2.0]
+
+    def test_points(self):
+        record = GraphiteRecord(build_graphite_response(
+            start_timestamp=100, series_step=10, data=[1, 'None', 3]))
+        assert list(record.points) == [(100, 1.0), (120, 3.0)]
+
+        record = GraphiteRecord(build_graphite_response(
+            start_timestamp=100, series_step=10, data=[0, 2, 3]), 0, ignore_nan=True)
+        assert list(record.points) == [(110, 2.0), (120, 3.0)]
+        assert record.positions is not None
+
+        record = GraphiteRecord(build_graphite_response(
+            start_timestamp=100, series_step=10, data=[1, 2]))
+        assert list(record.points) == [(100, 1.0), (110, 2.0)]
+        assert record.positions is None
+
     def test_average(self):
         assert build_record([1]).average == 1.0
         assert build_record([1, 2, 3]).average == 2.0
@@ -43,3 +67,111 @@ class TestGraphiteRecord(object):
     def test_maximum(self):
         assert build_record([1]).maximum == 1.0
         assert build_record([9.0, 2.3, 4]).maximum == 9.0
+
+    def test_percentiles(self):
+        assert build_record([3]).median == 3.0
+        assert build_record([9.0, 2.3, 4]).median == 4.0
+        assert build_record([4, 1, 3, 2]).median == 2.5
+
+        record = build_record(list(range(100, 0, -1)))
+        assert record.p90 == 90.0
+        assert record.p95 == 95.0
+        assert record.p99 == 99.0
+        assert record.percentile(99.9) == 100.0
+        assert record.median == 50.5
+
+
+@pytest.mark.parametrize('threshold', [graphite.NUMPY_THRESHOLD, 10 ** 6])
+def test_select(monkeypatch, threshold):
+    monkeypatch.setattr(graphite, 'NUMPY_THRESHOLD', threshold)
+    rnd = random.Random(1)
+    for size in (1, 2, 5, 100, 1000):
+        values = [rnd.randint(0, size // 2) for _ in range(size)]
+        ranks = set(rnd.randrange(size) for _ in range(3))
+        ordered = sorted(values)
+        assert select(values, ranks) == dict((rank, ordered[rank]) for rank in ranks)
+
+
+def test_rolling_window():
+    window = RollingWindow(10)
+    assert not window
+
+    rnd = random.Random(1)
+    for timestamp in range(100):
+        window.push(timestamp, rnd.randint(-50, 50))
+        values = list(window.values)
+        assert len(values) == min(timestamp + 1, 10)
+        assert window.sum == sum(values)
+        assert window.minimum == min(values)
+        assert window.maximum == max(values)
+        assert window.last_value == values[-1]
+        assert window.median == statistics.median(values)
+
+    window.trim(105)
+    assert list(window.timestamps) == [96, 97, 98, 99]
+    window.trim(120)
+    assert not window
+    assert window.sum == 0
+
+
+def test_raw_parser():
+    body = '\n'.join([
+        build_graphite_response('a', data=[1, 2]),
+        build_graphite_response('b', data=[3, 'None'])]).encode('utf-8')
+
+    parser = RawParser()
+    for pos in range(0, len(body), 7):
+        parser.feed(body[pos:pos + 7])
+    records = parser.close()
+    assert [(record.target, record.values) for record in records] == [
+        ('a', [1.0, 2.0]), ('b', [3.0])]
+
+    parser = RawParser()
+    parser.feed(b'invalid\n' + body)
+    with pytest.raises(ValueError):
+        parser.close()
+
+
+def test_raw_parser_limits():
+    body = '\n'.join(
+        build_graphite_response('m%d' % num, data=[num]) for num in range(10)).encode('utf-8')
+
+    parser = RawParser(max_series=10)
+    parser.feed(body)
+    assert len(parser.close()) == 10
+
+    parser = RawParser(max_series=5)
+    with pytest.raises(ResponseTooLarge):
+        for pos in range(0, len(body), 16):
+            parser.feed(body[pos:pos + 16])
+    assert parser.records == []
+    assert parser.received < len(body)
+    with pytest.raises(ResponseTooLarge):
+        parser.close()
+
+    parser = RawParser(max_bytes=100)
+    parser.check_size(100)
+    with pytest.raises(ResponseTooLarge):
+        parser.check_size(101)
+    assert isinstance(parser.oversized, ResponseTooLarge)
+
+    parser = RawParser(max_bytes=100)
+    parser.feed(body[:60])
+    with pytest.raises(ResponseTooLarge):
+        parser.feed(body[60:120])
+
+
+@pytest.mark.parametrize('direction, method, query', [
+    ('highest', 'average', 'highestAverage(a.*,5)'),
+    ('highest', 'maximum', 'highestMax(a.*,5)'),
+    ('lowest', 'last_value', 'lowestCurrent(a.*,5)'),
+    ('highest', 'sum', "highest(a.*,5,'sum')"),
+    ('lowest', 'maximum', "lowest(a.*,5,'max')"),
+])
+def test_top_query(direction, method, query):
+    assert graphite.top_query('a.*', direction, method, 5) == query
+
+
+def test_top_query_invalid():
+    with pytest.raises(ValueError):
+        graphite.top_query('a.*', 'highest', 'p99', 5)
@@ -0,0 +1,94 @@
+import json
+import os
+import time
+
+import pytest
+from tornado import gen, ioloop
+
+from graphite_beacon.alerts import BaseAlert
+from graphite_beacon.handlers.cli import CliHandler
+
+
+@pytest.fixture
+def alert(reactor):
+    return BaseAlert.get(reactor, name='Test', query='*', rules=['critical: > 1'])
+
+
+def test_run(reactor, alert, tmpdir):
+    output = tmpdir.join('output')
+    reactor.options['cli'] = {'command': 'echo ${level} ${value} >> %s' % output}
+    handler = CliHandler(reactor)
+
+    ioloop.IOLoop.current().run_sync(lambda: handler.notify('critical', alert, 2, target='a'))
+    assert output.read() == 'critical 2\n'
+    assert handler.queued == 0
+
+
+def test_failures(reactor, alert):
+    reactor.options['cli'] = {'command': 'exit 3', 'timeout': 0.1}
+    handler = CliHandler(reactor)
+    run = ioloop.IOLoop.current().run_sync
+
+    with pytest.raises(RuntimeError) as e:
+        run(lambda: handler.notify('critical', alert, 2))
+    assert '(3)' in str(e.value)
+
+    with pytest.raises(RuntimeError) as e:
+        run(lambda: handler.run('sleep 5'))
+    assert 'timed out' in str(e.value)
+    assert handler.queued == 0
+
+
+def test_timeout_kills_children(reactor, tmpdir):
+    pidfile = tmpdir.join('pid')
+    reactor.options['cli'] = {'command': 'sleep 30 & echo $! > %s; wait' % pidfile,
+                              'timeout': 0.5}
+    handler = CliHandler(reactor)
+
+    with pytest.raises(RuntimeError):
+        ioloop.IOLoop.current().run_sync(lambda: handler.run(handler.command_template))
+
+    # The child is killed with the shell (it may stay a zombie until it is reaped)
+    stat = '/proc/%s/stat' % pidfile.read().strip()
+    deadline = time.time() + 2
+    while os.path.exists(stat) and time.time() < deadline:
+        with open(stat) as fstat:
+            if fstat.read().split(') ', 1)[1].startswith('Z'):
+                break
+        time.sleep(0.01)
+    else:
+        assert not os.path.exists(stat)
+
+
+def test_batch(reactor, alert, tmpdir):
+    output = tmpdir.join('output')
+    reactor.options['cli'] = {
+        'command': 'cat >> %s' % output, 'batch': True, 'batch_delay': 0.05,
+        'max_processes': 1}
+    handler = CliHandler(reactor)
+
+    async def notify():
+        await gen.multi([
+            handler.notify('critical', alert, 2, target='a', rule=alert.rules[0]),
+            handler.notify('normal', alert, 0, target='b')])
+
+    ioloop.IOLoop.current().run_sync(notify)
+    events = [json.loads(line) for line in output.readlines()]
+    assert [event['target'] for event in events] == ['a', 'b']
+    assert events[0]['rule'] == 'critical: > 1'
+    assert events[1]['level'] == 'normal'
+
+
+def test_batch_limit(reactor, alert):
+    reactor.options['cli'] = {
+        'command': 'cat > /dev/null', 'batch': True, 'batch_delay': 0.05, 'max_queue': 1}
+    handler = CliHandler(reactor)
+
+    async def notify():
+        await gen.multi([
+            handler.notify('critical', alert, 2, target='a'),
+            handler.notify('critical', alert, 2, target='b')])
+
+    with pytest.raises(RuntimeError) as e:
+        ioloop.IOLoop.current().run_sync(notify)
+    assert 'Too many events' in str(e.value)
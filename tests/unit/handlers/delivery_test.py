@@ -0,0 +1,87 @@
+import mock
+from tornado import ioloop
+
+from graphite_beacon.alerts import BaseAlert
+from graphite_beacon.delivery import CircuitBreaker, Spool
+from graphite_beacon.handlers.log import LogHandler
+
+
+def test_circuit_breaker():
+    breaker = CircuitBreaker(threshold=2, timeout=10)
+    assert breaker.allow(0)
+
+    breaker.failure(0)
+    assert breaker.allow(1)
+    breaker.failure(1)
+    assert breaker.is_open
+    assert not breaker.allow(5)
+
+    # A single trial call is let through after the timeout
+    assert breaker.allow(11)
+    assert not breaker.allow(11)
+    breaker.failure(11)
+    assert not breaker.allow(12)
+
+    breaker.success()
+    assert not breaker.is_open
+    assert breaker.allow(12)
+
+
+def test_spool(tmpdir):
+    spool = Spool(str(tmpdir.join('spool', 'log.jsonl')))
+    run = ioloop.IOLoop.current().run_sync
+    assert not spool.pending
+    assert run(spool.take) == []
+
+    run(lambda: spool.append({'alert': 'Test', 'value': 1}))
+    run(lambda: spool.append({'alert': 'Test', 'value': 2}))
+    assert spool.pending
+    assert run(spool.take) == [{'alert': 'Test', 'value': 1}, {'alert': 'Test', 'value': 2}]
+
+    # Taken records are kept until they are done
+    run(lambda: spool.append({'alert': 'Test', 'value': 3}))
+    assert run(spool.take) == [{'alert': 'Test', 'value': 1}, {'alert': 'Test', 'value': 2}]
+    run(spool.done)
+    assert spool.pending
+    assert run(spool.take) == [{'alert': 'Test', 'value': 3}]
+    run(spool.done)
+    assert not spool.pending
+
+
+def test_deliver(reactor, tmpdir):
+    reactor.options.update(retry_delay=0, breaker_threshold=3, spool=str(tmpdir))
+    alert = BaseAlert.get(reactor, name='Test', query='*', rules=['critical: > 1'])
+    reactor.alerts = set([alert])
+    handler = LogHandler(reactor)
+    run = ioloop.IOLoop.current().run_sync
+
+    # Delivered after a retry
+    with mock.patch.object(handler, 'notify', side_effect=[ValueError, None]) as notify:
+        assert run(lambda: handler.deliver('critical', alert, 2, target='a', rule=alert.rules[0]))
+        assert notify.call_count == 2
+
+    # Not delivered, the breaker is open and the notification is spooled
+    with mock.patch.object(handler, 'notify', side_effect=ValueError) as notify:
+        assert not run(lambda: handler.deliver('critical', alert, 3, target='b'))
+        assert notify.call_count == 3
+        assert handler.breaker.is_open
+        assert handler.spool.pending
+
+        assert not run(lambda: handler.deliver('critical', alert, 4, target='c'))
+        assert notify.call_count == 3
+
+    # Failures of a replay are spooled again
+    handler.breaker.success()
+    with mock.patch.object(handler, 'notify', side_effect=[None, ValueError, ValueError,
+                                                           ValueError]) as notify:
+        run(handler.replay)
+        assert notify.call_count == 4
+        assert handler.spool.pending
+
+    # Replay the spooled notifications
+    handler.breaker.success()
+    with mock.patch.object(handler, 'notify') as notify:
+        run(handler.replay)
+        assert [call[0][2] for call in notify.call_args_list] == [4]
+        assert notify.call_args[1]['target'] == 'c'
+        assert not handler.spool.pending
@@ -0,0 +1,38 @@
+import json
+
+import mock
+import pytest
+from tornado import ioloop
+
+from graphite_beacon.alerts import BaseAlert
+from graphite_beacon.handlers.hipchat import HipChatHandler
+from graphite_beacon.handlers.opsgenie import OpsgenieHandler
+from graphite_beacon.handlers.pagerduty import PagerdutyHandler
+from graphite_beacon.handlers.slack import SlackHandler
+from graphite_beacon.handlers.victorops import VictorOpsHandler
+
+
+@pytest.mark.parametrize('handler, options, field', [
+    (SlackHandler, {'webhook': 'http://slack'}, 'text'),
+    (HipChatHandler, {'room': 'room', 'key': 'key'}, 'message'),
+    (PagerdutyHandler, {'subdomain': 'beacon', 'apitoken': 'token', 'service_key': 'key'},
+     'description'),
+    (VictorOpsHandler, {'endpoint': 'http://victorops/'}, 'state_message'),
+    (OpsgenieHandler, {'api_key': 'key'}, 'message'),
+])
+def test_json_body(reactor, handler, options, field):
+    reactor.options[handler.name] = options
+    handler = handler(reactor)
+    alert = BaseAlert.get(reactor, name='Test', query='*', rules=['critical: > 5'])
+
+    async def fetch(*args, **kwargs):
+        requests.append(kwargs)
+
+    requests = []
+    with mock.patch.object(handler.client, 'fetch', fetch):
+        ioloop.IOLoop.current().run_sync(lambda: handler.notify(
+            'critical', alert, 8, target='node', ntype='graphite', rule=alert.rules[0]))
+
+    body = json.loads(requests[0]['body'])
+    assert isinstance(body[field], str)
+    assert 'Test' in body[field]
@@ -0,0 +1,79 @@
+import mock
+import pytest
+from tornado import gen, ioloop
+
+from graphite_beacon.alerts import BaseAlert
+from graphite_beacon.handlers.telegram import TelegramHandler, get_chatlist, write_to_file
+
+
+@pytest.fixture
+def handler(reactor):
+    reactor.options['telegram'] = {'token': 'token', 'bot_ident': 'ident', 'rate_limit': 100}
+    with mock.patch.object(TelegramHandler, '_listen_commands'):
+        return TelegramHandler(reactor)
+
+
+def test_notify(reactor, handler):
+    alert = BaseAlert.get(reactor, name='Test', query='*', rules=['critical: > 1'])
+    handler.chats = set([1, 2, 3])
+    sent = []
+
+    async def send_message(data):
+        sent.append((data['chat_id'], ioloop.IOLoop.current().time()))
+        await gen.sleep(0.01)
+        if data['chat_id'] == 2:
+            raise ValueError('Forbidden')
+
+    handler.client.send_message = send_message
+    notify = lambda: handler.notify('critical', alert, 2, target='a', ntype='graphite')
+    ioloop.IOLoop.current().run_sync(notify)
+
+    # Chats are notified concurrently within the rate limit
+    assert sorted(chat for chat, _ in sent) == [1, 2, 3]
+    times = sorted(time for _, time in sent)
+    assert times[-1] - times[0] < 0.05
+
+    # Telegram is unavailable
+    handler.chats = set([2])
+    with pytest.raises(ValueError):
+        ioloop.IOLoop.current().run_sync(notify)
+
+
+def test_chatfile(tmpdir):
+    chatfile = tmpdir.join('chats')
+    write_to_file([1, -2], str(chatfile))
+    assert get_chatlist(str(chatfile)) == set([1, -2])
+    assert tmpdir.listdir() == [chatfile]
+
+
+def test_reload_listener(reactor):
+    reactor.options['telegram'] = {'token': 'reload', 'bot_ident': 'ident'}
+    polls = {'active': 0, 'max': 0}
+
+    def poller(name):
+        async def get_updates(body, request_timeout=None):
+            polls['active'] += 1
+            polls['max'] = max(polls['max'], polls['active'])
+            polls[name] = polls.get(name, 0) + 1
+            await gen.sleep(0.02)
+            polls['active'] -= 1
+            return mock.Mock(body=b'')
+        return get_updates
+
+    async def run():
+        first = TelegramHandler(reactor)
+        first.client.get_updates = poller('first')
+        await gen.sleep(0.05)
+
+        # The config is reloaded
+        first.stop()
+        second = TelegramHandler(reactor)
+        second.client.get_updates = poller('second')
+        await gen.sleep(0.05)
+        second.stop()
+        await second.finished.wait()
+
+    ioloop.IOLoop.current().run_sync(run)
+    assert polls['max'] == 1
+    assert polls['first'] and polls['second']
+    TelegramHandler.listening.clear()
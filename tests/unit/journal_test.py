@@ -0,0 +1,110 @@
+import os
+
+import mock
+from tornado import ioloop
+
+from graphite_beacon.alerts import BaseAlert
+from graphite_beacon.core import Reactor
+from graphite_beacon.journal import Journal, Transition, decode, encode, main
+
+
+def test_encode():
+    data = encode(100.5, 'CPU', 'web1', None, 'critical', 95.5, 'critical: > 90')
+    assert decode(data) == (Transition(
+        100.5, 'CPU', 'web1', None, 'critical', 95.5, 'critical: > 90', None), len(data))
+
+    data = encode(100, 'CPU', None, 'normal', 'warning', 'Loading error')
+    assert decode(b'xx' + data, 2)[0] == Transition(
+        100, 'CPU', None, 'normal', 'warning', None, None, 'Loading error')
+
+
+def test_journal(tmpdir):
+    directory = str(tmpdir.join('journal'))
+    journal = Journal(directory, segment_size=120, max_segments=3)
+    run = ioloop.IOLoop.current().run_sync
+
+    for num in range(6):
+        journal.record('CPU', 'web1', 'normal', 'critical', num, timestamp=num)
+        journal.record('CPU', 'web2', 'normal', 'critical', num, timestamp=num)
+    journal.record('Disk', None, None, 'critical', 'No data', timestamp=3)
+
+    # Buffered records are served before they are written
+    assert [item.value for item in journal.history('CPU', 'web1', since=4)] == [4, 5]
+    assert os.listdir(directory) == []
+
+    run(journal.flush)
+    assert sorted(os.listdir(directory)) == [
+        '000000000002.journal', '000000000003.journal', '000000000004.journal']
+
+    # The oldest records are removed with their segments
+    assert [item.value for item in journal.history('CPU', 'web1')] == [3, 4, 5]
+    assert journal.history('Disk', None)[0].message == 'No data'
+    assert journal.targets('CPU') == [('CPU', 'web1'), ('CPU', 'web2')]
+    assert journal.flapping(since=2, min_transitions=3) == [
+        ('CPU', 'web1', 3), ('CPU', 'web2', 3)]
+    assert journal.flapping(since=4, min_transitions=3) == []
+    journal.stop()
+
+    # The index is rebuilt from the segments
+    journal = Journal(directory, segment_size=120, max_segments=3)
+    assert [item.value for item in journal.history('CPU', 'web2')] == [3, 4, 5]
+    assert journal.segments[-1] == 5
+    journal.stop()
+
+
+def test_journal_cli(tmpdir, capsys):
+    journal = Journal(str(tmpdir))
+    for level in ('critical', 'normal', 'critical', 'normal'):
+        journal.record('CPU', 'web1', None, level, 95)
+    journal.stop()
+
+    main([str(tmpdir), 'flapping', '--since', '1hour'])
+    assert capsys.readouterr().out == '4 CPU [web1]\n'
+
+    main([str(tmpdir), 'history', '--alert', 'CPU', '--target', 'web1'])
+    assert capsys.readouterr().out.count('critical') == 2
+
+
+def test_notify_transitions(tmpdir):
+    reactor = Reactor(journal=str(tmpdir))
+    alert = BaseAlert.get(reactor, name='Test', query='*', rules=['critical: > 90'])
+
+    with mock.patch.object(reactor, 'notify'):
+        alert.check([(95, 'web1'), (10, 'web2')])
+        alert.check([(95, 'web1'), (10, 'web2')])
+        alert.check([(50, 'web1')])
+
+    history = reactor.journal.history('Test', 'web1')
+    assert [(item.old_level, item.new_level, item.value) for item in history] == [
+        (None, 'critical', 95), ('critical', 'normal', 50)]
+    assert history[0].rule == 'critical: > 90'
+    assert reactor.journal.history('Test', 'web2') == []
+    reactor.journal.stop()
+
+
+def test_repeated_notifications(tmpdir):
+    reactor = Reactor(journal=str(tmpdir))
+    alert = BaseAlert.get(
+        reactor, name='Test', query='*', rules=['critical: > 90'], repeat_interval='1minute')
+    now = [0]
+
+    with mock.patch.object(reactor, 'notify'), \
+            mock.patch.object(reactor.loop, 'time', side_effect=lambda: now[0]):
+        for minute in range(10):
+            now[0] = minute * 60
+            alert.check([(95, 'web1'), (95, 'web2')])
+        assert reactor.notify.call_count == 20
+
+        now[0] = 570
+        alert.check([(50, 'web1')])
+        # A target recovers silently after its repeat deadline
+        now[0] = 600
+        alert.check([(50, 'web2')])
+        assert reactor.notify.call_count == 21
+
+    for target in ('web1', 'web2'):
+        assert [(item.old_level, item.new_level)
+                for item in reactor.journal.history('Test', target)] == [
+                    (None, 'critical'), ('critical', 'normal')]
+    assert reactor.journal.flapping(0, 3) == []
+    reactor.journal.stop()
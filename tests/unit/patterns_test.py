@@ -0,0 +1,49 @@
+from graphite_beacon.patterns import PatternIndex, compile_pattern, expand, is_literal
+
+
+def test_patterns():
+    assert is_literal('servers.web1.cpu')
+    assert not is_literal('servers.*.cpu')
+
+    pattern = compile_pattern('servers.*.cpu')
+    assert pattern.match('servers.web1.cpu')
+    assert not pattern.match('servers.web1.eu.cpu')
+    assert not pattern.match('servers.web1.cpu.user')
+
+    pattern = compile_pattern('servers.web[0-9].{cpu,memory}')
+    assert pattern.match('servers.web1.memory')
+    assert not pattern.match('servers.web10.memory')
+    assert not pattern.match('servers.web1.disk')
+
+    pattern = compile_pattern('servers.web[!1].cpu')
+    assert pattern.match('servers.web2.cpu')
+    assert not pattern.match('servers.web1.cpu')
+
+
+def test_expand():
+    assert expand('servers.web1.cpu') == ['servers.web1.cpu']
+    assert expand('a.{b,c}.{d,e{f,g}}') == [
+        'a.b.d', 'a.b.ef', 'a.b.eg', 'a.c.d', 'a.c.ef', 'a.c.eg']
+    assert expand('a.{b.c,d}') == ['a.b.c', 'a.d']
+
+
+def test_pattern_index():
+    index = PatternIndex()
+    index.add('servers.*.cpu.{user,system}', 'cpu')
+    index.add('servers.web[0-9].*.user', 'web')
+    index.add('servers.db1.cpu.user', 'db')
+    index.add('servers.*', 'servers')
+    assert len(index) == 4
+
+    assert index.match('servers.db1.cpu.user') == set(['cpu', 'db'])
+    assert index.match('servers.web2.cpu.user') == set(['cpu', 'web'])
+    assert index.match('servers.web2.cpu.idle') == set()
+    assert index.match('servers.web2') == set(['servers'])
+    assert index.match('servers') == set()
+
+    index.remove('cpu')
+    assert index.match('servers.db1.cpu.user') == set(['db'])
+    index.remove('db')
+    index.remove('web')
+    index.remove('servers')
+    assert not index.root
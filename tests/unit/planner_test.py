@@ -0,0 +1,76 @@
+from io import BytesIO
+from urllib import parse as urlparse
+
+import mock
+from tornado import ioloop
+
+from graphite_beacon.core import Reactor
+from graphite_beacon.planner import is_path, merge_paths
+
+from ..util import build_graphite_response
+
+
+def test_merge_paths():
+    assert is_path('servers.web1.cpu-0.user')
+    assert not is_path('servers.*.cpu')
+    assert not is_path('sumSeries(servers.web1.cpu)')
+
+    paths = ['a.web1.cpu', 'a.web2.cpu', 'a.web3.cpu', 'a.web1.memory', 'b.web1.cpu', 'c']
+    assert merge_paths(paths) == [
+        ('a.{web1,web2,web3}.cpu', ['a.web1.cpu', 'a.web2.cpu', 'a.web3.cpu']),
+        ('a.web1.memory', ['a.web1.memory']),
+        ('b.web1.cpu', ['b.web1.cpu']),
+        ('c', ['c'])]
+
+    assert merge_paths(paths[:3], limit=2) == [
+        ('a.{web1,web2}.cpu', ['a.web1.cpu', 'a.web2.cpu']),
+        ('a.web3.cpu', ['a.web3.cpu'])]
+
+    # An expression which expands to other paths falls back to the paths
+    assert merge_paths(['a.x,y.cpu', 'a.z.cpu']) == [
+        ('a.x,y.cpu', ['a.x,y.cpu']), ('a.z.cpu', ['a.z.cpu'])]
+
+
+def test_shared_fetch():
+    alerts = [
+        {'name': 'web1', 'query': 'servers.web1.cpu', 'rules': ['critical: > 50']},
+        {'name': 'web2', 'query': 'servers.web2.cpu', 'rules': ['critical: > 50']},
+        {'name': 'web3', 'query': 'servers.web3.cpu', 'rules': ['critical: > 50'],
+         'interval': '1minute'},
+        {'name': 'glob', 'query': 'servers.*.cpu', 'rules': ['critical: > 50']},
+        {'name': 'web4', 'query': 'servers.web4.cpu', 'rules': ['critical: > 50'],
+         'max_response_bytes': 1000},
+    ]
+    reactor = Reactor(alerts=alerts, merge_queries=True)
+    assert [shared.query for shared in reactor.shared] == ['servers.{web1,web2}.cpu']
+    by_name = dict((alert.name, alert) for alert in reactor.alerts)
+    assert by_name['web3'].shared is None
+    assert by_name['glob'].shared is None
+    assert by_name['web4'].shared is None
+
+    body = '\n'.join([
+        build_graphite_response('servers.web1.cpu', data=[10, 20]),
+        build_graphite_response('servers.web2.cpu', data=[80, 90])]) + '\n'
+
+    async def fetch(request):
+        query = urlparse.parse_qs(urlparse.urlparse(request.url).query)['target']
+        assert query == ['servers.{web1,web2}.cpu']
+        return mock.Mock(buffer=BytesIO(body.encode('utf-8')))
+
+    shared = reactor.shared[0]
+    with mock.patch.object(shared.client, 'fetch', side_effect=fetch) as mock_fetch:
+        with mock.patch.object(reactor, 'notify'):
+            run = ioloop.IOLoop.current().run_sync
+            run(by_name['web1'].load)
+            run(by_name['web2'].load)
+            assert mock_fetch.call_count == 1
+            assert reactor.notify.call_args[0][0] == 'critical'
+            assert reactor.notify.call_args[1]['target'] == 'servers.web2.cpu'
+
+            # The response is outdated
+            shared.fetched_at -= shared.ttl
+            run(by_name['web1'].load)
+            assert mock_fetch.call_count == 2
+
+    assert list(by_name['web1'].history['servers.web1.cpu']) == [15.0, 15.0]
+    assert list(by_name['web2'].history['servers.web2.cpu']) == [85.0]
@@ -0,0 +1,159 @@
+import mock
+from tornado import gen, ioloop
+
+from graphite_beacon.alerts import BaseAlert
+from graphite_beacon.scheduler import FetchQueue, HostLimiter
+from graphite_beacon.units import MINUTE
+
+BASIC_ALERT_OPTS = {
+    'name': 'Test',
+    'query': '*',
+    'rules': ['normal: == 0'],
+    'interval': '1minute',
+}
+
+
+def test_stretch_on_overlap(reactor):
+    alert = BaseAlert.get(reactor, **BASIC_ALERT_OPTS)
+    overload = reactor.overload
+
+    assert overload.acquire(alert)
+    assert alert.effective_interval.as_tuple() == (1, MINUTE)
+
+    # The previous load is still running
+    assert not overload.acquire(alert)
+    assert alert.backoff == 2
+    assert alert.effective_interval.as_tuple() == (2, MINUTE)
+    assert alert.callback.callback_time == 120000
+
+    overload.release(alert)
+    assert alert.backoff == 1
+    assert alert.callback.callback_time == 60000
+    assert overload.inflight == 0
+
+
+def test_stretch_is_capped(reactor):
+    alert = BaseAlert.get(reactor, **BASIC_ALERT_OPTS)
+    overload = reactor.overload
+    overload.max_backoff = 4
+
+    overload.acquire(alert)
+    with mock.patch.object(reactor, 'notify'):
+        for _ in range(3):
+            overload.acquire(alert)
+        assert alert.backoff == 4
+        assert reactor.notify.call_count == 1
+        assert reactor.notify.call_args[1]['target'] == 'waiting'
+
+        overload.release(alert)
+        overload.acquire(alert)
+        overload.release(alert)
+        assert alert.backoff == 1
+        assert reactor.notify.call_args[0][0] == 'normal'
+
+
+def test_slow_load_is_not_shrunk(reactor):
+    alert = BaseAlert.get(reactor, **BASIC_ALERT_OPTS)
+    overload = reactor.overload
+    overload.max_backoff = 4
+
+    with mock.patch.object(reactor, 'notify'):
+        # Every load takes 3.5 minutes
+        for _ in range(4):
+            if overload.acquire(alert):
+                alert.load_started -= 210
+            assert not overload.acquire(alert)
+            overload.release(alert)
+        assert alert.backoff == 4
+        assert reactor.notify.call_args[0][0] == 'warning'
+        assert reactor.notify.call_args[1]['target'] == 'waiting'
+
+        # A fast load shrinks the interval back
+        overload.acquire(alert)
+        overload.release(alert)
+        assert alert.backoff == 2
+
+
+def test_stretch_on_budget(reactor):
+    reactor.overload.budget = 1
+    cheap = BaseAlert.get(reactor, **BASIC_ALERT_OPTS)
+    expensive = BaseAlert.get(reactor, **BASIC_ALERT_OPTS)
+    expensive.load_duration = 10
+    reactor.overload.avg_duration = 1
+
+    reactor.overload.acquire(cheap)
+    reactor.overload.acquire(expensive)
+    assert expensive.backoff == 2
+    assert cheap.backoff == 1
+
+
+def test_host_limiter():
+    limiter = HostLimiter()
+    assert limiter.get('localhost') is None
+
+    limiter = HostLimiter(2)
+    semaphore = limiter.get('localhost')
+    assert semaphore is limiter.get('localhost')
+    assert semaphore is not limiter.get('example.com')
+
+
+def test_fetch_queue(reactor):
+    queue = FetchQueue(limit=1, aging=1.0)
+    served = []
+
+    async def fetch(name, priority):
+        await queue.acquire(priority)
+        served.append(name)
+
+    async def run():
+        await queue.acquire(0)
+        waiting = [
+            gen.convert_yielded(fetch('batch', 20)),
+            gen.convert_yielded(fetch('warning', 10)),
+            gen.convert_yielded(fetch('critical', 0))]
+        await gen.sleep(0)
+        assert served == []
+        for _ in waiting:
+            queue.release()
+            await gen.sleep(0)
+        await gen.multi(waiting)
+
+    ioloop.IOLoop.current().run_sync(run)
+    assert served == ['critical', 'warning', 'batch']
+    assert queue.active == 1
+    queue.release()
+    assert queue.active == 0
+
+
+def test_fetch_queue_aging(reactor):
+    queue = FetchQueue(limit=1, aging=1.0)
+    served = []
+    now = [1000.0]
+
+    async def fetch(name, priority):
+        await queue.acquire(priority)
+        served.append(name)
+
+    async def run():
+        await queue.acquire(0)
+        # The batch alert has waited longer than the priority difference
+        with mock.patch.object(ioloop.IOLoop.current(), 'time', lambda: now[0]):
+            batch = gen.convert_yielded(fetch('batch', 20))
+            await gen.sleep(0)
+            now[0] += 30
+            critical = gen.convert_yielded(fetch('critical', 0))
+            await gen.sleep(0)
+        queue.release()
+        queue.release()
+        await gen.multi([batch, critical])
+
+    ioloop.IOLoop.current().run_sync(run)
+    assert served == ['batch', 'critical']
+
+
+def test_alert_priority(reactor):
+    opts = dict(BASIC_ALERT_OPTS, rules=['warning: > 1', 'normal: == 0'])
+    assert BaseAlert.get(reactor, **opts).priority == 10
+    opts['rules'].insert(0, 'critical: > 2')
+    assert BaseAlert.get(reactor, **opts).priority == 0
+    assert BaseAlert.get(reactor, priority=5, **opts).priority == 5
@@ -0,0 +1,97 @@
+import math
+import random
+
+import mock
+import pytest
+
+from graphite_beacon.alerts import BaseAlert
+from graphite_beacon.stats import Ewma, HoltWinters, Quantile, Statistics, zscore
+from graphite_beacon.store import TargetStore
+
+
+def test_ewma():
+    ewma = Ewma(0.5)
+    assert ewma.get(3) is None
+
+    for value in (10, 20, 20):
+        ewma.push(3, value)
+    assert ewma.get(3) == 17.5
+    assert ewma.get(0) is None
+
+    ewma.reset(3)
+    assert ewma.get(3) is None
+
+
+def test_holt_winters():
+    period = 24
+    forecast = HoltWinters(period)
+    season = lambda pos: 100 + 50 * math.sin(2 * math.pi * pos / period)
+
+    for pos in range(period):
+        assert forecast.get(0) is None
+        forecast.push(0, season(pos))
+
+    errors = []
+    for pos in range(period, period * 5):
+        errors.append(abs(forecast.get(0) - season(pos)))
+        forecast.push(0, season(pos))
+    assert max(errors[-period:]) < 1
+
+
+@pytest.mark.parametrize('probability', [0.5, 0.9, 0.99])
+def test_quantile(probability):
+    rnd = random.Random(42)
+    quantile = Quantile(probability)
+    values = [rnd.gauss(100, 10) for _ in range(5000)]
+
+    for value in values[:4]:
+        quantile.push(1, value)
+        assert quantile.get(1) is None
+
+    for value in values[4:]:
+        quantile.push(1, value)
+    exact = sorted(values)[int(probability * len(values))]
+    assert abs(quantile.get(1) - exact) < 1
+
+
+def test_zscore():
+    assert zscore(12, 10, 2) == 1
+    assert zscore(10, 10, 0) == 0
+    assert zscore(8, 10, 0) == -float('inf')
+
+    store = TargetStore(history_size=4)
+    for value in (1, 3, 1, 3):
+        store.append('a', value)
+    assert store.stddevs([store.ids['a']]) == [1]
+
+    stats = Statistics(store, ['zscore', 'p50'], {})
+    assert stats.baselines([store.ids['a']], [5]) == {
+        'zscore': [3], 'historical': [2], 'p50': [None]}
+
+    with pytest.raises(ValueError):
+        Statistics(store, ['p100'], {})
+
+
+def test_anomaly_rules(reactor):
+    alert = BaseAlert.get(
+        reactor, name='Test', query='*', interval='1minute', history_size='10minute',
+        rules=['critical: > zscore 3', 'warning: > ewma * 2'], ewma_alpha=0.5)
+    assert alert.baselines == set(['zscore', 'ewma'])
+
+    with mock.patch.object(reactor, 'notify'):
+        # The z-score is unknown until the history is full
+        alert.check([(10, 'metric')])
+        alert.check([(30, 'metric')])
+        assert reactor.notify.call_args[0][0] == 'warning'
+
+        for value in (10, 11, 9, 10, 11, 9, 10, 11, 9, 10):
+            alert.check([(value, 'metric')])
+        assert reactor.notify.call_args[0][0] == 'normal'
+
+        alert.check([(25, 'metric')])
+        assert reactor.notify.call_args[0][0] == 'critical'
+
+    # Statistics of removed targets are reset
+    tid = alert.store.ids['metric']
+    alert.store.remove('metric')
+    assert alert.stats.trackers['ewma'].get(tid) is None
@@ -0,0 +1,82 @@
+from graphite_beacon.store import TargetStore
+
+
+def test_state():
+    store = TargetStore(history_size=3)
+    assert 'a' not in store.state
+
+    store.state['a'] = 'warning'
+    store.state['b'] = 'critical'
+    assert store.state == {'a': 'warning', 'b': 'critical'}
+
+    store.reset_levels()
+    assert store.state == {'a': 'normal', 'b': 'normal'}
+
+    del store.state['a']
+    assert store.state == {'b': 'normal'}
+
+
+def test_history():
+    store = TargetStore(history_size=3)
+    assert list(store.history['a']) == []
+    assert store.mean('a') is None
+    # Reading the history of an unknown target does not store it
+    assert not store.history['a']
+    assert 'a' not in store
+
+    for value in (1, 2, 3, 4, 5):
+        store.append('a', value)
+    assert list(store.history['a']) == [3, 4, 5]
+    assert store.history['a'][:2] == [3, 4]
+    assert store.history['a'][-1] == 5
+    assert store.mean('a') == 4
+
+    store.history['b'] += [1, 2]
+    assert list(store.history['b']) == [1, 2]
+    assert list(store.history['a']) == [3, 4, 5]
+
+
+def test_grow():
+    store = TargetStore(history_size=2, capacity=2)
+    for num in range(100):
+        store.append(num, num)
+        store.state[num] = 'normal'
+    assert store.capacity >= 100
+    assert all(list(store.history[num]) == [num] for num in range(100))
+
+
+def test_stale():
+    store = TargetStore(history_size=2)
+    store.state['pinned'] = 'normal'
+    store.pin('pinned')
+
+    store.tick()
+    store.append('gone', 1)
+    store.append('alive', 1)
+
+    store.tick()
+    store.append('alive', 2)
+    assert store.stale(max_age=2) == []
+
+    store.tick()
+    store.append('alive', 3)
+    assert store.stale(max_age=2) == ['gone']
+
+    store.append('other', 1)
+    assert store.stale(max_targets=2) == ['gone']
+    assert store.stale(max_targets=1) == ['gone', 'alive']
+
+
+def test_remove():
+    store = TargetStore(history_size=2)
+    store.append('gone', 1)
+    store.state['gone'] = 'critical'
+    store.remove('gone')
+    assert 'gone' not in store
+    assert 'gone' not in store.state
+    assert store.evicted == 1
+
+    # The freed slot is reused with a clean history
+    store.append('new', 5)
+    assert list(store.history['new']) == [5]
+    assert len(store) == 1
@@ -5,7 +5,7 @@ from funcparserlib.lexer import LexerError
 
 from graphite_beacon.utils import parse_rule as parse_rule
 from graphite_beacon.utils import (IDENTITY, convert_from_format,
-                                   convert_to_format)
+                                   convert_to_format, parse_group_rule)
 
 
 def test_convert():
@@ -72,3 +72,38 @@ def test_parse_rule():
     rule = parse_rule('warning: >= historical * 1.2')
     assert rule['exprs'][0]['mod']
     assert rule['exprs'][0]['mod'](5) == 6
+
+    assert parse_rule('critical: > p99.9') == {
+        'level': 'critical', 'raw': 'critical: > p99.9',
+        'exprs': [{'op': op.gt, 'value': 'p99.9', 'mod': IDENTITY}]}
+
+    assert parse_rule('critical: > zscore 3') == {
+        'level': 'critical', 'raw': 'critical: > zscore 3',
+        'exprs': [{'op': op.gt, 'value': 3, 'mod': IDENTITY, 'stat': 'zscore'}]}
+
+    with pytest.raises(ValueError):
+        parse_rule('critical: > zscore ewma')
+
+
+def test_parse_group_rule():
+    rule = parse_group_rule('critical: percent > 10 where > 90')
+    assert rule['level'] == 'critical'
+    assert rule['raw'] == 'critical: percent > 10 where > 90'
+    assert rule['aggregate'] == 'percent'
+    assert rule['exprs'][0]['op'] is op.gt
+    assert rule['exprs'][0]['value'] == 10
+    assert rule['where']['exprs'][0]['value'] == 90
+
+    rule = parse_group_rule('warning: avg >= 70MB')
+    assert rule['aggregate'] == 'avg'
+    assert rule['where'] is None
+    assert rule['exprs'][0]['value'] == 70 * 1024 * 1024
+
+    rule = parse_group_rule('warning: count > 3 where > historical * 2 OR < 5')
+    assert rule['where']['exprs'][0]['value'] == 'historical'
+    assert rule['where']['exprs'][1] is op.or_
+
+    for invalid in ('critical: > 10', 'critical: count > 10', 'critical: avg > historical',
+                    'critical: median > 1'):
+        with pytest.raises(ValueError):
+            parse_group_rule(invalid)
@@ -0,0 +1,77 @@
+import mock
+import pytest
+from tornado import ioloop
+
+from graphite_beacon import whisper
+from graphite_beacon.alerts import BaseAlert, WhisperAlert
+
+NOW = 1500000000
+
+
+def test_fetch(tmpdir):
+    path = str(tmpdir.join('metric.wsp'))
+    points = [(NOW - 600 + pos * 60, float(pos)) for pos in range(10)]
+    whisper.create(path, [(60, 5), (600, 10)], points)
+
+    # The first archive wraps around: only the last 5 points are kept
+    start, end, step, values = whisper.fetch(path, NOW - 300, NOW, now=NOW)
+    assert (start, end, step) == (NOW - 240, NOW + 60, 60)
+    assert values == [6.0, 7.0, 8.0, 9.0, None]
+
+    start, end, step, values = whisper.fetch(path, NOW - 180, NOW - 60, now=NOW)
+    assert values == [8.0, 9.0]
+
+    # The period is too long for the first archive
+    start, end, step, values = whisper.fetch(path, NOW - 1800, NOW, now=NOW)
+    assert step == 600
+    assert values == [None] * 3
+
+    assert whisper.fetch(path, NOW - 100000, NOW - 90000, now=NOW) is None
+
+
+def test_fetch_invalid(tmpdir):
+    path = tmpdir.join('metric.wsp')
+    path.write('')
+    with pytest.raises(ValueError):
+        whisper.fetch(str(path), NOW - 300, NOW, now=NOW)
+
+    whisper.create(str(path), [(60, 5)], [(NOW, 1.0)])
+    path.write_binary(path.read_binary()[:30])
+    with pytest.raises(ValueError):
+        whisper.fetch(str(path), NOW - 300, NOW, now=NOW)
+
+
+def test_find(tmpdir):
+    for name in ('web1.cpu', 'web2.cpu', 'web2.memory', 'db1.cpu'):
+        whisper.create(str(tmpdir.join(*name.split('.'))) + '.wsp', [(60, 10)])
+    tmpdir.join('web1', 'cpu.txt').write('')
+
+    root = str(tmpdir)
+    assert [name for name, _ in whisper.find(root, 'web*.cpu')] == ['web1.cpu', 'web2.cpu']
+    assert [name for name, _ in whisper.find(root, '{web1,db1}.cpu')] == ['db1.cpu', 'web1.cpu']
+    assert [name for name, _ in whisper.find(root, 'web2.*')] == ['web2.cpu', 'web2.memory']
+    assert whisper.find(root, 'web2.cpu')[0][1] == str(tmpdir.join('web2', 'cpu.wsp'))
+    assert whisper.find(root, 'web3.*') == []
+
+
+def test_whisper_alert(reactor, tmpdir):
+    for host, value in (('web1', 95), ('web2', 10)):
+        whisper.create(
+            str(tmpdir.join(host, 'cpu.wsp')), [(60, 60)],
+            [(NOW - pos * 60, value) for pos in range(10)])
+    whisper.create(str(tmpdir.join('web3', 'cpu.wsp')), [(60, 60)])
+    # Truncated files are skipped
+    tmpdir.join('web4', 'cpu.wsp').write('', ensure=True)
+
+    alert = BaseAlert.get(
+        reactor, name='Whisper', source='whisper', query='*.cpu', storage=str(tmpdir),
+        time_window='5minute', rules=['critical: > 90'])
+    assert isinstance(alert, WhisperAlert)
+    assert alert.read(now=NOW) == [(95.0, 'web1.cpu'), (10.0, 'web2.cpu'), (None, 'web3.cpu')]
+
+    with mock.patch.object(alert, 'read', return_value=alert.read(now=NOW)):
+        with mock.patch.object(reactor, 'notify'):
+            ioloop.IOLoop.current().run_sync(alert.load)
+            levels = dict(
+                (call[1]['target'], call[0][0]) for call in reactor.notify.call_args_list)
+    assert levels == {'web1.cpu': 'critical', 'web3.cpu': 'critical'}